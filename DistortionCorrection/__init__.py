@@ -1,10 +1,12 @@
 from __future__ import print_function, division, absolute_import
 
 import logging
+import threading
 from functools import partial
 
 from ImageAnalysisFuncs.base import ImageAnalysisError
 import camera_calibration
+import numpy as np
 from numpy import array
 
 
@@ -12,12 +14,106 @@ class CorrectionError(ImageAnalysisError):
     pass
 
 
+def is_batch(x, y):
+    return (np.ndim(x) > 0) or (np.ndim(y) > 0)
+
+
+def correct_arrays(x, y, config, level):
+    """corrects arrays of x and y pixel coordinates in one call to
+    camera_calibration.correct_points(), and returns the corrected
+    coordinates as two arrays of the same shape."""
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    if x.size == 0:
+        return x.copy(), y.copy()
+
+    points = np.empty((x.size, 1, 2), dtype=float)
+    points[:, 0, 0] = x.ravel()
+    points[:, 0, 1] = y.ravel()
+    corrected = camera_calibration.correct_points(points, config, level)
+
+    return (corrected[:, 0, 0].reshape(x.shape), corrected[:, 0, 1].reshape(x.shape))
+
+
+def get_correction_table(calibration_pars, config, level):
+    """returns the precomputed lookup table of the correction if the
+    calibration parameters select one (see get_lookup_table_pars() in
+    vfr/tests_common.py), and None otherwise. The table is loaded from
+    its file, or computed and stored if the file is missing."""
+    table_pars = calibration_pars.get("lookup_table")
+    if table_pars is None:
+        return None
+
+    width, height = table_pars["image_size"]
+    return camera_calibration.load_or_build_table(
+        table_pars["directory"], config, level, width, height, table_pars["step"]
+    )
+
+
+def correct_with_table(x, y, table, config, level):
+    """corrects arrays of x and y pixel coordinates by interpolation in
+    the lookup table. Points outside of the table are corrected exactly."""
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    x_corr, y_corr = table.lookup(x, y)
+
+    outside = ~table.contains(x, y)
+    if np.any(outside):
+        x_corr[outside], y_corr[outside] = correct_arrays(
+            x[outside], y[outside], config, level
+        )
+
+    return x_corr, y_corr
+
+
+# correction functions built by get_correction_func(), keyed by
+# the identity of their calibration parameters. Each entry keeps a
+# reference to the parameters, so that their id is not reused.
+CORRECTION_CACHE_SIZE = 16
+_correction_cache = {}
+_correction_cache_lock = threading.Lock()
+
+
 def get_correction_func(calibration_pars=None, platescale=1.0, loglevel=0):
+    """returns the correction function of make_correction_func().
+
+    The function is cached for the calibration parameters object,
+    which is the same for all FPUs evaluated with one map file (see
+    get_config_from_mapfile() in vfr/tests_common.py). This avoids
+    parsing the calibration and loading its lookup table again for
+    every image. Calibration parameters must therefore not be
+    modified after they have been passed here.
+    """
+    if calibration_pars is None:
+        return make_correction_func(platescale=platescale, loglevel=loglevel)
+
+    key = (id(calibration_pars), platescale, loglevel)
+    with _correction_cache_lock:
+        entry = _correction_cache.get(key)
+        if entry is not None:
+            return entry[1]
+
+        f = make_correction_func(calibration_pars, platescale, loglevel)
+        if len(_correction_cache) >= CORRECTION_CACHE_SIZE:
+            _correction_cache.clear()
+        _correction_cache[key] = (calibration_pars, f)
+
+    return f
+
+
+def make_correction_func(calibration_pars=None, platescale=1.0, loglevel=0):
     """This returns a closure which applies the selected distortion
     correction or scaling to pairs of coordinates.
 
     Computing this closure outside of loops has the goal to make
     the correction faster.
+
+    The closure takes either a single pair of coordinates, or two
+    arrays of x and y coordinates. Arrays are corrected in one
+    vectorized call, and the result is a pair of arrays of the same
+    shape, with the same values as correcting each point alone.
+
+    If the calibration parameters contain a "lookup_table" entry,
+    the calibrated corrections interpolate in a precomputed table
+    instead of undistorting each point iteratively.
     """
     # get default scaling function
     if calibration_pars is None:
@@ -36,7 +132,14 @@ def get_correction_func(calibration_pars=None, platescale=1.0, loglevel=0):
         platescale = calibration_pars["scale_factor"]
 
         def f(x, y):
-            if loglevel > 0:
+            if is_batch(x, y):
+                x, y = np.asarray(x), np.asarray(y)
+                if loglevel > 0:
+                    log(
+                        "Distortion correction: %i points, platescale = %f"
+                        % (np.size(x), platescale)
+                    )
+            elif loglevel > 0:
                 log(
                     "Distortion correction: (%7.2f, %7.2f) --> (%6.3f, %6.3f), platescale = %f"
                     % (x, y, x * platescale, y * platescale, platescale)
@@ -50,12 +153,25 @@ def get_correction_func(calibration_pars=None, platescale=1.0, loglevel=0):
         # Use Alexander Lay's multi-stage distortion correction.
         level = camera_calibration.Correction.lens_keystone_and_real_coordinates
         config = camera_calibration.Config.from_dict(calibration_pars["config"])
+        table = get_correction_table(calibration_pars, config, level)
         x_0, y_0 = camera_calibration.correct_point((0.0, 0.0), config, level)
 
         def f(x, y):
-            x_corr, y_corr = camera_calibration.correct_point(
-                array([x, y], dtype=float), config, level
-            )
+            if is_batch(x, y):
+                if loglevel > 0:
+                    log("Distortion correction: %i points" % np.size(x))
+                if table is not None:
+                    return correct_with_table(x, y, table, config, level)
+                return correct_arrays(x, y, config, level)
+
+            if table is not None:
+                x_corr, y_corr = map(
+                    float, correct_with_table(x, y, table, config, level)
+                )
+            else:
+                x_corr, y_corr = camera_calibration.correct_point(
+                    array([x, y], dtype=float), config, level
+                )
             if loglevel > 0:
                 try:
                     x_scale = (x_corr - x_0) / float(x)
@@ -76,13 +192,27 @@ def get_correction_func(calibration_pars=None, platescale=1.0, loglevel=0):
         # for pupil alignment correction
         level = camera_calibration.Correction.lens_keystone_and_real_coordinates
         config = camera_calibration.Config.from_dict(calibration_pars["config"])
+        table = get_correction_table(calibration_pars, config, level)
         points0 = array([0.0, 0.0], dtype=float)
         x_0, y_0 = camera_calibration.correct_point(points0, config, level)
 
         def f(x, y):
-
-            points = array([x, y], dtype=float)
-            x_corr, y_corr = camera_calibration.correct_point(points, config, level)
+            if is_batch(x, y):
+                if loglevel > 0:
+                    log("Distortion correction: %i points" % np.size(x))
+                if table is not None:
+                    return correct_with_table(x, y, table, config, level)
+                return correct_arrays(x, y, config, level)
+
+            if table is not None:
+                x_corr, y_corr = map(
+                    float, correct_with_table(x, y, table, config, level)
+                )
+            else:
+                points = array([x, y], dtype=float)
+                x_corr, y_corr = camera_calibration.correct_point(
+                    points, config, level
+                )
             if loglevel > 0:
                 try:
                     x_scale = (x_corr - x_0) / float(x)
@@ -129,14 +129,13 @@ class GigECamera(object):
                 "Exposure Time is not settable, continuing with current exposure time."
             )
 
-    def saveImage(self, filename):
-        """Function to save an image from a camera device and save it to a location.
+    def grabImage(self):
+        """Function to grab an image from a camera device.
 
-        Overwrites any existing file at filename.
-        Parameters
-        ----------
-        filename : str
-            Path to location where the image will be saved.
+        Returns
+        -------
+        numpy.ndarray
+            The grabbed image, or None if the grab failed.
 
         """
         logger = logging.getLogger(__name__)
@@ -152,6 +151,7 @@ class GigECamera(object):
         # sets up free-running continuous acquisition.
         self.camera.StartGrabbingMax(countOfImagesToGrab)
 
+        img = None
         # Camera.StopGrabbing() is called automatically by the RetrieveResult() method
         # when c_countOfImagesToGrab images have been retrieved.
         while self.camera.IsGrabbing():
@@ -162,16 +162,33 @@ class GigECamera(object):
 
             # Image grabbed successfully?
             if grabResult.GrabSucceeded():
-                # Access the image data.
-                img = grabResult.Array
-                imsave(filename, np.asarray(img))
-                logger.debug("File saved as : {}".format(filename))
+                # Access the image data. The copy stays valid
+                # after the grab buffer is released.
+                img = np.array(grabResult.Array)
             else:
                 logger.error(
                     "Error: %r %s" % (grabResult.ErrorCode, grabResult.ErrorDescription)
                 )
         grabResult.Release()
 
+        return img
+
+    def saveImage(self, filename):
+        """Function to save an image from a camera device and save it to a location.
+
+        Overwrites any existing file at filename.
+        Parameters
+        ----------
+        filename : str
+            Path to location where the image will be saved.
+
+        """
+        logger = logging.getLogger(__name__)
+        img = self.grabImage()
+        if img is not None:
+            imsave(filename, img)
+            logger.debug("File saved as : {}".format(filename))
+
     def close(self):
         """If open, close access to camera.
         """
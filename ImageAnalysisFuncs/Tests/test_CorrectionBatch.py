@@ -0,0 +1,156 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+import camera_calibration
+from DistortionCorrection import get_correction_func
+from ImageAnalysisFuncs.analyze_positional_repeatability import correctCoordinates
+
+
+def synthetic_config():
+    """returns a calibration with mild lens distortion and a small
+    keystone rotation, mapping a 2000 x 1500 pixel field to 80 x 60 mm."""
+    camera_matrix = np.array([[3000.0, 0.0, 1000.0], [0.0, 3000.0, 750.0], [0, 0, 1]])
+    angle = 0.01
+    homography = np.array(
+        [
+            [np.cos(angle), -np.sin(angle), 5.0],
+            [np.sin(angle), np.cos(angle), -3.0],
+            [1e-6, 2e-6, 1.0],
+        ]
+    )
+    corners = camera_calibration.Corners(
+        np.array([10.0, 20.0]),
+        np.array([1990.0, 20.0]),
+        np.array([10.0, 1480.0]),
+        np.array([1990.0, 1480.0]),
+    )
+    real_corners = camera_calibration.Corners(
+        np.array([0.0, 0.0]),
+        np.array([80.0, 0.0]),
+        np.array([0.0, 60.0]),
+        np.array([80.0, 60.0]),
+    )
+    return camera_calibration.Config(
+        camera_matrix,
+        np.array([[-0.05, 0.01, 0.0005, -0.0003, 0.0]]),
+        camera_matrix,
+        homography,
+        corners,
+        real_corners,
+    )
+
+
+class TestCorrectionBatch(unittest.TestCase):
+    def setUp(self):
+        rs = np.random.RandomState(0)
+        self.x = rs.uniform(0, 2000, size=(30, 2))
+        self.y = rs.uniform(0, 1500, size=(30, 2))
+
+    def assert_batch_matches_scalar(self, correct):
+        x_corr, y_corr = correct(self.x, self.y)
+        self.assertEqual(np.shape(x_corr), self.x.shape)
+        self.assertEqual(np.shape(y_corr), self.y.shape)
+
+        for idx in np.ndindex(self.x.shape):
+            xs, ys = correct(self.x[idx], self.y[idx])
+            self.assertEqual(x_corr[idx], xs)
+            self.assertEqual(y_corr[idx], ys)
+
+    def test_scale(self):
+        correct = get_correction_func(platescale=0.04)
+        self.assert_batch_matches_scalar(correct)
+
+    def test_multistage(self):
+        config = synthetic_config()
+        for algorithm in ["al/201904/multistage", "al/20190429/chessboard"]:
+            correct = get_correction_func(
+                calibration_pars={"algorithm": algorithm, "config": config.to_dict()}
+            )
+            self.assert_batch_matches_scalar(correct)
+
+            x_corr, y_corr = correct([], [])
+            self.assertEqual(len(x_corr), 0)
+            self.assertEqual(len(y_corr), 0)
+
+            # lists are accepted as well
+            x_corr, y_corr = correct([100.0, 200.0], [300.0, 400.0])
+            npt.assert_array_equal((x_corr[1], y_corr[1]), correct(200.0, 400.0))
+
+    def test_cached_function(self):
+        calibration_pars = {
+            "algorithm": "al/201904/multistage",
+            "config": synthetic_config().to_dict(),
+        }
+        correct = get_correction_func(calibration_pars=calibration_pars)
+        self.assertIs(get_correction_func(calibration_pars=calibration_pars), correct)
+        self.assertIsNot(
+            get_correction_func(calibration_pars=calibration_pars, loglevel=10),
+            correct,
+        )
+        self.assertIsNot(
+            get_correction_func(calibration_pars=dict(calibration_pars)), correct
+        )
+
+    def test_lookup_table(self):
+        config = synthetic_config()
+        tmpdir = tempfile.mkdtemp()
+        try:
+            table_pars = {"directory": tmpdir, "image_size": (2000, 1500), "step": 8}
+            exact = get_correction_func(
+                calibration_pars={
+                    "algorithm": "al/201904/multistage",
+                    "config": config.to_dict(),
+                }
+            )
+            correct = get_correction_func(
+                calibration_pars={
+                    "algorithm": "al/201904/multistage",
+                    "config": config.to_dict(),
+                    "lookup_table": table_pars,
+                }
+            )
+            self.assertEqual(len(os.listdir(tmpdir)), 1)
+            self.assert_batch_matches_scalar(correct)
+
+            npt.assert_allclose(
+                correct(self.x, self.y), exact(self.x, self.y), rtol=0, atol=1e-4
+            )
+
+            # points outside of the table are corrected exactly
+            x = np.array([-5.0, 2005.0])
+            y = np.array([100.0, 100.0])
+            npt.assert_array_equal(correct(x, y), exact(x, y))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_correct_coordinates(self):
+        correct = get_correction_func(
+            calibration_pars={
+                "algorithm": "al/201904/multistage",
+                "config": synthetic_config().to_dict(),
+            }
+        )
+        pixel_results = {
+            (i, 0): (self.x[i, 0], self.y[i, 0], 0.9, self.x[i, 1], self.y[i, 1], 0.8)
+            for i in range(len(self.x))
+        }
+
+        results = correctCoordinates(pixel_results, correct)
+        self.assertEqual(sorted(results), sorted(pixel_results))
+        for key, (sx, sy, sq, lx, ly, lq) in pixel_results.items():
+            self.assertEqual(
+                results[key], correct(sx, sy) + (sq,) + correct(lx, ly) + (lq,)
+            )
+
+        self.assertEqual(correctCoordinates({}, correct), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+import numpy.testing as npt
+
+from ImageAnalysisFuncs.base import ImageAnalysisError, load_image
+
+
+class TestImageLoading(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rs = np.random.RandomState(0)
+        self.gray = rs.randint(0, 256, size=(60, 80)).astype(np.uint8)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, image):
+        path = os.path.join(self.tmpdir, name)
+        cv2.imwrite(path, image)
+        return path
+
+    def test_grayscale_file(self):
+        path = self.write("gray.bmp", self.gray)
+        image = load_image(path)
+
+        self.assertEqual(image.dtype, np.uint8)
+        npt.assert_array_equal(image, self.gray)
+
+    def test_color_file_matches_conversion(self):
+        bgr = cv2.merge([self.gray, self.gray, self.gray])
+        path = self.write("color.bmp", bgr)
+
+        npt.assert_array_equal(load_image(path), self.gray)
+
+    def test_buffer_reuse(self):
+        # a smaller image after a larger one must not see stale data
+        large = self.write("large.bmp", self.gray)
+        small = self.write("small.bmp", self.gray[:10, :10])
+
+        npt.assert_array_equal(load_image(large), self.gray)
+        npt.assert_array_equal(load_image(small), self.gray[:10, :10])
+        npt.assert_array_equal(load_image(large), self.gray)
+
+    def test_arrays(self):
+        self.assertIs(load_image(self.gray), self.gray)
+
+        bgr = cv2.merge([self.gray, self.gray, self.gray])
+        npt.assert_array_equal(load_image(bgr), self.gray)
+
+        with self.assertRaises(ImageAnalysisError):
+            load_image(np.zeros((4, 4, 2), dtype=np.uint8))
+
+    def test_npy_file(self):
+        path = os.path.join(self.tmpdir, "raw.npy")
+        np.save(path, self.gray)
+
+        npt.assert_array_equal(load_image(path), self.gray)
+
+    def test_16bit(self):
+        image16 = self.gray.astype(np.uint16) * 257
+        path = os.path.join(self.tmpdir, "deep.png")
+        cv2.imwrite(path, image16)
+
+        npt.assert_array_equal(load_image(path), self.gray)
+        npt.assert_array_equal(load_image(image16), self.gray)
+
+    def test_errors(self):
+        with self.assertRaises(ImageAnalysisError):
+            load_image(os.path.join(self.tmpdir, "missing.bmp"))
+
+        path = os.path.join(self.tmpdir, "broken.bmp")
+        with open(path, "wb") as f:
+            f.write(b"not an image")
+        with self.assertRaises(ImageAnalysisError):
+            load_image(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
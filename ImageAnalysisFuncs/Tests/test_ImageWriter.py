@@ -0,0 +1,36 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+from ImageAnalysisFuncs.base import load_image
+from vfr.image_writer import ImageWriter
+
+
+class TestImageWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rs = np.random.RandomState(0)
+        self.image16 = rs.randint(0, 1 << 16, size=(60, 80)).astype(np.uint16)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_16bit_frame_matches_file(self):
+        writer = ImageWriter()
+        for ext in [".bmp", ".png", ".tiff", ".npy"]:
+            ipath = os.path.join(self.tmpdir, "frame" + ext)
+            frame = writer.submit(ipath, self.image16)
+            writer.flush()
+
+            npt.assert_array_equal(load_image(frame), load_image(ipath))
+            npt.assert_array_equal(load_image(ipath), self.image16 >> 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,10 +2,86 @@ from __future__ import absolute_import, division, print_function
 
 import unittest
 
-from ImageAnalysisFuncs.analyze_metrology_height import methtHeight
+import numpy as np
+from numpy.polynomial import Polynomial
+
+from ImageAnalysisFuncs.analyze_metrology_height import (
+    ARM_SURFACE_X,
+    LARGE_TARGET_X,
+    SMALL_TARGET_X,
+    methtHeight,
+    methtHeights,
+    scan_image,
+    threshold_image,
+)
 from vfr.conf import MET_HEIGHT_ANALYSIS_PARS
 
 
+def synthetic_image(rng):
+    """returns an image of the beta arm with both targets, with a random
+    position of the arm side, random tilt, and random surface noise."""
+    image = np.zeros((2800, 2000), dtype=np.uint8)
+    beta_side = rng.randint(100, 400)
+    image[1900:, : beta_side + 1] = 255
+
+    x = np.arange(beta_side + 1, image.shape[1])
+    surface = 2300 + rng.uniform(-0.05, 0.05) * (x - beta_side)
+    offset = x - beta_side
+    surface[(offset >= 80) & (offset < 300)] -= rng.randint(5, 15)
+    surface[(offset >= 340) & (offset < 720)] -= rng.randint(5, 15)
+    surface += rng.randint(-2, 3, size=len(x))
+
+    for column, y in zip(x, surface.astype(int)):
+        image[y:, column] = 255
+
+    return image
+
+
+def reference_heights(image, pars):
+    """the loops of the scalar implementation of methtHeight(), for
+    comparison. Returns the surface points and the unscaled mean
+    heights of the small and large targets."""
+    thresh = threshold_image(image, pars)
+
+    betaScan = thresh[pars.METHT_SCAN_HEIGHT, :]
+    betaSide = 0
+    for i in range(0, len(betaScan) - 1):
+        if (betaScan[i + 1] - betaScan[i]) < 0:
+            betaSide = i
+
+    surfaceY = []
+    for x in list(ARM_SURFACE_X) + list(SMALL_TARGET_X) + list(LARGE_TARGET_X):
+        pix = thresh[:, betaSide + x]
+        for p in range(0, len(thresh) - 1):
+            if abs(pix[p + 1] - pix[p]) > 0:
+                surfaceY.append(p)
+                break
+    armSurfaceY = surfaceY[:5]
+    smallTargetY = surfaceY[5:8]
+    largeTargetY = surfaceY[8:]
+
+    armSurface = (
+        Polynomial.fit(ARM_SURFACE_X, armSurfaceY, 1, domain=(-1, 1)).convert().coef
+    )
+    a = armSurface[1]
+    b = -1
+    c = armSurface[0]
+    smallTargetHeights = [
+        (a * SMALL_TARGET_X[i] + b * smallTargetY[i] + c) / np.sqrt(a ** 2 + b ** 2)
+        for i in range(3)
+    ]
+    largeTargetHeights = [
+        (a * LARGE_TARGET_X[i] + b * largeTargetY[i] + c) / np.sqrt(a ** 2 + b ** 2)
+        for i in range(3)
+    ]
+
+    return (
+        surfaceY,
+        sum(smallTargetHeights) / len(smallTargetHeights),
+        sum(largeTargetHeights) / len(largeTargetHeights),
+    )
+
+
 class TestMetHeightImageAnalysis(unittest.TestCase):
     def test_expected(self):
         cases = [
@@ -27,6 +103,49 @@ class TestMetHeightImageAnalysis(unittest.TestCase):
 
             self.assertTrue(abs(large_ht - lh) < ht_limit)
 
+    def test_batch(self):
+        cases = [
+            ("../TestImages/PT25_metht_1_001.bmp", 0.076, 0.055),
+            ("../TestImages/PT25_metht_1_002.bmp", 0.074, 0.058),
+            ("../TestImages/PT25_metht_1_003.bmp", 0.073, 0.060),
+            ("../TestImages/PT25_metht_1_004.bmp", 0.071, 0.055),
+            ("../TestImages/PT25_metht_1_005.bmp", 0.070, 0.055),
+        ]
+        test_images = [case[0] for case in cases] + ["../TestImages/missing.bmp"]
+        print("Testing methtHeights with %i images.." % len(test_images))
+
+        result = methtHeights(test_images, pars=MET_HEIGHT_ANALYSIS_PARS)
+
+        for i, (test_image, small_ht, large_ht) in enumerate(cases):
+            sh, lh = methtHeight(test_image, pars=MET_HEIGHT_ANALYSIS_PARS)
+
+            self.assertIsNone(result.errors[i])
+            self.assertAlmostEqual(result.small_target_heights[i], sh)
+            self.assertAlmostEqual(result.large_target_heights[i], lh)
+
+        # a failed image does not affect the others
+        self.assertIsNotNone(result.errors[-1])
+        self.assertTrue(np.isnan(result.small_target_heights[-1]))
+
+    def test_synthetic(self):
+        pars = MET_HEIGHT_ANALYSIS_PARS
+        rng = np.random.RandomState(17)
+        images = [synthetic_image(rng) for _ in range(6)]
+        result = methtHeights(images, pars=pars)
+
+        for n, image in enumerate(images):
+            surfaceY, small_ht, large_ht = reference_heights(image, pars)
+
+            _, armSurfaceY, smallTargetY, largeTargetY = scan_image(image, pars)
+            self.assertEqual(
+                list(armSurfaceY) + list(smallTargetY) + list(largeTargetY), surfaceY
+            )
+
+            self.assertIsNone(result.errors[n])
+            scale = pars.METHT_PLATESCALE
+            self.assertAlmostEqual(result.small_target_heights[n], small_ht * scale)
+            self.assertAlmostEqual(result.large_target_heights[n], large_ht * scale)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,148 @@
+from __future__ import absolute_import, division, print_function
+
+import glob
+import math
+import os
+import unittest
+
+import cv2
+import numpy as np
+
+from ImageAnalysisFuncs.target_detection_otsu import (
+    find_bright_sharp_circles,
+    find_bright_sharp_circles_components,
+)
+from vfr.conf import POS_REP_ANALYSIS_PARS, POS_REP_TARGET_DETECTION_OTSU_PARS
+
+TEST_IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../TestImages")
+
+PLATESCALE = POS_REP_ANALYSIS_PARS.PLATESCALE
+SMALL_RADIUS = POS_REP_TARGET_DETECTION_OTSU_PARS.SMALL_RADIUS / PLATESCALE
+LARGE_RADIUS = POS_REP_TARGET_DETECTION_OTSU_PARS.LARGE_RADIUS / PLATESCALE
+GROUP_RANGE = POS_REP_TARGET_DETECTION_OTSU_PARS.GROUP_RANGE / PLATESCALE
+
+MAX_DEVIATION = 0.05  # pixels
+
+
+def synthetic_image(rs):
+    """returns a blurred, noisy image with two targets at sub-pixel
+    positions and an elongated reflection."""
+    image = np.zeros((1200, 1600), dtype=np.uint8)
+    x, y = rs.uniform(200, 1400), rs.uniform(200, 1000)
+    angle = rs.uniform(0, 2 * math.pi)
+
+    def circle(cx, cy, radius):
+        # coordinates with 4 fractional bits
+        cv2.circle(
+            image,
+            (int(round(cx * 16)), int(round(cy * 16))),
+            int(radius * 16),
+            200,
+            -1,
+            lineType=cv2.LINE_AA,
+            shift=4,
+        )
+
+    circle(x, y, SMALL_RADIUS)
+    circle(
+        x + GROUP_RANGE * math.cos(angle),
+        y + GROUP_RANGE * math.sin(angle),
+        LARGE_RADIUS,
+    )
+    cv2.ellipse(
+        image,
+        (int(rs.uniform(100, 1500)), int(rs.uniform(100, 1100))),
+        (60, 20),
+        30,
+        0,
+        360,
+        200,
+        -1,
+    )
+    image = cv2.GaussianBlur(image, (7, 7), 2)
+    return np.clip(image + rs.normal(20, 5, image.shape), 0, 255).astype(np.uint8)
+
+
+class TestOtsuComponents(unittest.TestCase):
+    def assert_equivalent(self, image):
+        blobs = find_bright_sharp_circles(
+            image, SMALL_RADIUS, LARGE_RADIUS, group_range=GROUP_RANGE
+        )
+        components = find_bright_sharp_circles_components(
+            image, SMALL_RADIUS, LARGE_RADIUS, group_range=GROUP_RANGE
+        )
+
+        self.assertEqual(len(blobs), len(components))
+        for blob, component in zip(
+            sorted(blobs, key=lambda b: b.size),
+            sorted(components, key=lambda b: b.size),
+        ):
+            self.assertLess(abs(blob.pt[0] - component.pt[0]), MAX_DEVIATION)
+            self.assertLess(abs(blob.pt[1] - component.pt[1]), MAX_DEVIATION)
+            self.assertLess(abs(blob.size - component.size), 0.1 * blob.size)
+
+    def test_synthetic(self):
+        rs = np.random.RandomState(0)
+        for _ in range(10):
+            self.assert_equivalent(synthetic_image(rs))
+
+    def test_no_targets(self):
+        image = np.full((300, 400), 20, dtype=np.uint8)
+        self.assertEqual(
+            find_bright_sharp_circles_components(
+                image, SMALL_RADIUS, LARGE_RADIUS, group_range=GROUP_RANGE
+            ),
+            [],
+        )
+
+    def test_holes(self):
+        # the contour area of a dot includes its holes, and dots with
+        # a hole in the centre are rejected, like in the SimpleBlobDetector
+        for offset, expected in [(0.0, 0), (0.25, 2)]:
+            image = synthetic_image(np.random.RandomState(1))
+            blobs = find_bright_sharp_circles(
+                image, SMALL_RADIUS, LARGE_RADIUS, group_range=GROUP_RANGE
+            )
+            self.assertEqual(len(blobs), 2)
+            for blob in blobs:
+                cv2.circle(
+                    image,
+                    (int(blob.pt[0] + offset * blob.size), int(blob.pt[1])),
+                    int(blob.size / 8),
+                    20,
+                    -1,
+                )
+            self.assertEqual(
+                len(
+                    find_bright_sharp_circles(
+                        image, SMALL_RADIUS, LARGE_RADIUS, group_range=GROUP_RANGE
+                    )
+                ),
+                expected,
+            )
+            self.assert_equivalent(image)
+
+    def test_no_group_range(self):
+        image = synthetic_image(np.random.RandomState(2))
+        self.assertEqual(
+            find_bright_sharp_circles(image, SMALL_RADIUS, LARGE_RADIUS), []
+        )
+        self.assertEqual(
+            find_bright_sharp_circles_components(image, SMALL_RADIUS, LARGE_RADIUS),
+            [],
+        )
+
+    def test_expected(self):
+        test_images = glob.glob(
+            os.path.join(TEST_IMAGES, "*positional-repeatability*.bmp")
+        ) + glob.glob(os.path.join(TEST_IMAGES, "*posrep*.bmp"))
+        if not test_images:
+            self.skipTest("no positional repeatability images in %s" % TEST_IMAGES)
+
+        for test_image in sorted(test_images):
+            print("Comparing blob detectors with image %s.." % test_image)
+            self.assert_equivalent(cv2.imread(test_image, cv2.IMREAD_GRAYSCALE))
+
+
+if __name__ == "__main__":
+    unittest.main()
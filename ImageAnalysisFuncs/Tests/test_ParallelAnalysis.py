@@ -0,0 +1,109 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from ImageAnalysisFuncs.base import ImageAnalysisError
+from ImageAnalysisFuncs.target_tracking import TargetTracker, detect_targets
+from vfr.parallel_analysis import analyze_images
+
+
+def first_brightest_pixel(image):
+    """detection function for the tests, returns the position of the
+    first brightest pixel in raster order, so that the result depends
+    on the searched region when several pixels are equally bright."""
+    if image.max() < 128:
+        raise ImageAnalysisError("no target found")
+    y, x = np.unravel_index(np.argmax(image), image.shape)
+    return [(int(x), int(y))]
+
+
+def brightest_pixel_coordinates(ipath, pars=None, tracker=None):
+    return detect_targets(ipath, first_brightest_pixel, tracker=tracker)[0]
+
+
+class DictCache:
+    """analysis cache for the tests, which keeps the entries in memory."""
+
+    def __init__(self):
+        self.entries = {}
+        self.image_hashes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, ipath, analysis_func, version, pars, key_pars=None, tracker=None):
+        return (ipath, None if tracker is None else tracker.key())
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, result=None, error=None):
+        self.entries[key] = {"result": result, "error": error}
+
+    def put_many(self, entries):
+        for key, result, error in entries:
+            self.put(key, result=result, error=error)
+
+
+class TestParallelAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.images = []
+        for i in range(11):
+            image = np.zeros((120, 200), dtype=np.uint8)
+            image[100, 50 + 3 * i] = 255
+            if i > 0:
+                # an equally bright distractor, which is found first by a
+                # full-frame search, but lies outside of the tracked region
+                image[5, 5] = 255
+            ipath = os.path.join(self.tmpdir, "image%02i.png" % i)
+            cv2.imwrite(ipath, image)
+            self.images.append((i, ipath))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def analyze(self, workers, cache=None):
+        results = analyze_images(
+            self.images,
+            brightest_pixel_coordinates,
+            cache=cache,
+            workers=workers,
+            tracker=TargetTracker(margin=10, run_length=4),
+        )
+        return [results[k] for k, _ in self.images]
+
+    def test_tracked_runs(self):
+        target = [(50 + 3 * i, 100) for i in range(11)]
+        distractor = (5, 5)
+
+        # the tracker is reset at the start of each run of four images
+        serial = self.analyze(workers=1)
+        self.assertEqual(serial[:4], target[:4])
+        self.assertEqual(serial[4:], [distractor] * 7)
+
+        for workers in [2, 3, 4]:
+            self.assertEqual(self.analyze(workers=workers), serial)
+
+    def test_tracked_runs_with_cache(self):
+        serial = self.analyze(workers=1)
+
+        for workers in [1, 3]:
+            cache = DictCache()
+            self.analyze(workers=workers, cache=cache)
+            self.assertEqual(len(cache.entries), len(self.images))
+
+            # an image which is missing in the cache is analyzed with its run
+            del cache.entries[(self.images[2][1], ("roi-tracking", 10, 4))]
+            del cache.entries[(self.images[5][1], ("roi-tracking", 10, 4))]
+            self.assertEqual(self.analyze(workers=workers, cache=cache), serial)
+            self.assertEqual(len(cache.entries), len(self.images))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy as np
+
+from ImageAnalysisFuncs.base import ImageAnalysisError
+from ImageAnalysisFuncs.target_tracking import TargetTracker, detect_targets
+
+
+def brightest_pixel(image):
+    """detection function for the tests, returns the position of
+    the brightest pixel, and fails for images without a bright pixel."""
+    if image.max() < 128:
+        raise ImageAnalysisError("no target found")
+    y, x = np.unravel_index(np.argmax(image), image.shape)
+    return [(x, y, 1.0)]
+
+
+class TestTargetTracking(unittest.TestCase):
+    def image(self, x, y):
+        image = np.zeros((200, 300), dtype=np.uint8)
+        image[y, x] = 255
+        return image
+
+    def test_roi(self):
+        tracker = TargetTracker(margin=10)
+        self.assertIsNone(tracker.roi((200, 300)))
+
+        tracker.update([(50, 60), (80, 70)])
+        self.assertEqual(tracker.roi((200, 300)), (40, 50, 91, 81))
+
+        # the region is clipped to the image
+        tracker.update([(5, 195)])
+        self.assertEqual(tracker.roi((200, 300)), (0, 185, 16, 200))
+
+    def test_tracking(self):
+        tracker = TargetTracker(margin=20)
+
+        points = detect_targets(self.image(100, 100), brightest_pixel, tracker)
+        self.assertEqual(points, [(100, 100, 1.0)])
+        self.assertEqual((tracker.hits, tracker.misses), (0, 0))
+
+        # small movement, found in the region of interest
+        points = detect_targets(self.image(110, 95), brightest_pixel, tracker)
+        self.assertEqual(points, [(110, 95, 1.0)])
+        self.assertEqual((tracker.hits, tracker.misses), (1, 0))
+
+        # large movement, found by the full-frame search
+        points = detect_targets(self.image(250, 20), brightest_pixel, tracker)
+        self.assertEqual(points, [(250, 20, 1.0)])
+        self.assertEqual((tracker.hits, tracker.misses), (1, 1))
+
+    def test_failure(self):
+        tracker = TargetTracker(margin=20)
+        detect_targets(self.image(100, 100), brightest_pixel, tracker)
+
+        with self.assertRaises(ImageAnalysisError):
+            detect_targets(
+                np.zeros((200, 300), dtype=np.uint8), brightest_pixel, tracker
+            )
+
+        # the last known position is kept
+        self.assertEqual(tracker.points, [(100, 100)])
+
+
+if __name__ == "__main__":
+    unittest.main()
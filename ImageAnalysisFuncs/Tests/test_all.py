@@ -4,6 +4,12 @@ from ImageAnalysisFuncs.Tests.test_MetCal import TestMetCalImageAnalysis
 from ImageAnalysisFuncs.Tests.test_MetHeight import TestMetHeightImageAnalysis
 from ImageAnalysisFuncs.Tests.test_PosRep import TestPosRepImageAnalysis
 from ImageAnalysisFuncs.Tests.test_DatRep import TestDatRepImageAnalysis
+from ImageAnalysisFuncs.Tests.test_ImageLoading import TestImageLoading
+from ImageAnalysisFuncs.Tests.test_TargetTracking import TestTargetTracking
+from ImageAnalysisFuncs.Tests.test_OtsuComponents import TestOtsuComponents
+from ImageAnalysisFuncs.Tests.test_CorrectionBatch import TestCorrectionBatch
+from ImageAnalysisFuncs.Tests.test_ImageWriter import TestImageWriter
+from ImageAnalysisFuncs.Tests.test_ParallelAnalysis import TestParallelAnalysis
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,8 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import division, print_function
 
-import cv2
-from ImageAnalysisFuncs.base import ImageAnalysisError
+from ImageAnalysisFuncs.base import ImageAnalysisError, load_image
 from ImageAnalysisFuncs import target_detection_contours, target_detection_otsu
 from target_detection_otsu import OtsuTargetFindingError
 
@@ -79,10 +78,7 @@ def metcalFibreCoordinates(image_path, pars=None):  # configurable parameters
     # Johannes Nix (code imported and re-formatted)
 
     # pylint: disable=no-member
-    image = cv2.imread(image_path)
-
-    # image processing
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = load_image(image_path)
 
     metcal_fibre_x = 0
     metcal_fibre_y = 0
@@ -1,10 +1,12 @@
 from __future__ import division, print_function
 
+from argparse import Namespace
+
 import cv2
-from ImageAnalysisFuncs.base import ImageAnalysisError
+import numpy as np
+from ImageAnalysisFuncs.base import ImageAnalysisError, load_image
 from matplotlib import pyplot as plt
-from numpy import float32, std, sqrt  # pylint: disable=no-name-in-module
-from numpy.polynomial import Polynomial
+from numpy import float32  # pylint: disable=no-name-in-module
 
 # version number for analysis algorithm
 # (each different result for the same data
@@ -12,6 +14,12 @@ from numpy.polynomial import Polynomial
 
 METROLOGY_HEIGHT_ANALYSIS_ALGORITHM_VERSION = (1,0,0)
 
+# pixel distances from side of beta arm to measurement points
+# these parameters could be made configurable but shouldn't need to be changed
+ARM_SURFACE_X = np.array([60, 320, 760, 980, 1220])
+SMALL_TARGET_X = np.array([100, 180, 260])
+LARGE_TARGET_X = np.array([380, 530, 680])
+
 
 # exceptions which are raised if image analysis functions fail
 
@@ -20,36 +28,47 @@ class MetrologyHeightAnalysisError(ImageAnalysisError):
     pass
 
 
-def methtHeight(
-    image_path, pars=None  # configurable parameters
-):  # will thresholded image
-
-    """reads an image from the metrology height camera and
-        returns the heights and quality metric of the two targets in mm"""
-
-    # Authors: Stephen Watson (initial algorithm March 4, 2019)
-    # Johannes Nix (code imported and re-formatted)
-
-    # image processing
+def threshold_image(image_path, pars):
+    """returns the blurred and thresholded image as float32 array."""
     # pylint: disable=no-member
-    image = cv2.imread(image_path)
+    image = load_image(image_path)
     blur = cv2.GaussianBlur(image, (pars.METHT_GAUSS_BLUR, pars.METHT_GAUSS_BLUR), 0)
-    gray = cv2.cvtColor(blur, cv2.COLOR_BGR2GRAY)
-    gray = float32(gray)
+    gray = float32(blur)
 
     tval, thresh = cv2.threshold(gray, pars.METHT_THRESHOLD, 255, 0, cv2.THRESH_BINARY)
+    return thresh
+
+
+def find_beta_side(scan_line):
+    """returns the x coordinate of the last falling edge in
+    the scan line, or 0 if there is none."""
+    falling = np.flatnonzero(np.diff(scan_line) < 0)
+    if len(falling) == 0:
+        return 0
+    return falling[-1]
+
+
+def first_transitions(columns):
+    """returns, for each column of an (height, n) array, the row
+    index of the first change of the pixel value, or -1 if the
+    column has no transition."""
+    changes = np.diff(columns, axis=0) != 0
+    return np.where(changes.any(axis=0), changes.argmax(axis=0), -1)
+
+
+def scan_image(image_path, pars):
+    """finds the beta arm side and the surface points in one image.
+
+    Returns the noise metric of the thresholded image and the y
+    coordinates of the arm surface, small target and large
+    target points.
+    """
+    thresh = threshold_image(image_path, pars)
 
     # find location of beta arm
-    betaScan = thresh[pars.METHT_SCAN_HEIGHT, :]
-    betaSide = 0
-    for i in range(0, len(betaScan) - 1):
-        if (betaScan[i + 1] - betaScan[i]) < 0:
-            betaSide = i
-            if pars.verbosity > 5:
-                print(
-                    "Image %s: Beta arm side is at x-coordinate %i"
-                    % (image_path, betaSide)
-                )
+    betaSide = find_beta_side(thresh[pars.METHT_SCAN_HEIGHT, :])
+    if pars.verbosity > 5:
+        print("Image %s: Beta arm side is at x-coordinate %i" % (image_path, betaSide))
 
     if betaSide == 0:
         raise MetrologyHeightAnalysisError(
@@ -57,6 +76,13 @@ def methtHeight(
             % image_path
         )
 
+    scan_x = betaSide + np.concatenate([ARM_SURFACE_X, SMALL_TARGET_X, LARGE_TARGET_X])
+    if scan_x.max() >= thresh.shape[1]:
+        raise MetrologyHeightAnalysisError(
+            "Image %s: Beta arm side at x-coordinate %i is too close"
+            " to the image border" % (image_path, betaSide)
+        )
+
     threshcrop = thresh[1750:2700, betaSide - 100 : betaSide + 1500]
     if pars.display == True:
         plt.imshow(threshcrop)
@@ -67,7 +93,7 @@ def methtHeight(
     threshblur = cv2.GaussianBlur(threshcrop, (3, 3), 0)
     threshave, threshstd = cv2.meanStdDev(threshcrop)
     threshblurave, threshblurstd = cv2.meanStdDev(threshblur)
-    noiseMetric = (threshstd - threshblurstd) / threshblurstd * 100
+    noiseMetric = float((threshstd - threshblurstd) / threshblurstd * 100)
 
     if pars.verbosity > 5:
         print(
@@ -75,101 +101,161 @@ def methtHeight(
             % (image_path, noiseMetric)
         )
 
-    # pixel distances from side of beta arm to measurement points
-    # these parameters could be made configurable but shouldn't need to be changed
-    armSurfaceX = [60, 320, 760, 980, 1220]
-    smallTargetX = [100, 180, 260]
-    largeTargetX = [380, 530, 680]
-
-    # fills lists with pixel values at X coordinates defined above
-    armSurfacePix, smallTargetPix, largeTargetPix = [], [], []
-    for i in range(0, 5):
-        armSurfacePix.append(thresh[:, betaSide + armSurfaceX[i]])
-    for i in range(0, 3):
-        smallTargetPix.append(thresh[:, betaSide + smallTargetX[i]])
-        largeTargetPix.append(thresh[:, betaSide + largeTargetX[i]])
-
     # looks for pixel transitions indicating surfaces
-    armSurfaceY, smallTargetY, largeTargetY = [None] * 5, [None] * 3, [None] * 3
-    for i in range(0, 5):
-        for p in range(0, len(thresh) - 1):
-            if abs(armSurfacePix[i][p + 1] - armSurfacePix[i][p]) > 0:
-                armSurfaceY[i] = p
-                break
-    for i in range(0, 3):
-        for p in range(0, len(thresh) - 1):
-            if abs(smallTargetPix[i][p + 1] - smallTargetPix[i][p]) > 0:
-                smallTargetY[i] = p
-                break
-    for i in range(0, 3):
-        for p in range(0, len(thresh) - 1):
-            if abs(largeTargetPix[i][p + 1] - largeTargetPix[i][p]) > 0:
-                largeTargetY[i] = p
-                break
+    surfaceY = first_transitions(thresh[:, scan_x])
+    armSurfaceY = surfaceY[: len(ARM_SURFACE_X)]
+    smallTargetY = surfaceY[len(ARM_SURFACE_X) : -len(LARGE_TARGET_X)]
+    largeTargetY = surfaceY[-len(LARGE_TARGET_X) :]
 
     if pars.verbosity > 5:
         print("Image %s:" % image_path)
-        print("Arm surface points found - x:%s y:%s" % (armSurfaceX, armSurfaceY))
-        print("Small target points found - x:%s y:%s" % (smallTargetX, smallTargetY))
-        print("Large target points found - x:%s y:%s" % (largeTargetX, largeTargetY))
+        print("Arm surface points found - x:%s y:%s" % (ARM_SURFACE_X, armSurfaceY))
+        print("Small target points found - x:%s y:%s" % (SMALL_TARGET_X, smallTargetY))
+        print("Large target points found - x:%s y:%s" % (LARGE_TARGET_X, largeTargetY))
 
-    # best fit straight line through 5 beta arm surface points
-    try:
-        armSurfaceDom = Polynomial.fit(armSurfaceX, armSurfaceY, 1, domain=(-1, 1))
-        armSurface = armSurfaceDom.convert().coef
-    except TypeError as err:
+    if np.any(armSurfaceY < 0):
         raise MetrologyHeightAnalysisError(
-            "Image %s: Polynomial fit failed with TypeError exception (message %s)"
-            % (image_path, str(err))
+            "Image %s: Beta arm surface points not found, cannot fit arm surface"
+            % image_path
+        )
+    if np.any(smallTargetY < 0) or np.any(largeTargetY < 0):
+        raise MetrologyHeightAnalysisError(
+            "Image %s: Target surface points not found" % image_path
+        )
+
+    return noiseMetric, armSurfaceY, smallTargetY, largeTargetY
+
+
+def methtHeights(image_paths, pars=None):
+    """analyzes a batch of images from the metrology height camera.
+
+    Returns a Namespace with the arrays small_target_heights,
+    large_target_heights and noise_metrics, and the list errors, which
+    holds None or the MetrologyHeightAnalysisError of each image. The
+    heights of failed images are NaN.
+
+    The line fits and target heights are computed for all images
+    at once.
+    """
+    image_paths = list(image_paths)
+    N = len(image_paths)
+
+    errors = [None] * N
+    noise_metrics = np.full(N, np.nan)
+    armSurfaceY = np.zeros((N, len(ARM_SURFACE_X)))
+    smallTargetY = np.zeros((N, len(SMALL_TARGET_X)))
+    largeTargetY = np.zeros((N, len(LARGE_TARGET_X)))
+
+    for n, image_path in enumerate(image_paths):
+        try:
+            (
+                noise_metrics[n],
+                armSurfaceY[n],
+                smallTargetY[n],
+                largeTargetY[n],
+            ) = scan_image(image_path, pars)
+        except ImageAnalysisError as err:
+            errors[n] = err
+
+    small_target_heights = np.full(N, np.nan)
+    large_target_heights = np.full(N, np.nan)
+    valid = np.array([err is None for err in errors], dtype=bool)
+    if not np.any(valid):
+        return Namespace(
+            small_target_heights=small_target_heights,
+            large_target_heights=large_target_heights,
+            noise_metrics=noise_metrics,
+            errors=errors,
         )
 
+    # best fit straight line through 5 beta arm surface points
+    a, c = np.polyfit(ARM_SURFACE_X, armSurfaceY[valid].T, 1)
+
     # calculates normal distance from points on targets to beta arm surface
     # D = |a*x_n + b*y_n + c|/sqrt(a^2 + b^2) where line is defined as ax + by + c = 0
-    a = armSurface[1]
     b = -1
-    c = armSurface[0]
-    smallTargetHeights, largeTargetHeights = [None] * 3, [None] * 3
-    for i in range(0, 3):
-        smallTargetHeights[i] = (a * smallTargetX[i] + b * smallTargetY[i] + c) / sqrt(
-            a ** 2 + b ** 2
-        )
-        largeTargetHeights[i] = (a * largeTargetX[i] + b * largeTargetY[i] + c) / sqrt(
-            a ** 2 + b ** 2
-        )
+    norm = np.sqrt(a ** 2 + b ** 2)[:, np.newaxis]
+    smallTargetHeights = (
+        a[:, np.newaxis] * SMALL_TARGET_X + b * smallTargetY[valid] + c[:, np.newaxis]
+    ) / norm
+    largeTargetHeights = (
+        a[:, np.newaxis] * LARGE_TARGET_X + b * largeTargetY[valid] + c[:, np.newaxis]
+    ) / norm
 
     # calculates standard deviation of heights to see how level the targets are
-    stdSmallTarget = std(smallTargetHeights) * pars.METHT_PLATESCALE
-    stdLargeTarget = std(largeTargetHeights) * pars.METHT_PLATESCALE
-    if pars.verbosity > 5:
-        print(
-            "Image %s: Standard deviations of small/large target heights are %.3f and %.3f"
-            % (image_path, stdSmallTarget, stdLargeTarget)
-        )
+    stdSmallTarget = np.std(smallTargetHeights, axis=1) * pars.METHT_PLATESCALE
+    stdLargeTarget = np.std(largeTargetHeights, axis=1) * pars.METHT_PLATESCALE
+
+    small_target_heights[valid] = (
+        np.mean(smallTargetHeights, axis=1) * pars.METHT_PLATESCALE
+    )
+    large_target_heights[valid] = (
+        np.mean(largeTargetHeights, axis=1) * pars.METHT_PLATESCALE
+    )
 
     # exceptions
-    if stdSmallTarget > pars.METHT_STANDARD_DEV:
-        raise MetrologyHeightAnalysisError(
-            "Image %s: Small target points have high standard deviation"
-            " - target may not be sitting flat" % image_path
-        )
+    for k, n in enumerate(np.flatnonzero(valid)):
+        image_path = image_paths[n]
+        if pars.verbosity > 5:
+            print(
+                "Image %s: Standard deviations of small/large target heights"
+                " are %.3f and %.3f"
+                % (image_path, stdSmallTarget[k], stdLargeTarget[k])
+            )
 
-    if stdLargeTarget > pars.METHT_STANDARD_DEV:
-        raise MetrologyHeightAnalysisError(
-            "Image %s: Large target points have high standard deviation"
-            " - target may not be sitting flat" % image_path
-        )
+        if stdSmallTarget[k] > pars.METHT_STANDARD_DEV:
+            errors[n] = MetrologyHeightAnalysisError(
+                "Image %s: Small target points have high standard deviation"
+                " - target may not be sitting flat" % image_path
+            )
+        elif stdLargeTarget[k] > pars.METHT_STANDARD_DEV:
+            errors[n] = MetrologyHeightAnalysisError(
+                "Image %s: Large target points have high standard deviation"
+                " - target may not be sitting flat" % image_path
+            )
+        elif noise_metrics[n] > pars.METHT_NOISE_METRIC:
+            errors[n] = MetrologyHeightAnalysisError(
+                "Image %s: Image noise excessive - consider "
+                "changing Gaussian blur value" % image_path
+            )
 
-    if noiseMetric > pars.METHT_NOISE_METRIC:
-        raise MetrologyHeightAnalysisError(
-            "Image %s: Image noise excessive - consider "
-            "changing Gaussian blur value" % image_path
-        )
+        if errors[n] is not None:
+            small_target_heights[n] = np.nan
+            large_target_heights[n] = np.nan
 
-    metht_small_target_height = (
-        sum(smallTargetHeights) / len(smallTargetHeights) * pars.METHT_PLATESCALE
-    )
-    metht_large_target_height = (
-        sum(largeTargetHeights) / len(largeTargetHeights) * pars.METHT_PLATESCALE
+    return Namespace(
+        small_target_heights=small_target_heights,
+        large_target_heights=large_target_heights,
+        noise_metrics=noise_metrics,
+        errors=errors,
     )
 
-    return metht_small_target_height, metht_large_target_height
+
+def methtHeight_batch(image_paths, pars=None):
+    """returns a list of ((small target height, large target height), error)
+    pairs, one for each image, where error is None or the
+    MetrologyHeightAnalysisError of the image. See methtHeights()."""
+    result = methtHeights(image_paths, pars=pars)
+    return [
+        ((small, large), err) if err is None else (None, err)
+        for small, large, err in zip(
+            result.small_target_heights, result.large_target_heights, result.errors
+        )
+    ]
+
+
+def methtHeight(
+    image_path, pars=None  # configurable parameters
+):  # will thresholded image
+
+    """reads an image from the metrology height camera and
+        returns the heights and quality metric of the two targets in mm"""
+
+    # Authors: Stephen Watson (initial algorithm March 4, 2019)
+    # Johannes Nix (code imported and re-formatted)
+
+    result = methtHeights([image_path], pars=pars)
+    if result.errors[0] is not None:
+        raise result.errors[0]
+
+    return result.small_target_heights[0], result.large_target_heights[0]
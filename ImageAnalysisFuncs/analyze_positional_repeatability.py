@@ -12,6 +12,8 @@ Created on 20/03/2019
 """
 from __future__ import division, print_function
 
+import numpy as np
+
 from ImageAnalysisFuncs.base import ImageAnalysisError
 from ImageAnalysisFuncs import target_detection_contours, target_detection_otsu
 
@@ -29,10 +31,14 @@ CONTOUR_ALGORITHM = "contour"
 OTSU_ALGORITHM = "otsu"
 
 
-def posrepCoordinates(image_path, pars=None, correct=None):
+def posrepCoordinates(image_path, pars=None, correct=None, tracker=None):
     """ Reads the image and analyse the location and quality of the targets
      using the chosen algorithm
 
+    tracker is an optional TargetTracker (see
+    ImageAnalysisFuncs.target_tracking), which is passed
+    to the target detection.
+
 
     :return: A tuple length 6 containing the x,y coordinate and quality factor for the small and large targets
     Where quality is measured by 4 * pi * (area / (perimeter * perimeter)).
@@ -57,4 +63,48 @@ def posrepCoordinates(image_path, pars=None, correct=None):
     func_pars.loglevel = pars.loglevel
     func_pars.PLATESCALE = pars.PLATESCALE
 
-    return analysis_func(image_path, pars=func_pars, correct=correct)
+    return analysis_func(image_path, pars=func_pars, correct=correct, tracker=tracker)
+
+
+def _identity(x, y):
+    return x, y
+
+
+def posrepPixelCoordinates(image_path, pars=None, tracker=None):
+    """Like posrepCoordinates(), but returns the target positions in
+    pixels, without distortion correction.
+
+    The positions of a whole measurement can then be corrected at once
+    with correctCoordinates(). The function has its own name, so that
+    its results are cached separately from the corrected ones.
+    """
+    return posrepCoordinates(image_path, pars=pars, correct=_identity, tracker=tracker)
+
+
+def correctCoordinates(coordinates, correct):
+    """Corrects the pixel positions of a dictionary of results of
+    posrepPixelCoordinates() in one call of the correction function,
+    which must accept coordinate arrays (see
+    DistortionCorrection.get_correction_func).
+
+    :return: A dictionary with the same keys, and tuples of the
+    corrected coordinates and the qualities.
+    """
+    keys = list(coordinates)
+    if not keys:
+        return {}
+
+    px = np.array([coordinates[k] for k in keys], dtype=float)
+    x, y = correct(px[:, [0, 3]], px[:, [1, 4]])
+
+    return {
+        k: (
+            float(x[i, 0]),
+            float(y[i, 0]),
+            coordinates[k][2],
+            float(x[i, 1]),
+            float(y[i, 1]),
+            coordinates[k][5],
+        )
+        for i, k in enumerate(keys)
+    }
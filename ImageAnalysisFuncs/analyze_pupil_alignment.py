@@ -2,9 +2,8 @@ from __future__ import division, print_function
 
 import logging
 
-import cv2
 from DistortionCorrection import get_correction_func
-from ImageAnalysisFuncs.base import ImageAnalysisError
+from ImageAnalysisFuncs.base import ImageAnalysisError, load_image
 
 # exceptions which are raised if image analysis functions fail
 
@@ -44,9 +43,8 @@ def pupalnCoordinates(
             loglevel=pars.loglevel,
         )
 
-    image = cv2.imread(image_path)
+    image = load_image(image_path)
 
-    assert image
     # image processing
 
     pupaln_spot_x = 0
@@ -1,5 +1,9 @@
 from __future__ import division, print_function
 
+import io
+import threading
+
+import cv2
 from numpy import array
 import numpy as np
 
@@ -8,6 +12,72 @@ class ImageAnalysisError(Exception):
     pass
 
 
+class ImageLoadError(ImageAnalysisError):
+    pass
+
+
+# per-thread file read buffer of load_image()
+_read_buffers = threading.local()
+
+
+def _read_file(image_path):
+    """reads a file into the read buffer of the current thread,
+    which is reused and only grows, and returns a uint8 array
+    view of the file contents."""
+    buf = getattr(_read_buffers, "buf", None)
+    with io.open(image_path, "rb") as f:
+        size = f.seek(0, io.SEEK_END)
+        f.seek(0)
+        if (buf is None) or (len(buf) < size):
+            buf = _read_buffers.buf = bytearray(size)
+        nread = f.readinto(memoryview(buf)[:size])
+    return np.frombuffer(buf, dtype=np.uint8, count=nread)
+
+
+def load_image(image):
+    """returns an image as 8-bit grayscale array.
+
+    image is either the path of an image file, which is decoded
+    directly to grayscale, or an already loaded array. Grayscale
+    arrays are returned unchanged, and BGR arrays are converted.
+
+    The cameras deliver monochrome images, so that decoding to
+    grayscale avoids to expand each pixel to three channels and
+    convert it back. Raw ".npy" images are memory-mapped. Arrays
+    with 16 bits per pixel are reduced to 8 bits, as image files are
+    by cv2.imdecode(). Raises ImageLoadError if the image cannot be
+    read.
+    """
+    if not isinstance(image, np.ndarray) and image.lower().endswith(".npy"):
+        try:
+            image = np.load(image, mmap_mode="r", allow_pickle=False)
+        except (IOError, OSError, ValueError) as err:
+            raise ImageLoadError("image %s could not be read: %s" % (image, err))
+
+    if isinstance(image, np.ndarray):
+        if image.dtype == np.uint16:
+            image = (image >> 8).astype(np.uint8)
+        if image.ndim == 2:
+            return image
+        if (image.ndim == 3) and (image.shape[2] == 3):
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        raise ImageLoadError(
+            "image array with shape %r is neither grayscale nor BGR" % (image.shape,)
+        )
+
+    try:
+        data = _read_file(image)
+    except (IOError, OSError) as err:
+        raise ImageLoadError("image %s could not be read: %s" % (image, err))
+
+    # pylint: disable=no-member
+    gray = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ImageLoadError("image %s could not be decoded" % image)
+
+    return gray
+
+
 def get_min_quality(list_of_coords):
     """compute minimum quality from a set of coordinate / quality triple
     pairs, as computed by posRepCoordinates()
@@ -7,6 +7,7 @@ import numpy as np
 import cv2
 from DistortionCorrection import get_correction_func
 from ImageAnalysisFuncs.base import ImageAnalysisError
+from ImageAnalysisFuncs.target_tracking import detect_targets
 
 # exceptions which are raised if image analysis functions fail
 
@@ -20,10 +21,14 @@ def targetCoordinates(
     # configurable parameters
     pars=None,
     correct=None,
+    tracker=None,
 ):  # will display image with contours annotated
 
     """reads an image from the positional repeatability camera and returns
-        the XY coordinates and circularity of the two targets in mm"""
+        the XY coordinates and circularity of the two targets in mm
+
+        If a TargetTracker is passed, the targets are first searched
+        in the region around the targets of the previous image."""
 
     # Authors: Stephen Watson (initial algorithm March 4, 2019)
     # Johannes Nix (code imported and re-formatted)
@@ -68,129 +73,137 @@ def targetCoordinates(
             )
         )
 
-    centres = {}
-
-    # pylint: disable=no-member
-    image = cv2.imread(image_path)
-
-    # image processing
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    # FIXME: gray is unused!
-    blur = cv2.GaussianBlur(gray, (9, 9), 0)
-    thresh = cv2.threshold(blur, pars.THRESHOLD, 255, cv2.THRESH_BINARY)[1]
-
-    # find contours from thresholded image
-    cnts = sorted(
-        cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[1],
-        key=cv2.contourArea,
-        reverse=True,
-    )[:15]
-
-    largeTargetFound, smallTargetFound, multipleSmall, multipleLarge = (
-        False,
-        False,
-        False,
-        False,
-    )
+    def detect(gray):
+        centres = {}
+
+        # pylint: disable=no-member
+        if pars.display == True:
+            # color copy for the annotations
+            image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+        # image processing
+        blur = cv2.GaussianBlur(gray, (9, 9), 0)
+        thresh = cv2.threshold(blur, pars.THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+
+        # find contours from thresholded image
+        cnts = sorted(
+            cv2.findContours(
+                thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+            )[1],
+            key=cv2.contourArea,
+            reverse=True,
+        )[:15]
+
+        largeTargetFound, smallTargetFound, multipleSmall, multipleLarge = (
+            False,
+            False,
+            False,
+            False,
+        )
 
-    # filter through contours on size and circularity
-    for i, c in enumerate(cnts):
-        perimeter = cv2.arcLength(c, True)
-        area = cv2.contourArea(c)
-        if area > 0 and perimeter > 0:
-            circularity = 4 * pi * (area / (perimeter * perimeter))
-        if pars.verbosity > 5:
-            print(
-                "Image %s: ContourID - %i; perimeter - %.2f; circularity - %.2f"
-                % (image_path, i, perimeter, circularity)
-            )
-        if circularity > pars.QUALITY_METRIC:
-            if perimeter > smallPerimeterLo and perimeter < smallPerimeterHi:
-                if smallTargetFound == True:
-                    multipleSmall = True
-                circle = "Small Target"
-                smallTargetFound = True
-            elif perimeter > largePerimeterLo and perimeter < largePerimeterHi:
-                if largeTargetFound == True:
-                    multipleLarge = True
-                circle = "Large Target"
-                largeTargetFound = True
-            else:
-                circle = "N" + str(i)
-
-            # finds contour momenIA.posrepCoordinates("./PT25_posrep_1_001.bmp")ts,
-            # which can be used to derive centre of mass
-            M = cv2.moments(c)
-            if M["m00"] == 0:
-                raise TargetDetectionContoursError(
-                    "image %s: Moment m00 is zero, would cause"
-                    " division by zero in analysis" % image_path
-                )
-            cX = M["m10"] / M["m00"]
-            cY = M["m01"] / M["m00"]
-            centres[circle] = (cX, cY, circularity, i)
-
-            # superimpose contours and labels onto original image, user prompt required in terminal to progress
-            if pars.display == True:
-                cv2.drawContours(image, cnts, -1, (0, 255, 0), 2)
-                label = (
-                    str(i)
-                    + ", "
-                    + str(round(perimeter, 1))
-                    + ", "
-                    + str(round(circularity, 2))
-                    + " = "
-                    + circle
+        # filter through contours on size and circularity
+        for i, c in enumerate(cnts):
+            perimeter = cv2.arcLength(c, True)
+            area = cv2.contourArea(c)
+            if area > 0 and perimeter > 0:
+                circularity = 4 * pi * (area / (perimeter * perimeter))
+            if pars.verbosity > 5:
+                print(
+                    "Image %s: ContourID - %i; perimeter - %.2f; circularity - %.2f"
+                    % (image_path, i, perimeter, circularity)
                 )
-                cv2.putText(
-                    image,
-                    label,
-                    (int(cX), int(cY)),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    2,
-                    (255, 255, 255),
-                    2,
-                    1,
-                )
-                cv2.imshow("image", cv2.resize(image, (0, 0), fx=0.3, fy=0.3))
-                cv2.waitKey(100)
-                raw_input("Press enter to continue")
+            if circularity > pars.QUALITY_METRIC:
+                if perimeter > smallPerimeterLo and perimeter < smallPerimeterHi:
+                    if smallTargetFound == True:
+                        multipleSmall = True
+                    circle = "Small Target"
+                    smallTargetFound = True
+                elif perimeter > largePerimeterLo and perimeter < largePerimeterHi:
+                    if largeTargetFound == True:
+                        multipleLarge = True
+                    circle = "Large Target"
+                    largeTargetFound = True
+                else:
+                    circle = "N" + str(i)
+
+                # finds contour momenIA.posrepCoordinates("./PT25_posrep_1_001.bmp")ts,
+                # which can be used to derive centre of mass
+                M = cv2.moments(c)
+                if M["m00"] == 0:
+                    raise TargetDetectionContoursError(
+                        "image %s: Moment m00 is zero, would cause"
+                        " division by zero in analysis" % image_path
+                    )
+                cX = M["m10"] / M["m00"]
+                cY = M["m01"] / M["m00"]
+                centres[circle] = (cX, cY, circularity, i)
+
+                # superimpose contours and labels onto original image, user prompt required in terminal to progress
+                if pars.display == True:
+                    cv2.drawContours(image, cnts, -1, (0, 255, 0), 2)
+                    label = (
+                        str(i)
+                        + ", "
+                        + str(round(perimeter, 1))
+                        + ", "
+                        + str(round(circularity, 2))
+                        + " = "
+                        + circle
+                    )
+                    cv2.putText(
+                        image,
+                        label,
+                        (int(cX), int(cY)),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        2,
+                        (255, 255, 255),
+                        2,
+                        1,
+                    )
+                    cv2.imshow("image", cv2.resize(image, (0, 0), fx=0.3, fy=0.3))
+                    cv2.waitKey(100)
+                    raw_input("Press enter to continue")
+
+        if multipleSmall == True:
+            raise TargetDetectionContoursError(
+                "Image %s: Multiple small targets found - tighten parameters or use "
+                "display option to investigate images for contamination" % image_path
+            )
+        if multipleLarge == True:
+            raise TargetDetectionContoursError(
+                "Image %s: Multiple large targets found - tighten parameters or"
+                " use display option to investigate images for contamination"
+                % image_path
+            )
 
-    if multipleSmall == True:
-        raise TargetDetectionContoursError(
-            "Image %s: Multiple small targets found - tighten parameters or use "
-            "display option to investigate images for contamination" % image_path
-        )
-    if multipleLarge == True:
-        raise TargetDetectionContoursError(
-            "Image %s: Multiple large targets found - tighten parameters or"
-            " use display option to investigate images for contamination" % image_path
-        )
+        if smallTargetFound == False:
+            raise TargetDetectionContoursError(
+                "Image %s: Small target not found - "
+                "loosen diameter tolerance or change image thresholding" % image_path
+            )
 
-    if smallTargetFound == False:
-        raise TargetDetectionContoursError(
-            "Image %s: Small target not found - "
-            "loosen diameter tolerance or change image thresholding" % image_path
-        )
+        if largeTargetFound == False:
+            raise TargetDetectionContoursError(
+                "Image %s: Large target not found - "
+                "loosen diameter tolerance or change image thresholding" % image_path
+            )
 
-    if largeTargetFound == False:
-        raise TargetDetectionContoursError(
-            "Image %s: Large target not found - "
-            "loosen diameter tolerance or change image thresholding" % image_path
-        )
+        if pars.verbosity > 5:
+            print(
+                "Image %s: Contour %i = small target, contour %i = large target"
+                % (image_path, centres["Small Target"][3], centres["Large Target"][3])
+            )
 
-    if pars.verbosity > 5:
-        print(
-            "Image %s: Contour %i = small target, contour %i = large target"
-            % (image_path, centres["Small Target"][3], centres["Large Target"][3])
-        )
+        return [centres["Small Target"][:3], centres["Large Target"][:3]]
+
+    small_target, large_target = detect_targets(image_path, detect, tracker=tracker)
 
-    pixels_posrep_small_target_x = centres["Small Target"][0]
-    pixels_posrep_small_target_y = centres["Small Target"][1]
-    posrep_small_target_quality = centres["Small Target"][2]
-    pixels_posrep_large_target_x = centres["Large Target"][0]
-    pixels_posrep_large_target_y = centres["Large Target"][1]
-    posrep_large_target_quality = centres["Large Target"][2]
+    pixels_posrep_small_target_x = small_target[0]
+    pixels_posrep_small_target_y = small_target[1]
+    posrep_small_target_quality = small_target[2]
+    pixels_posrep_large_target_x = large_target[0]
+    pixels_posrep_large_target_y = large_target[1]
+    posrep_large_target_quality = large_target[2]
 
     # scale and straighten the result coordinates
     # the distortion correction is applied here, using the 'correct' function
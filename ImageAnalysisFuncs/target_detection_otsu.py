@@ -6,7 +6,13 @@ import numpy as np
 import cv2
 
 from DistortionCorrection import get_correction_func
-from ImageAnalysisFuncs.base import ImageAnalysisError
+from ImageAnalysisFuncs.base import ImageAnalysisError, ImageLoadError, load_image
+from ImageAnalysisFuncs.target_tracking import detect_targets
+
+
+# blob detection methods, selected by the BLOB_DETECTION parameter
+SIMPLE_BLOB_DETECTION = "simple"
+COMPONENT_BLOB_DETECTION = "components"
 
 
 class OtsuTargetFindingError(ImageAnalysisError):
@@ -18,6 +24,19 @@ def distance(p1, p2):
     return math.hypot(p1[0] - p2[0], p1[1] - p2[1])
 
 
+def otsu_threshold(path):
+    """returns the grayscale image and the blurred, Otsu-thresholded image."""
+    try:
+        greyscale = load_image(path)
+    except ImageLoadError as err:
+        raise OtsuTargetFindingError(str(err))
+    blur = cv2.GaussianBlur(greyscale, (5, 5), 0)
+    _, thresholded = cv2.threshold(
+        blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
+    )
+    return greyscale, thresholded
+
+
 def find_bright_sharp_circles(path,
                               small_radius,
                               large_radius,
@@ -31,6 +50,9 @@ def find_bright_sharp_circles(path,
     Finds circular dots in the given image within the radius range, displaying
     them on console and graphically if show is set to True
 
+    path is an image path, or an already loaded image array
+    (see ImageAnalysisFuncs.base.load_image).
+
     Works by detecting white circular blobs in the raw image, and in an otsu
     thresholded copy.Circles that have similar center locations and radii in
     both images are kept.
@@ -45,18 +67,7 @@ def find_bright_sharp_circles(path,
 
     :return: a list of opencv blobs for each detected dot.
     """
-    image = cv2.imread(path)
-    try:
-        greyscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    except cv2.error as err:
-        raise OtsuTargetFindingError(
-            "OpenCV returned error %s for image %s" % (str(err), path)
-        )
-    blur = cv2.GaussianBlur(greyscale, (5, 5), 0)
-    _, thresholded = cv2.threshold(
-        blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
-    )
-    output = image.copy()
+    greyscale, thresholded = otsu_threshold(path)
 
     small_params = cv2.SimpleBlobDetector_Params()
     small_params.minArea = math.pi * (small_radius*(1-blob_size_tolerance)) ** 2
@@ -120,6 +131,8 @@ def find_bright_sharp_circles(path,
         print([(blob.pt[0], blob.pt[1], blob.size / 2.0) for blob in target_blob_list])
 
     if debugging:
+        image = cv2.cvtColor(greyscale, cv2.COLOR_GRAY2BGR)
+        output = image.copy()
         width, height = image.shape[1] // 4, image.shape[0] // 4
         shrunk_original = cv2.resize(image, (width, height))
         # ensure at least some circles were found
@@ -163,11 +176,162 @@ def find_bright_sharp_circles(path,
     return target_blob_list
 
 
-def targetCoordinates(image_path, pars=None, correct=None):
+def find_bright_sharp_circles_components(
+    path,
+    small_radius,
+    large_radius,
+    group_range=None,
+    quality=0.4,
+    blob_size_tolerance=0.2,
+    group_range_tolerance=0.2,
+    min_inertia_ratio=0.7,
+    min_convexity=0.7,
+    show=False,
+):
+    """
+    Finds circular dots like find_bright_sharp_circles(), with a single
+    connected-components pass over the Otsu-thresholded image instead of
+    two SimpleBlobDetectors.
+
+    The component statistics are only used to discard the components
+    which are far too small or too large to be a dot. The few remaining
+    candidates are measured from their outer contour, as the
+    SimpleBlobDetector does:
+
+    - the area is the contour area, which includes holes,
+    - the centre pixel must be white, which rejects rings,
+    - the circularity is 4 * pi * area / perimeter ** 2,
+    - the convexity is the ratio between the area and the area of the
+      convex hull,
+    - the inertia ratio is computed from the contour moments,
+    - the size is the diameter given by the median distance of the
+      contour points from the centre.
+
+    Dots are paired by the matrix of distances between small and large
+    dots. Like in find_bright_sharp_circles(), each small dot is paired
+    with the first large dot in range, and no dots are returned if
+    group_range is None.
+
+    :return: a list of cv2.KeyPoint objects for each detected dot.
+    """
+    _, thresholded = otsu_threshold(path)
+
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(
+        thresholded, connectivity=8
+    )
+
+    def area_limits(radius):
+        return (
+            math.pi * (radius * (1 - blob_size_tolerance)) ** 2,
+            math.pi * (radius * (1 + blob_size_tolerance)) ** 2,
+        )
+
+    small_limits = area_limits(small_radius)
+    large_limits = area_limits(large_radius)
+
+    # coarse preselection by the ellipse inscribed in the bounding box,
+    # with a wide margin, because the contour area of a component with
+    # holes or ragged edges differs from its pixel count. Label 0 is
+    # the background.
+    box_area = (
+        math.pi / 4.0 * stats[1:, cv2.CC_STAT_WIDTH] * stats[1:, cv2.CC_STAT_HEIGHT]
+    )
+    candidates = (
+        np.flatnonzero(
+            (box_area >= 0.5 * min(small_limits[0], large_limits[0]))
+            & (box_area <= 2.0 * max(small_limits[1], large_limits[1]))
+        )
+        + 1
+    )
+
+    small = []
+    large = []
+    for label in candidates:
+        x, y, w, h = stats[label, :4]
+        mask = (labels[y : y + h, x : x + w] == label).view(np.uint8)
+        contours = cv2.findContours(
+            mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE, offset=(int(x), int(y))
+        )[-2]
+        contour = max(contours, key=len)
+
+        moments = cv2.moments(contour)
+        area = moments["m00"]
+        is_small = small_limits[0] <= area < small_limits[1]
+        is_large = large_limits[0] <= area < large_limits[1]
+        if not (is_small or is_large):
+            continue
+
+        perimeter = cv2.arcLength(contour, True)
+        if 4 * math.pi * area / (perimeter * perimeter) < quality:
+            continue
+
+        denominator = math.sqrt(
+            (moments["mu20"] - moments["mu02"]) ** 2 + 4 * moments["mu11"] ** 2
+        )
+        trace = moments["mu20"] + moments["mu02"]
+        if trace + denominator <= 0:
+            continue
+        if (trace - denominator) / (trace + denominator) < min_inertia_ratio:
+            continue
+
+        hull_area = cv2.contourArea(cv2.convexHull(contour))
+        if (hull_area == 0) or (area / hull_area < min_convexity):
+            continue
+
+        cx = moments["m10"] / area
+        cy = moments["m01"] / area
+        if thresholded[int(cy + 0.5), int(cx + 0.5)] != 255:
+            # like the blob colour filter, which rejects rings
+            continue
+
+        distances = np.sort(np.hypot(contour[:, 0, 0] - cx, contour[:, 0, 1] - cy))
+        n = len(distances)
+        radius = (distances[(n - 1) // 2] + distances[n // 2]) / 2.0
+
+        keypoint = cv2.KeyPoint(cx, cy, 2.0 * radius)
+        if is_small:
+            small.append(keypoint)
+        if is_large:
+            large.append(keypoint)
+
+    if show:
+        print(path)
+        print("small round blobs:")
+        print([(blob.pt[0], blob.pt[1], blob.size / 2.0) for blob in small])
+        print("large round blobs:")
+        print([(blob.pt[0], blob.pt[1], blob.size / 2.0) for blob in large])
+
+    if (group_range is None) or (len(small) == 0) or (len(large) == 0):
+        return []
+
+    small_centres = np.array([blob.pt for blob in small])
+    large_centres = np.array([blob.pt for blob in large])
+    distances = np.sqrt(
+        np.sum(
+            (small_centres[:, np.newaxis, :] - large_centres[np.newaxis, :, :]) ** 2,
+            axis=2,
+        )
+    )
+    in_range = (distances > group_range * (1 - group_range_tolerance)) & (
+        distances < group_range * (1 + group_range_tolerance)
+    )
+
+    accepted = []
+    for i in np.flatnonzero(np.any(in_range, axis=1)):
+        j = np.argmax(in_range[i])
+        accepted.append(small[i])
+        accepted.append(large[j])
+
+    return accepted
+
+
+def targetCoordinates(image_path, pars=None, correct=None, tracker=None):
     """Wrapper for find_bright_sharp_circles
 
     :param image_path:
     :param pars:
+    :param tracker: optional TargetTracker, which restricts the search
+    to the region around the targets of the previous image
     :return: A tuple length 6 containing the x,y coordinate in mm and a minimun
     guaranteed quality factor for the small and large targets
     (small_x, small_y, small_qual, big_x, big_y, big_qual)
@@ -187,31 +351,49 @@ def targetCoordinates(image_path, pars=None, correct=None):
     large_radius_px = pars.LARGE_RADIUS / pars.PLATESCALE
     group_range_px = pars.GROUP_RANGE / pars.PLATESCALE
     
-    blobs = find_bright_sharp_circles(
-        image_path,
-        small_radius_px,
-        large_radius_px,
-        group_range=group_range_px,
-        quality=pars.QUALITY_METRIC,
-        blob_size_tolerance=pars.BLOB_SIZE_TOLERANCE,
-        group_range_tolerance=pars.GROUP_RANGE_TOLERANCE,
-    )
-    if len(blobs) != 2:
+
+    if pars.BLOB_DETECTION == COMPONENT_BLOB_DETECTION:
+        find_circles = find_bright_sharp_circles_components
+    elif pars.BLOB_DETECTION == SIMPLE_BLOB_DETECTION:
+        find_circles = find_bright_sharp_circles
+    else:
         raise OtsuTargetFindingError(
-            "{} blobs found in image {}, there should be exactly two blobs".format(
-                len(blobs), image_path
-            )
+            "BLOB_DETECTION ({}) does not match a method.".format(pars.BLOB_DETECTION)
         )
 
-    # check blobs are in the correct order
-    if blobs[0].size < blobs[1].size:
-        small_blob, large_blob = blobs
-    else:
-        large_blob, small_blob = blobs
+    def detect(image):
+        blobs = find_circles(
+            image,
+            small_radius_px,
+            large_radius_px,
+            group_range=group_range_px,
+            quality=pars.QUALITY_METRIC,
+            blob_size_tolerance=pars.BLOB_SIZE_TOLERANCE,
+            group_range_tolerance=pars.GROUP_RANGE_TOLERANCE,
+        )
+        if len(blobs) != 2:
+            raise OtsuTargetFindingError(
+                "{} blobs found in image {}, there should be exactly two blobs".format(
+                    len(blobs), image_path
+                )
+            )
+
+        # check blobs are in the correct order
+        if blobs[0].size < blobs[1].size:
+            small_blob, large_blob = blobs
+        else:
+            large_blob, small_blob = blobs
+
+        return [small_blob.pt, large_blob.pt]
+
+    try:
+        small_pt, large_pt = detect_targets(image_path, detect, tracker=tracker)
+    except ImageLoadError as err:
+        raise OtsuTargetFindingError(str(err))
 
     # convert results from pixels to mm
-    small_blob_x, small_blob_y = correct(small_blob.pt[0], small_blob.pt[1])
-    large_blob_x, large_blob_y = correct(large_blob.pt[0], large_blob.pt[1])
+    small_blob_x, small_blob_y = correct(small_pt[0], small_pt[1])
+    large_blob_x, large_blob_y = correct(large_pt[0], large_pt[1])
 
 
     # The returned quality is a fixed value, the new blob detector doesn't
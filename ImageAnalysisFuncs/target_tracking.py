@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Region-of-interest tracking of metrology targets.
+
+In a series of images in which the targets move only a little from
+one image to the next, like a positional repeatability sweep, the
+targets are searched first in a small region around their position in
+the previous image. If they are not found there, the whole image is
+searched.
+
+The result in the region of interest can differ slightly from a
+search of the whole image when the detection adapts to the image
+content, like the Otsu threshold of target_detection_otsu, which is
+computed from the region. Use scripts/bench_roi_tracking.py to compare
+both on recorded sweeps.
+
+The detection functions take an optional TargetTracker, which
+holds the positions of the previous image (see
+target_detection_otsu.targetCoordinates() and
+target_detection_contours.targetCoordinates()).
+
+Because the result can depend on the previous image, a series is
+analyzed in runs of a fixed number of consecutive images, and the
+tracker is reset at the start of each run (see
+vfr.parallel_analysis). The results are then the same for any
+number of worker processes.
+"""
+
+from __future__ import division, print_function
+
+from ImageAnalysisFuncs.base import ImageAnalysisError, load_image
+
+# default number of consecutive images which are tracked
+# before the tracker is reset
+RUN_LENGTH = 16
+
+
+class TargetTracker:
+    """remembers the pixel positions of the targets found in the
+    last image, and predicts the region of interest of the next one.
+
+    margin is the distance in pixels by which the bounding box of
+    the previous target positions is extended. run_length is the
+    number of consecutive images which are analyzed as one run.
+    """
+
+    def __init__(self, margin, run_length=RUN_LENGTH):
+        self.margin = margin
+        self.run_length = run_length
+        self.points = None
+        self.hits = 0
+        self.misses = 0
+
+    def roi(self, shape):
+        """returns the region (x0, y0, x1, y1) to search in an image
+        of the given shape, or None if there is no prediction."""
+        if self.points is None:
+            return None
+
+        xs = [p[0] for p in self.points]
+        ys = [p[1] for p in self.points]
+        height, width = shape[:2]
+
+        x0 = max(int(min(xs) - self.margin), 0)
+        y0 = max(int(min(ys) - self.margin), 0)
+        x1 = min(int(max(xs) + self.margin) + 1, width)
+        y1 = min(int(max(ys) + self.margin) + 1, height)
+
+        if (x1 <= x0) or (y1 <= y0):
+            return None
+
+        return x0, y0, x1, y1
+
+    def update(self, points):
+        self.points = [(p[0], p[1]) for p in points]
+
+    def reset(self):
+        self.points = None
+
+    def key(self):
+        """returns the tracking mode, which is part of the cache
+        keys of tracked analyses (see vfr.db.analysis_cache)."""
+        return ("roi-tracking", self.margin, self.run_length)
+
+
+def get_tracker(pars):
+    """returns a TargetTracker for the top-level analysis parameters
+    of positional repeatability or datum repeatability, or None if
+    ROI tracking is switched off."""
+    if not getattr(pars, "ROI_TRACKING", False):
+        return None
+
+    return TargetTracker(pars.ROI_MARGIN / pars.PLATESCALE, pars.ROI_RUN_LENGTH)
+
+
+def detect_targets(image_path, detect, tracker=None):
+    """runs detect(image) on a grayscale image, and returns its result,
+    a list of target points which start with the pixel coordinates
+    (x, y) of each target.
+
+    If a tracker is given, detect() is first applied to the predicted
+    region of interest, and the points are shifted back to image
+    coordinates. If this raises an ImageAnalysisError, the whole
+    image is searched.
+    """
+    image = load_image(image_path)
+
+    if tracker is not None:
+        roi = tracker.roi(image.shape)
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            try:
+                points = detect(image[y0:y1, x0:x1])
+            except ImageAnalysisError:
+                tracker.misses += 1
+            else:
+                points = [(p[0] + x0, p[1] + y0) + tuple(p[2:]) for p in points]
+                tracker.hits += 1
+                tracker.update(points)
+                return points
+
+    points = detect(image)
+    if tracker is not None:
+        tracker.update(points)
+
+    return points
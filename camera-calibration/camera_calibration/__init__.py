@@ -5,8 +5,22 @@ from camera_calibration.correction import (
     correct_image,
     Correction,
 )
+from camera_calibration.lookup_table import (
+    CorrectionTable,
+    load_or_build_table,
+    save_table,
+    table_file_name,
+    validate_table,
+)
 
 # make pyflakes happy
 assert (
     Config or Corners or correct_point or correct_points or correct_image or Correction
 )
+assert (
+    CorrectionTable
+    or load_or_build_table
+    or save_table
+    or table_file_name
+    or validate_table
+)
@@ -90,13 +90,37 @@ class Config(object):
             )
         )
 
-    def populate_lens_parameters_from_chessboard(self, chessboard_image, rows, cols):
-        # type: (Union[np.ndarray, str], int, int) -> bool
+    def real_coordinates_transform(self):
+        # type: () -> (np.ndarray, np.ndarray)
+        """
+        Get the affine form of the mapping from grid_image_corners to grid_space_corners, so that a point maps to
+        point * scale + offset. The result is cached, and recomputed when either Corners instance is replaced
+        :return: A (scale, offset) pair of 2 item float64 numpy arrays
+        """
+        image_corners = self.grid_image_corners
+        space_corners = self.grid_space_corners
+        cached = getattr(self, "_real_coordinates_transform", None)
+        if (
+            cached is None
+            or cached[0] is not image_corners
+            or cached[1] is not space_corners
+        ):
+            cached = (image_corners, space_corners) + corner_mapping_transform(
+                image_corners, space_corners
+            )
+            self._real_coordinates_transform = cached
+        return cached[2], cached[3]
+
+    def populate_lens_parameters_from_chessboard(
+        self, chessboard_image, rows, cols, flags=0
+    ):
+        # type: (Union[np.ndarray, str], int, int, int) -> bool
         """
         Populate a config object's camera matrices and distortion coefficient properties using a chessboard image
         :param chessboard_image: An image, or path to an image, of a chess grid taken by the camera
         :param rows: The number of rows in the grid of black square corner intersection points
         :param cols: The number of columns in the grid of black square corner intersection points
+        :param flags: openCV calibrateCamera flags selecting the lens model, eg cv.CALIB_RATIONAL_MODEL
         :return: A boolean indicating if the properties were successfully populated
         """
         chessboard = get_image(chessboard_image)
@@ -106,7 +130,7 @@ class Config(object):
             return False
 
         h, w = chessboard.shape[:2]
-        return self.populate_lens_parameters_from_grid(corners, rows, cols, w, h)
+        return self.populate_lens_parameters_from_grid(corners, rows, cols, w, h, flags)
 
     def populate_lens_parameters_from_symmetric_dot_pattern(
         self, dot_grid_image, dot_detector, rows, cols
@@ -212,9 +236,9 @@ class Config(object):
         )
 
     def populate_lens_parameters_from_grid(
-        self, grid, rows, cols, image_width, image_height
+        self, grid, rows, cols, image_width, image_height, flags=0
     ):
-        # type: (np.ndarray, int, int, int, int) -> bool
+        # type: (np.ndarray, int, int, int, int, int) -> bool
         """
         Populate a config object's camera matrices and distortion coefficient properties using a grid points
         :param grid: A grid of points from an image taken by the camera, generated by openCV's findCirclesGrid or findChessboardCorners methods
@@ -222,6 +246,7 @@ class Config(object):
         :param cols: The number of columns in the grid
         :param image_width: The width of the camera's images in pixels
         :param image_height: The height of the camera's images in pixels
+        :param flags: openCV calibrateCamera flags selecting the lens model, eg cv.CALIB_RATIONAL_MODEL
         :return: A boolean indicating if the properties were successfully populated
         """
         objp = np.zeros((cols * rows, 3), np.float32)
@@ -230,7 +255,7 @@ class Config(object):
         imgpoints = [grid]
 
         calibrated, camera_matrix, distortion_coefficients, _, _ = cv.calibrateCamera(
-            objpoints, imgpoints, (image_width, image_height), None, None
+            objpoints, imgpoints, (image_width, image_height), None, None, flags=flags
         )
 
         if not calibrated:
@@ -415,6 +440,37 @@ def corners_to_array(corners):
     )
 
 
+def corner_mapping_transform(image_corners, real_corners):
+    # type: (Corners, Corners) -> (np.ndarray, np.ndarray)
+    """
+    Compute the affine form of the mapping of a rectangle's pixel corners to its plane coordinates
+    :param image_corners: Pixel points that mark the corners of a rectangle in the image
+    :param real_corners: Plane coordinates of the rectangle coordinates
+    :return: A (scale, offset) pair of 2 item float64 numpy arrays, so that a point maps to point * scale + offset
+    """
+    image_top_left = np.asarray(image_corners.top_left, np.float64)
+    real_top_left = np.asarray(real_corners.top_left, np.float64)
+
+    pixel_range = np.array(
+        [
+            image_corners.top_right[0] - image_corners.top_left[0],
+            image_corners.bottom_left[1] - image_corners.top_left[1],
+        ],
+        np.float64,
+    )
+    real_range = np.array(
+        [
+            real_corners.top_right[0] - real_corners.top_left[0],
+            real_corners.bottom_left[1] - real_corners.top_left[1],
+        ],
+        np.float64,
+    )
+
+    scale = real_range / pixel_range
+    offset = real_top_left - image_top_left * scale
+    return scale, offset
+
+
 def corners_from_array(array):
     # type: (np.ndarray) -> Corners
     if array.shape != (4, 2):
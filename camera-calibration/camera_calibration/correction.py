@@ -29,36 +29,24 @@ class Correction(IntEnum):
     lens_keystone_and_real_coordinates = 7
 
 
-def grid_points_to_real(image_points, image_corners, real_corners):
-    # type: (np.ndarray, conf.Corners, conf.Corners) -> np.ndarray
+def grid_points_to_real(image_points, image_corners, real_corners, transform=None):
+    # type: (np.ndarray, conf.Corners, conf.Corners, Optional[(np.ndarray, np.ndarray)]) -> np.ndarray
     """
     Map pixel-space coordinates in an image space to a coordinate system based on the given corner mappings
     :param image_points: Array of image space points to be mapped
     :param image_corners: Pixel points that mark the corners of a rectangle in the image
     :param real_corners: Plane coordinates of the rectangle coordinates
+    :param transform: The (scale, offset) affine form of the corner mapping, as returned by
+    Config.real_coordinates_transform(). Computed from the corners if not given
     :return: An array of the image points mapped to the given real coordinate system
     """
-    real_points = np.zeros(image_points.shape, np.float32)
+    if transform is None:
+        transform = conf.corner_mapping_transform(image_corners, real_corners)
+    scale, offset = transform
 
-    real_x_range = real_corners.top_right[0] - real_corners.top_left[0]
-    real_y_range = real_corners.bottom_left[1] - real_corners.top_left[1]
-
-    pixel_x_range = image_corners.top_right[0] - image_corners.top_left[0]
-    pixel_y_range = image_corners.bottom_left[1] - image_corners.top_left[1]
-
-    for i in range(len(image_points)):
-        image_point = image_points[i, 0]
-
-        x_fraction = (image_point[0] - image_corners.top_left[0]) / pixel_x_range
-        y_fraction = (image_point[1] - image_corners.top_left[1]) / pixel_y_range
-
-        x = real_corners.top_left[0] + x_fraction * real_x_range
-        y = real_corners.top_left[1] + y_fraction * real_y_range
-
-        real_points[i, 0, 0] = x
-        real_points[i, 0, 1] = y
-
-    return real_points
+    # the affine mapping broadcasts over the last axis, which holds (x, y)
+    real_points = np.asarray(image_points, np.float64) * scale + offset
+    return real_points.astype(np.float32)
 
 
 def correct_points(points, config, correction_level):
@@ -82,7 +70,10 @@ def correct_points(points, config, correction_level):
         points = cv.perspectiveTransform(points, config.homography_matrix)
     if correction_level & Correction.real_coordinates:
         points = grid_points_to_real(
-            points, config.grid_image_corners, config.grid_space_corners
+            points,
+            config.grid_image_corners,
+            config.grid_space_corners,
+            transform=config.real_coordinates_transform(),
         )
     return points
 
@@ -0,0 +1,297 @@
+"""
+Precomputed lookup tables of the point correction for a fixed camera calibration
+
+For a given configuration and correction level, the correction of a point only depends on its pixel position. A
+lookup table stores the corrected coordinates of a regular grid of pixel positions covering the sensor, and corrects
+points by bilinear interpolation between the grid nodes, instead of the iterative lens undistortion.
+"""
+
+import attr
+import hashlib
+import os
+
+import camera_calibration.correction as corr
+import numpy as np
+
+
+def config_hash(config, correction_level):
+    # type: (corr.conf.Config, corr.Correction) -> str
+    """
+    Hash a calibration configuration and correction level, to identify the lookup tables computed for them
+    :param config: Image correction configuration
+    :param correction_level: The corrections applied by the table
+    :return: A hex digest string
+    """
+    sha = hashlib.sha1()
+    sha.update(str(int(correction_level)).encode("ascii"))
+    update_hash(sha, config)
+    return sha.hexdigest()
+
+
+def update_hash(sha, value):
+    # type: (hashlib._Hash, object) -> None
+    """
+    Add a configuration value to a hash. Numpy arrays are hashed by their dtype, shape and data, because their repr()
+    is rounded to the print precision and its format depends on the numpy version
+    :param sha: The hashlib object to update
+    :param value: A numpy array, an attrs instance like Config or Corners, or a value with an exact repr()
+    """
+    if isinstance(value, np.ndarray):
+        sha.update(value.dtype.str.encode("ascii"))
+        sha.update(repr(value.shape).encode("ascii"))
+        sha.update(np.ascontiguousarray(value).tobytes())
+    elif attr.has(type(value)):
+        for field in attr.fields(type(value)):
+            sha.update(field.name.encode("ascii"))
+            update_hash(sha, getattr(value, field.name))
+    else:
+        sha.update(repr(value).encode("ascii"))
+
+
+class CorrectionTable(object):
+    """
+    Corrected real coordinates of a grid of pixel positions
+
+    Attributes:
+        x_nodes: The pixel x coordinates of the grid columns
+        y_nodes: The pixel y coordinates of the grid rows
+        table: A (rows x columns x 2) float64 numpy array of the corrected coordinates of the grid nodes
+        key: The config_hash() of the configuration and correction level the table was computed for
+        max_deviation: The maximum deviation from the exact correction found by validate_table(), or None if the
+            table has not been validated
+    """
+
+    def __init__(self, x_nodes, y_nodes, table, key, max_deviation=None):
+        self.x_nodes = np.asarray(x_nodes, np.float64)
+        self.y_nodes = np.asarray(y_nodes, np.float64)
+        self.table = np.asarray(table, np.float64)
+        self.key = key
+        self.max_deviation = max_deviation
+
+    @staticmethod
+    def build(config, correction_level, width, height, step=8):
+        # type: (corr.conf.Config, corr.Correction, int, int, int) -> CorrectionTable
+        """
+        Compute the lookup table for an image size
+        :param config: Image correction configuration
+        :param correction_level: The corrections to apply, eg lens_keystone_and_real_coordinates
+        :param width: Width of the camera images in pixels
+        :param height: Height of the camera images in pixels
+        :param step: Spacing of the grid nodes in pixels. 1 gives a dense table with a node per pixel
+        :return: The CorrectionTable, which covers the pixel positions from 0 to width - 1 and height - 1
+        """
+        x_nodes = node_positions(width, step)
+        y_nodes = node_positions(height, step)
+
+        grid = np.empty((len(y_nodes), len(x_nodes), 2), np.float64)
+        grid[:, :, 0] = x_nodes[np.newaxis, :]
+        grid[:, :, 1] = y_nodes[:, np.newaxis]
+
+        corrected = corr.correct_points(
+            grid.reshape(-1, 1, 2), config, correction_level
+        )
+        table = np.asarray(corrected, np.float64).reshape(grid.shape)
+
+        return CorrectionTable(
+            x_nodes, y_nodes, table, config_hash(config, correction_level)
+        )
+
+    def contains(self, x, y):
+        # type: (np.ndarray, np.ndarray) -> np.ndarray
+        """
+        Test which points lie within the area covered by the table
+        :return: A boolean array of the broadcast shape of x and y
+        """
+        return (
+            (x >= self.x_nodes[0])
+            & (x <= self.x_nodes[-1])
+            & (y >= self.y_nodes[0])
+            & (y <= self.y_nodes[-1])
+        )
+
+    def lookup(self, x, y):
+        # type: (np.ndarray, np.ndarray) -> (np.ndarray, np.ndarray)
+        """
+        Correct points by bilinear interpolation in the table. Points outside of the table are clamped to its border,
+        use contains() to find them
+        :param x: Pixel x coordinates, as scalar or array
+        :param y: Pixel y coordinates, of the same shape as x
+        :return: An (x, y) pair of arrays of the corrected coordinates
+        """
+        x, y = np.broadcast_arrays(np.asarray(x, np.float64), np.asarray(y, np.float64))
+
+        i, u = cell_and_fraction(self.x_nodes, x)
+        j, v = cell_and_fraction(self.y_nodes, y)
+        u = u[..., np.newaxis]
+        v = v[..., np.newaxis]
+
+        t = self.table
+        corrected = (1 - v) * ((1 - u) * t[j, i] + u * t[j, i + 1]) + v * (
+            (1 - u) * t[j + 1, i] + u * t[j + 1, i + 1]
+        )
+        return corrected[..., 0], corrected[..., 1]
+
+    def save(self, file):
+        """
+        Save the table to an npz file
+        :param file: The file, or name of the file, to save the table to
+        """
+        np.savez(
+            file,
+            x_nodes=self.x_nodes,
+            y_nodes=self.y_nodes,
+            table=self.table,
+            key=np.array(self.key),
+            max_deviation=np.array(
+                np.nan if self.max_deviation is None else self.max_deviation
+            ),
+        )
+
+    @staticmethod
+    def load(file):
+        """
+        Load a table saved with save()
+        :param file: The file, or name of the file, to load the table from
+        :return: The CorrectionTable
+        """
+        npz_file = np.load(file)
+        max_deviation = None
+        if "max_deviation" in npz_file.files:
+            max_deviation = float(npz_file["max_deviation"])
+            if np.isnan(max_deviation):
+                max_deviation = None
+        return CorrectionTable(
+            npz_file["x_nodes"],
+            npz_file["y_nodes"],
+            npz_file["table"],
+            str(npz_file["key"]),
+            max_deviation,
+        )
+
+
+def node_positions(size, step):
+    # type: (int, int) -> np.ndarray
+    """
+    Grid node positions with the given spacing from 0 up to and including the last pixel at size - 1
+    """
+    if step < 1:
+        raise ValueError("lookup table step must be at least one pixel")
+    nodes = np.arange(0, size - 1, step, dtype=np.float64)
+    return np.append(nodes, size - 1)
+
+
+def cell_and_fraction(nodes, values):
+    # type: (np.ndarray, np.ndarray) -> (np.ndarray, np.ndarray)
+    """
+    Find the grid cell of each value, and its fractional position within the cell
+    """
+    values = np.clip(values, nodes[0], nodes[-1])
+    cells = np.clip(np.searchsorted(nodes, values, side="right") - 1, 0, len(nodes) - 2)
+    fractions = (values - nodes[cells]) / (nodes[cells + 1] - nodes[cells])
+    return cells, fractions
+
+
+def table_file_name(directory, config, correction_level, width, height, step):
+    # type: (str, corr.conf.Config, corr.Correction, int, int, int) -> str
+    """
+    The name of the file a lookup table is stored in, which is unique for the configuration and table geometry
+    """
+    return os.path.join(
+        directory,
+        "correction-table-{}-{}x{}-{}.npz".format(
+            config_hash(config, correction_level)[:16], width, height, step
+        ),
+    )
+
+
+def load_or_build_table(directory, config, correction_level, width, height, step=8):
+    # type: (str, corr.conf.Config, corr.Correction, int, int, int) -> CorrectionTable
+    """
+    Load the lookup table for the configuration from directory, or compute it and save it there.
+    A table whose key does not match the configuration is recomputed
+    :return: The CorrectionTable
+    """
+    file_name = table_file_name(
+        directory, config, correction_level, width, height, step
+    )
+    key = config_hash(config, correction_level)
+
+    if os.path.exists(file_name):
+        try:
+            table = CorrectionTable.load(file_name)
+        except (IOError, OSError, ValueError, KeyError):
+            table = None
+        if table is not None and table.key == key:
+            return table
+
+    table = CorrectionTable.build(config, correction_level, width, height, step)
+    # the table is still usable if it cannot be saved, it is just computed again next time
+    save_table(table, file_name)
+
+    return table
+
+
+def save_table(table, file_name):
+    # type: (CorrectionTable, str) -> bool
+    """
+    Save a table under a temporary name and rename it, so that concurrent readers never see a partially written table
+    :return: A boolean indicating if the table was saved
+    """
+    tmp_name = "{}.{}.tmp.npz".format(file_name[: -len(".npz")], os.getpid())
+    try:
+        table.save(tmp_name)
+        os.rename(tmp_name, file_name)
+    except (IOError, OSError):
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        return False
+    return True
+
+
+def validate_table(table, config, correction_level, points_per_cell=4, seed=0):
+    # type: (CorrectionTable, corr.conf.Config, corr.Correction, int, int) -> dict
+    """
+    Compare the table lookup with the exact correction, at the centres of all grid cells, where the interpolation
+    error is largest, and at random positions within the cells
+    :param table: The lookup table to validate
+    :param config: The configuration the table was computed for
+    :param correction_level: The correction level the table was computed for
+    :param points_per_cell: Number of random points per grid cell
+    :param seed: Seed of the random positions
+    :return: A dictionary with the maximum and mean deviation in real coordinate units, the pixel position of the
+    maximum deviation, and the number of compared points
+    """
+    x_mid = (table.x_nodes[:-1] + table.x_nodes[1:]) / 2
+    y_mid = (table.y_nodes[:-1] + table.y_nodes[1:]) / 2
+    x_centres, y_centres = np.meshgrid(x_mid, y_mid)
+
+    random = np.random.RandomState(seed)
+    count = x_centres.size * points_per_cell
+    x = np.concatenate(
+        [
+            x_centres.ravel(),
+            random.uniform(table.x_nodes[0], table.x_nodes[-1], count),
+        ]
+    )
+    y = np.concatenate(
+        [
+            y_centres.ravel(),
+            random.uniform(table.y_nodes[0], table.y_nodes[-1], count),
+        ]
+    )
+
+    points = np.empty((len(x), 1, 2), np.float64)
+    points[:, 0, 0] = x
+    points[:, 0, 1] = y
+    exact = corr.correct_points(points, config, correction_level)[:, 0, :]
+
+    x_table, y_table = table.lookup(x, y)
+    deviation = np.hypot(x_table - exact[:, 0], y_table - exact[:, 1])
+    worst = int(np.argmax(deviation))
+
+    return {
+        "max_deviation": float(deviation[worst]),
+        "mean_deviation": float(np.mean(deviation)),
+        "max_deviation_position": (float(x[worst]), float(y[worst])),
+        "num_points": len(x),
+    }
@@ -1,5 +1,6 @@
 import camera_calibration as calib
 import cv2 as cv
+import numpy as np
 
 
 def test_config_populated_from_paths_matches_config_populated_from_same_loaded_images():
@@ -20,3 +21,30 @@ def test_config_populated_from_paths_matches_config_populated_from_same_loaded_i
     )
 
     assert path_config == image_config
+
+
+def test_lens_model_flags_are_passed_to_the_calibration():
+    rows, cols = 11, 8
+    objp = np.zeros((cols * rows, 3), np.float32)
+    objp[:, :2] = np.mgrid[0 : rows * 5 : 5, 0 : cols * 5 : 5].T.reshape(-1, 2)
+    camera_matrix = np.array([[1500.0, 0, 640], [0, 1500.0, 480], [0, 0, 1]])
+    grid, _ = cv.projectPoints(
+        objp,
+        np.array([0.2, -0.15, 0.05]),
+        np.array([-25.0, -20.0, 150.0]),
+        camera_matrix,
+        np.array([-0.1, 0.05, 0, 0, 0]),
+    )
+    grid = grid.astype(np.float32)
+
+    default_config = calib.Config()
+    assert default_config.populate_lens_parameters_from_grid(
+        grid, rows, cols, 1280, 960
+    )
+    assert default_config.distortion_coefficients.size == 5
+
+    rational_config = calib.Config()
+    assert rational_config.populate_lens_parameters_from_grid(
+        grid, rows, cols, 1280, 960, cv.CALIB_RATIONAL_MODEL
+    )
+    assert rational_config.distortion_coefficients.size >= 8
@@ -0,0 +1,140 @@
+from __future__ import print_function
+import camera_calibration as calib
+from camera_calibration.correction import grid_points_to_real
+import numpy as np
+import pytest
+import timeit
+
+IMAGE_CORNERS = calib.Corners(
+    np.array([71.22837, 62.64333], np.float32),
+    np.array([3600.0374, 62.64333], np.float32),
+    np.array([71.22837, 2466.539], np.float32),
+    np.array([3600.0374, 2466.539], np.float32),
+)
+REAL_CORNERS = calib.Corners(
+    np.array([0, 0], np.float32),
+    np.array([84.5, 0], np.float32),
+    np.array([0, 57.5], np.float32),
+    np.array([84.5, 57.5], np.float32),
+)
+
+
+def grid_points_to_real_loop(image_points, image_corners, real_corners):
+    # type: (np.ndarray, calib.Corners, calib.Corners) -> np.ndarray
+    """
+    Reference implementation which maps one point at a time, as earlier versions of grid_points_to_real did
+    """
+    real_points = np.zeros(image_points.shape, np.float32)
+
+    real_x_range = real_corners.top_right[0] - real_corners.top_left[0]
+    real_y_range = real_corners.bottom_left[1] - real_corners.top_left[1]
+
+    pixel_x_range = image_corners.top_right[0] - image_corners.top_left[0]
+    pixel_y_range = image_corners.bottom_left[1] - image_corners.top_left[1]
+
+    for i in range(len(image_points)):
+        image_point = image_points[i, 0]
+
+        x_fraction = (image_point[0] - image_corners.top_left[0]) / pixel_x_range
+        y_fraction = (image_point[1] - image_corners.top_left[1]) / pixel_y_range
+
+        real_points[i, 0, 0] = real_corners.top_left[0] + x_fraction * real_x_range
+        real_points[i, 0, 1] = real_corners.top_left[1] + y_fraction * real_y_range
+
+    return real_points
+
+
+def random_points(count, seed=0):
+    # type: (int, int) -> np.ndarray
+    """
+    Generate an (N x 1 x 2) array of points spread over a 3600 x 2500 pixel image
+    """
+    random = np.random.RandomState(seed)
+    points = np.empty((count, 1, 2), np.float64)
+    points[:, 0, 0] = random.uniform(0, 3600, count)
+    points[:, 0, 1] = random.uniform(0, 2500, count)
+    return points
+
+
+def best_time(function, repeats):
+    # type: (callable, int) -> float
+    return min(timeit.repeat(function, number=1, repeat=repeats))
+
+
+@pytest.mark.parametrize("count", [0, 1, 10, 1000])
+def test_vectorized_mapping_matches_point_by_point_mapping(count):
+    points = random_points(count)
+
+    expected = grid_points_to_real_loop(points, IMAGE_CORNERS, REAL_CORNERS)
+    mapped = grid_points_to_real(points, IMAGE_CORNERS, REAL_CORNERS)
+
+    assert mapped.shape == expected.shape
+    assert mapped.dtype == np.float32
+    # the affine form rounds differently, within the float32 result precision
+    assert np.allclose(mapped, expected, rtol=1e-6, atol=1e-5)
+
+
+def test_corner_points_map_to_real_corners():
+    image = np.array(
+        [[IMAGE_CORNERS.top_left], [IMAGE_CORNERS.bottom_right]], np.float64
+    )
+    mapped = grid_points_to_real(image, IMAGE_CORNERS, REAL_CORNERS)
+
+    assert np.allclose(mapped[0, 0], REAL_CORNERS.top_left, atol=1e-5)
+    assert np.allclose(mapped[1, 0], REAL_CORNERS.bottom_right, atol=1e-5)
+
+
+def test_config_caches_the_affine_transform():
+    config = calib.Config(
+        grid_image_corners=IMAGE_CORNERS, grid_space_corners=REAL_CORNERS
+    )
+
+    transform = config.real_coordinates_transform()
+    assert config.real_coordinates_transform()[0] is transform[0]
+
+    # replacing the corners updates the transform
+    config.grid_space_corners = calib.Corners(
+        REAL_CORNERS.top_left,
+        REAL_CORNERS.top_right * 2,
+        REAL_CORNERS.bottom_left * 2,
+        REAL_CORNERS.bottom_right * 2,
+    )
+    scale, _ = config.real_coordinates_transform()
+    assert np.allclose(scale, transform[0] * 2)
+
+
+@pytest.mark.slow
+def test_point_mapping_benchmark():
+    """
+    Compare the vectorized mapping with the point by point reference for 1 to 1e6 points
+    """
+    print()
+    print(
+        "{:>9} {:>14} {:>14} {:>9}".format(
+            "points", "loop [ms]", "array [ms]", "speed-up"
+        )
+    )
+    for exponent in range(7):
+        count = 10 ** exponent
+        points = random_points(count)
+        repeats = 3 if count >= 10 ** 5 else 20
+
+        loop_time = best_time(
+            lambda: grid_points_to_real_loop(points, IMAGE_CORNERS, REAL_CORNERS),
+            repeats,
+        )
+        array_time = best_time(
+            lambda: grid_points_to_real(points, IMAGE_CORNERS, REAL_CORNERS), repeats
+        )
+        print(
+            "{:>9} {:>14.3f} {:>14.3f} {:>9.1f}".format(
+                count, loop_time * 1e3, array_time * 1e3, loop_time / array_time
+            )
+        )
+
+        if count >= 1000:
+            assert array_time < loop_time
+
+
+if __name__ == "__main__":
+    test_point_mapping_benchmark()
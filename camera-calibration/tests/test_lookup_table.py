@@ -0,0 +1,163 @@
+import camera_calibration as calib
+from camera_calibration.lookup_table import CorrectionTable, config_hash, node_positions
+import numpy as np
+import os
+import pytest
+
+LEVEL = calib.Correction.lens_keystone_and_real_coordinates
+WIDTH = 2000
+HEIGHT = 1500
+
+
+def synthetic_config():
+    # type: () -> calib.Config
+    """
+    A calibration with mild lens distortion and a small keystone rotation, mapping a 2000 x 1500 pixel image to
+    80 x 60 mm
+    """
+    camera_matrix = np.array([[3000.0, 0.0, 1000.0], [0.0, 3000.0, 750.0], [0, 0, 1]])
+    angle = 0.01
+    homography = np.array(
+        [
+            [np.cos(angle), -np.sin(angle), 5.0],
+            [np.sin(angle), np.cos(angle), -3.0],
+            [1e-6, 2e-6, 1.0],
+        ]
+    )
+    return calib.Config(
+        camera_matrix,
+        np.array([[-0.05, 0.01, 0.0005, -0.0003, 0.0]]),
+        camera_matrix,
+        homography,
+        calib.Corners(
+            np.array([10.0, 20.0]),
+            np.array([1990.0, 20.0]),
+            np.array([10.0, 1480.0]),
+            np.array([1990.0, 1480.0]),
+        ),
+        calib.Corners(
+            np.array([0.0, 0.0]),
+            np.array([80.0, 0.0]),
+            np.array([0.0, 60.0]),
+            np.array([80.0, 60.0]),
+        ),
+    )
+
+
+def exact(x, y, config):
+    # type: (np.ndarray, np.ndarray, calib.Config) -> np.ndarray
+    points = np.empty((len(x), 1, 2), np.float64)
+    points[:, 0, 0] = x
+    points[:, 0, 1] = y
+    return calib.correct_points(points, config, LEVEL)[:, 0, :]
+
+
+def test_node_positions_cover_the_image():
+    assert list(node_positions(10, 4)) == [0, 4, 8, 9]
+    assert list(node_positions(9, 4)) == [0, 4, 8]
+    assert list(node_positions(3, 1)) == [0, 1, 2]
+
+    with pytest.raises(ValueError):
+        node_positions(10, 0)
+
+
+def test_lookup_is_exact_at_grid_nodes():
+    config = synthetic_config()
+    table = CorrectionTable.build(config, LEVEL, WIDTH, HEIGHT, step=50)
+
+    x, y = np.meshgrid(table.x_nodes, table.y_nodes)
+    x_table, y_table = table.lookup(x.ravel(), y.ravel())
+    expected = exact(x.ravel(), y.ravel(), config)
+
+    assert np.allclose(x_table, expected[:, 0], atol=1e-9)
+    assert np.allclose(y_table, expected[:, 1], atol=1e-9)
+
+
+def test_lookup_is_close_to_exact_correction():
+    config = synthetic_config()
+    table = CorrectionTable.build(config, LEVEL, WIDTH, HEIGHT, step=8)
+
+    report = calib.validate_table(table, config, LEVEL)
+
+    assert report["num_points"] == 5 * (len(table.x_nodes) - 1) * (
+        len(table.y_nodes) - 1
+    )
+    # 40 um pixels, the interpolation error is a tiny fraction of a pixel
+    assert report["max_deviation"] < 1e-4
+    assert report["mean_deviation"] <= report["max_deviation"]
+
+
+def test_lookup_shapes_and_bounds():
+    config = synthetic_config()
+    table = CorrectionTable.build(config, LEVEL, WIDTH, HEIGHT, step=100)
+
+    x_table, y_table = table.lookup(np.full((3, 4), 500.0), np.full((3, 4), 700.0))
+    assert x_table.shape == (3, 4)
+    assert y_table.shape == (3, 4)
+
+    x = np.array([-1.0, 0.0, WIDTH - 1.0, WIDTH + 1.0])
+    y = np.array([10.0, 10.0, 10.0, 10.0])
+    assert list(table.contains(x, y)) == [False, True, True, False]
+
+
+def test_table_is_saved_and_reused(tmpdir):
+    config = synthetic_config()
+    directory = str(tmpdir)
+
+    table = calib.load_or_build_table(directory, config, LEVEL, WIDTH, HEIGHT, 100)
+    file_name = calib.table_file_name(directory, config, LEVEL, WIDTH, HEIGHT, 100)
+    assert os.path.exists(file_name)
+    assert os.listdir(directory) == [os.path.basename(file_name)]
+
+    loaded = calib.load_or_build_table(directory, config, LEVEL, WIDTH, HEIGHT, 100)
+    assert loaded.key == table.key
+    assert np.array_equal(loaded.table, table.table)
+
+    # a different calibration gets a different table
+    config.distortion_coefficients = config.distortion_coefficients * 2
+    other = calib.table_file_name(directory, config, LEVEL, WIDTH, HEIGHT, 100)
+    assert other != file_name
+
+
+def test_config_hash_uses_exact_values():
+    config = synthetic_config()
+    key = config_hash(config, LEVEL)
+    assert config_hash(synthetic_config(), LEVEL) == key
+    assert config_hash(config, calib.Correction.lens_and_keystone) != key
+
+    # a change far below the print precision of numpy arrays
+    config.homography_matrix = config.homography_matrix.copy()
+    config.homography_matrix[2, 0] *= 1 + 1e-12
+    assert config_hash(config, LEVEL) != key
+
+    # the same values with another dtype
+    config = synthetic_config()
+    matrix = config.undistorted_camera_matrix
+    config.undistorted_camera_matrix = matrix.astype(np.float32)
+    assert config_hash(config, LEVEL) != key
+
+
+def test_validation_result_is_saved_with_the_table(tmpdir):
+    config = synthetic_config()
+    directory = str(tmpdir)
+    file_name = calib.table_file_name(directory, config, LEVEL, WIDTH, HEIGHT, 100)
+
+    table = calib.load_or_build_table(directory, config, LEVEL, WIDTH, HEIGHT, 100)
+    assert table.max_deviation is None
+
+    table.max_deviation = calib.validate_table(table, config, LEVEL)["max_deviation"]
+    assert calib.save_table(table, file_name)
+
+    loaded = calib.load_or_build_table(directory, config, LEVEL, WIDTH, HEIGHT, 100)
+    assert loaded.max_deviation == table.max_deviation
+
+
+def test_table_which_cannot_be_saved_is_still_returned(tmpdir):
+    config = synthetic_config()
+    directory = str(tmpdir.join("missing"))
+
+    table = calib.load_or_build_table(directory, config, LEVEL, WIDTH, HEIGHT, 100)
+    assert table.table.shape == (HEIGHT // 100 + 1, WIDTH // 100 + 1, 2)
+    assert not calib.save_table(
+        table, calib.table_file_name(directory, config, LEVEL, WIDTH, HEIGHT, 100)
+    )
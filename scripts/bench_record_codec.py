@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""
+Usage: python bench_record_codec.py [NUM_REPEATS]
+
+Compares the legacy repr() record format with the binary record
+format of vfr.db.codec, measuring encoding time, decoding time and
+record size for a synthetic positional repeatability result record.
+
+If the environment variable FPU_DATABASE is set, all records of
+the verification database in that directory are decoded as well
+(read-only), and re-encoded in memory with both codecs.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+from argparse import Namespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from vfr.db.codec import (  # noqa: E402
+    decode_record,
+    get_codec,
+    join_chunks,
+    read_chunk_manifest,
+)
+
+
+def make_posrep_record(num_positions=5, num_repeats=54, num_arms=2):
+    """returns a record of the size of a positional repeatability
+    evaluation, with about 1620 image coordinate entries."""
+    rng = np.random.RandomState(42)
+
+    def analysis_results():
+        res = {}
+        for i in range(num_positions):
+            for j in range(num_positions):
+                for k in range(num_repeats // num_positions + 1):
+                    key = (i * 60.0 - 180.0, j * 30.0 - 90.0, k, i)
+                    res[key] = tuple(rng.uniform(0, 2000, 6))
+        return res
+
+    def measures():
+        return Namespace(
+            max_val=float(rng.uniform()),
+            percentiles={p: float(rng.uniform()) for p in [50, 90, 95, 97.5]},
+            N=num_repeats,
+        )
+
+    return {
+        "calibration_pars": {"algorithm": "scale", "scale_factor": 0.0235},
+        "analysis_results_alpha": analysis_results(),
+        "analysis_results_beta": analysis_results(),
+        "posrep_alpha_max_at_angle": rng.uniform(size=num_positions).tolist(),
+        "posrep_beta_max_at_angle": rng.uniform(size=num_positions).tolist(),
+        "arg_max_alpha_error": 15.0,
+        "arg_max_beta_error": 45.0,
+        "min_quality_alpha": 0.92,
+        "min_quality_beta": float("nan"),
+        "posrep_alpha_measures": measures(),
+        "posrep_beta_measures": measures(),
+        "result": "OK",
+        "pass_threshold_mm": 0.03,
+        "gearbox_correction": {
+            "coeffs_alpha": rng.uniform(size=(num_arms, 3)),
+            "coeffs_beta": rng.uniform(size=(num_arms, 3)),
+            "angles_alpha": rng.uniform(size=num_positions * num_repeats),
+        },
+        "gearbox_correction_version": (0, 1, 0),
+        "algorithm_version": (0, 1, 0),
+        "git_version": "v0.9.0-42-gdeadbee",
+        "time": "2019-06-12T12.00.00.123UTC",
+    }
+
+
+def timeit(func, arg, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        val = func(arg)
+    return (time.time() - start) / repeats, val
+
+
+def compare(name, record, repeats):
+    print("%s:" % name)
+    for codec_name in ["repr", "binary"]:
+        codec = get_codec(codec_name)
+        t_enc, raw = timeit(codec.encode, record, repeats)
+        t_dec, _ = timeit(decode_record, raw, repeats)
+        print(
+            "\t%-8s size = %8i bytes, encode = %8.3f ms, decode = %8.3f ms"
+            % (codec_name, len(raw), t_enc * 1000, t_dec * 1000)
+        )
+
+
+def bench_database(path, repeats):
+    import lmdb
+
+    env = lmdb.open(path, readonly=True, lock=False, max_dbs=10)
+    vfdb = env.open_db(b"verification", create=False)
+
+    sizes = {}
+    times = {}
+    num_records = 0
+    with env.begin(db=vfdb) as txn:
+        for key, raw in txn.cursor():
+            if key == b"serial-number-set" or any(
+                s in key for s in [b"ntests", b"'chunk'", b"status-index"]
+            ):
+                continue
+            manifest = read_chunk_manifest(raw)
+            if manifest is not None:
+                datakey = key[:-1]
+                raw = join_chunks(
+                    (
+                        txn.get(datakey + b", 'chunk', %i)" % i)
+                        for i in range(manifest[0])
+                    ),
+                    manifest[1],
+                )
+            try:
+                record = decode_record(raw)
+            except Exception as e:
+                print("skipping %r: %s" % (key, e))
+                continue
+            if not isinstance(record, dict):
+                continue
+
+            num_records += 1
+            for codec_name in ["repr", "binary"]:
+                codec = get_codec(codec_name)
+                encoded = codec.encode(record)
+                t_dec, _ = timeit(decode_record, encoded, repeats)
+                sizes[codec_name] = sizes.get(codec_name, 0) + len(encoded)
+                times[codec_name] = times.get(codec_name, 0) + t_dec
+
+    print("database %s: %i records" % (path, num_records))
+    for codec_name in ["repr", "binary"]:
+        print(
+            "\t%-8s total size = %10i bytes, total decode = %10.3f ms"
+            % (codec_name, sizes.get(codec_name, 0), times.get(codec_name, 0) * 1000)
+        )
+
+
+def main(args):
+    repeats = int(args[1]) if len(args) > 1 else 20
+
+    compare("synthetic positional repeatability record", make_posrep_record(), repeats)
+
+    dbpath = os.environ.get("FPU_DATABASE")
+    if dbpath:
+        bench_database(dbpath, repeats)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
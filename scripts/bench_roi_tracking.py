@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""
+Usage: python bench_roi_tracking.py IMAGE_DIR_OR_FILE...
+
+Compares the analysis of a recorded positional repeatability sweep
+with and without region-of-interest tracking. The images are analyzed
+in the order of their file names, which is the order of capture
+(i, j, k indices) for the images stored by the positional
+repeatability measurement.
+
+Reports the mean analysis time per image of both modes, the number
+of images in which the tracked region contained the targets, and the
+maximum deviation of the tracked results from the full-frame results,
+in millimeter.
+
+The target detection algorithm of POS_REP_ANALYSIS_PARS is used,
+with the linear fallback calibration.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+from copy import deepcopy
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ImageAnalysisFuncs.analyze_positional_repeatability import (  # noqa: E402
+    posrepCoordinates,
+)
+from ImageAnalysisFuncs.base import ImageAnalysisError  # noqa: E402
+from ImageAnalysisFuncs.target_tracking import TargetTracker  # noqa: E402
+from vfr.conf import POS_REP_ANALYSIS_PARS  # noqa: E402
+
+
+def list_images(args):
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            paths.extend(
+                os.path.join(arg, name)
+                for name in os.listdir(arg)
+                if name.lower().endswith(".bmp")
+            )
+        else:
+            paths.append(arg)
+    return sorted(paths)
+
+
+def run(paths, pars, tracker=None):
+    """returns the analysis results (None for failed images)
+    and the total time."""
+    results = []
+    start = time.time()
+    for ipath in paths:
+        try:
+            results.append(posrepCoordinates(ipath, pars=pars, tracker=tracker))
+        except ImageAnalysisError:
+            results.append(None)
+    return results, time.time() - start
+
+
+def compare(full, tracked):
+    deviations = [
+        np.max(np.abs(np.array(a) - np.array(b))[[0, 1, 3, 4]])
+        for a, b in zip(full, tracked)
+        if (a is not None) and (b is not None)
+    ]
+    differing_failures = sum((a is None) != (b is None) for a, b in zip(full, tracked))
+    return (max(deviations) if deviations else 0.0), differing_failures
+
+
+def main(args):
+    pars = deepcopy(POS_REP_ANALYSIS_PARS)
+
+    paths = list_images(args[1:])
+    if not paths:
+        print(__doc__)
+        return 1
+
+    full, t_full = run(paths, pars)
+
+    tracker = TargetTracker(pars.ROI_MARGIN / pars.PLATESCALE)
+    tracked, t_tracked = run(paths, pars, tracker=tracker)
+
+    max_deviation, differing_failures = compare(full, tracked)
+    n = len(paths)
+
+    print("%i images, %i failed in full-frame analysis" % (n, full.count(None)))
+    print("full frame: %8.2f ms per image" % (t_full / n * 1000))
+    print(
+        "tracked:    %8.2f ms per image (speed-up %.2f)"
+        % (t_tracked / n * 1000, t_full / max(t_tracked, 1e-9))
+    )
+    print(
+        "tracked region: %i hits, %i misses (full-frame fallback)"
+        % (tracker.hits, tracker.misses)
+    )
+    print(
+        "maximum deviation %.6f mm, %i images failed in only one mode"
+        % (max_deviation, differing_failures)
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+"""
+Usage: python recompress_images.py [-f FORMAT] [-c LEVEL] [-j WORKERS] [--keep] IMAGE_DIR...
+
+Converts the stored images below the given folders to another storage
+format (see vfr/image_store.py), in parallel worker processes.
+
+  -f FORMAT   target format, one of bmp, png, tiff, npy (default png)
+  -c LEVEL    compression level (default IMAGE_COMPRESSION of vfr/conf.py)
+  -j WORKERS  number of worker processes (default: number of CPUs)
+  --keep      keep the original files
+
+Each converted image is decoded again and compared with the original
+pixel by pixel before it is written, so that the conversion is
+lossless. The new file gets the modification time of the original.
+
+The image paths in the verification database are not changed. The
+evaluation finds the converted files under their new extension (see
+fixup_ipath() in vfr/tests_common.py). Cached analysis results are
+keyed by the file contents, so the converted images are analyzed
+again on their first evaluation.
+
+Symbolic links, as created by the hardware simulation, are skipped.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import multiprocessing
+import os
+import sys
+from argparse import ArgumentParser
+from functools import partial
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from vfr.conf import IMAGE_COMPRESSION  # noqa: E402
+from vfr.image_store import (  # noqa: E402
+    IMAGE_EXTENSIONS,
+    decode_image,
+    encode_image,
+    image_format,
+    store_path,
+)
+
+
+def list_images(folders, fmt):
+    """yields the image files below folders which are
+    not stored in format fmt."""
+    extensions = set(IMAGE_EXTENSIONS.values()) - set([IMAGE_EXTENSIONS[fmt]])
+    for folder in folders:
+        for dirpath, _, filenames in os.walk(folder):
+            for name in sorted(filenames):
+                ipath = os.path.join(dirpath, name)
+                if (os.path.splitext(name)[1].lower() in extensions) and (
+                    not os.path.islink(ipath)
+                ):
+                    yield ipath
+
+
+def convert_image(ipath, fmt=None, compression=None, keep=False):
+    """converts one image, and returns (ipath, old size, new size, error)."""
+    new_path = store_path(ipath, fmt)
+    try:
+        if os.path.exists(new_path):
+            raise IOError("%s already exists" % new_path)
+
+        st = os.stat(ipath)
+        with open(ipath, "rb") as f:
+            image = decode_image(f.read(), image_format(ipath))
+
+        data = encode_image(image, fmt, compression=compression)
+        if not np.array_equal(decode_image(data, fmt), image):
+            raise IOError("conversion to %s is not lossless" % fmt)
+
+        tmp_path = new_path + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.utime(tmp_path, (st.st_atime, st.st_mtime))
+        os.rename(tmp_path, new_path)
+
+        if not keep:
+            os.remove(ipath)
+
+    except (IOError, OSError, ValueError) as err:
+        return ipath, 0, 0, str(err)
+
+    return ipath, st.st_size, len(data), None
+
+
+def main(args):
+    parser = ArgumentParser(
+        description="convert stored images to another format",
+        usage=__doc__.strip().splitlines()[0][len("Usage: ") :],
+    )
+    parser.add_argument(
+        "-f", "--format", default="png", choices=sorted(IMAGE_EXTENSIONS)
+    )
+    parser.add_argument("-c", "--compression", type=int, default=IMAGE_COMPRESSION)
+    parser.add_argument("-j", "--workers", type=int, default=0)
+    parser.add_argument("--keep", action="store_true")
+    parser.add_argument("folders", nargs="+")
+    opts = parser.parse_args(args[1:])
+
+    paths = list(list_images(opts.folders, opts.format))
+    if not paths:
+        print("no images to convert")
+        return 0
+
+    convert = partial(
+        convert_image, fmt=opts.format, compression=opts.compression, keep=opts.keep
+    )
+    pool = multiprocessing.Pool(processes=(opts.workers or None))
+    try:
+        old_size = new_size = failures = 0
+        for ipath, old, new, err in pool.imap_unordered(convert, paths, chunksize=8):
+            if err is not None:
+                failures += 1
+                print("%s: %s" % (ipath, err), file=sys.stderr)
+            old_size += old
+            new_size += new
+    finally:
+        pool.close()
+        pool.join()
+
+    print(
+        "%i images converted to %s, %i failed: %.1f MB -> %.1f MB"
+        % (len(paths) - failures, opts.format, failures, old_size / 1e6, new_size / 1e6)
+    )
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+"""
+Usage: FPU_DATABASE=<path> python record_compression_stats.py [NUM_REPEATS]
+
+Reports, per record type, the number of records in the verification
+database, their stored and uncompressed size, the resulting
+compression ratio, and the mean decoding time of the stored records.
+For comparison, each record is also compressed in memory with every
+available compressor, and the resulting compression ratio and mean
+decoding time are reported. This helps to select the compressor per
+record type (see DB_COMPRESSION_BY_TYPE in vfr/conf.py).
+
+The database is opened read-only.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import time
+from ast import literal_eval
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from vfr.db.codec import (  # noqa: E402
+    COMPRESSORS,
+    compress_record,
+    decode_record,
+    decompress_record,
+    join_chunks,
+    read_chunk_manifest,
+)
+
+
+def timeit(func, arg, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        func(arg)
+    return (time.time() - start) / repeats
+
+
+def iter_records(txn):
+    """yields (record_type, raw) for all stored records,
+    reassembling chunked records."""
+    for key, raw in txn.cursor():
+        if not (key.startswith(b"(") and key.endswith(b")")):
+            continue
+        try:
+            tkey = literal_eval(key.decode("ascii"))
+        except (ValueError, SyntaxError, UnicodeDecodeError):
+            continue
+
+        # this skips counters, chunk keys and the status index
+        if not (
+            (len(tkey) >= 4) and (tkey[-2] == "data") and isinstance(tkey[-1], int)
+        ):
+            continue
+
+        manifest = read_chunk_manifest(raw)
+        if manifest is not None:
+            num_chunks, total_length = manifest
+            raw = join_chunks(
+                (
+                    txn.get(repr(tkey + ("chunk", i)).encode("ascii"))
+                    for i in range(num_chunks)
+                ),
+                total_length,
+            )
+
+        yield "/".join(str(x) for x in tkey[1:-2]), raw
+
+
+def collect_stats(path, repeats):
+    import lmdb
+
+    compressors = sorted(set(COMPRESSORS.values()), key=lambda c: c.compressor_id)
+
+    env = lmdb.open(path, readonly=True, lock=False, max_dbs=10)
+    vfdb = env.open_db(b"verification", create=False)
+
+    stats = {}
+    with env.begin(db=vfdb) as txn:
+        for record_type, raw in iter_records(txn):
+            try:
+                plain = decompress_record(raw)
+                decode_record(plain)
+            except Exception as e:
+                print("skipping broken %s record: %s" % (record_type, e))
+                continue
+
+            st = stats.setdefault(
+                record_type,
+                {"records": 0, "stored": 0, "plain": 0, "decode": 0.0, "by_name": {}},
+            )
+            st["records"] += 1
+            st["stored"] += len(raw)
+            st["plain"] += len(plain)
+            st["decode"] += timeit(decode_record, raw, repeats)
+
+            for compressor in compressors:
+                compressed = compress_record(plain, compressor)
+                size, t_dec = st["by_name"].get(compressor.name, (0, 0.0))
+                st["by_name"][compressor.name] = (
+                    size + len(compressed),
+                    t_dec + timeit(decode_record, compressed, repeats),
+                )
+
+    return stats, [c.name for c in compressors]
+
+
+def print_stats(stats, names):
+    for record_type in sorted(stats):
+        st = stats[record_type]
+        n = st["records"]
+        print(
+            "%s: %i records, stored %i bytes, uncompressed %i bytes,"
+            " ratio %.2f, decode %.3f ms"
+            % (
+                record_type,
+                n,
+                st["stored"],
+                st["plain"],
+                st["plain"] / max(st["stored"], 1),
+                st["decode"] / n * 1000,
+            )
+        )
+        for name in names:
+            size, t_dec = st["by_name"][name]
+            print(
+                "\t%-6s ratio %6.2f, decode %8.3f ms"
+                % (name, st["plain"] / max(size, 1), t_dec / n * 1000)
+            )
+
+
+def main(args):
+    repeats = int(args[1]) if len(args) > 1 else 3
+
+    dbpath = os.environ.get("FPU_DATABASE")
+    if not dbpath:
+        print(__doc__)
+        return 1
+
+    stats, names = collect_stats(dbpath, repeats)
+    print_stats(stats, names)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,139 +1,298 @@
-from __future__ import division, print_function
-import camera_calibration as calib
-import cv2 as cv
-import math
-import numpy as np
-from pprint import pprint
-
-rows = 11
-cols = 8
-
-lengths_mm = [45.65, 91.13, 136.58, 64.30, 128.78]
-lengths_edges = [1, 2, 3, math.sqrt(2), math.sqrt(2) * 2]
-
-square_edge_mm = sum(
-    lengths_mm[i] / lengths_edges[i] for i in range(len(lengths_mm))
-) / len(lengths_mm)
-
-grid_width = square_edge_mm * (cols - 1)
-grid_height = square_edge_mm * (rows - 1)
-
-print("edge:{}\nwidth:{}\nheight:{}".format(square_edge_mm, grid_width, grid_height))
-print(
-    "deviations:{}".format(
-        [
-            (square_edge_mm - (lengths_mm[i] / lengths_edges[i])) / square_edge_mm
-            for i in range(len(lengths_mm))
-        ]
-    )
-)
-
-
-np.set_printoptions(suppress=True)
-
-
-def distance(p1, p2):
-    return math.hypot(p1[0] - p2[0], p1[1] - p2[1])
-
-
-def assess_config(image_path, chess_image, distorted_grid, corner_only_homography):
-
-    config = calib.Config()
-    config.populate_lens_parameters_from_chessboard(chess_image, rows, cols)
-    config.populate_keystone_and_real_parameters_from_chessboard(
-        chess_image,
-        cols,
-        rows,
-        grid_width,
-        grid_height,
-        corners_only=corner_only_homography,
-        border=200,
-    )
-
-    cv.imshow(
-        "{} {} lens".format(image_path, corner_only_homography),
-        calib.correct_image(chess_image, config, calib.Correction.lens_distortion),
-    )
-    cv.imshow(
-        "{} {} lens and keystone".format(image_path, corner_only_homography),
-        calib.correct_image(chess_image, config, calib.Correction.lens_and_keystone),
-    )
-    # grid[0] -> bottom left
-    # grid[10] -> top left
-    # grid[-11] -> bottom right
-    # grid[-1] -> top right
-    expectations = np.zeros((len(distorted_grid), 2), np.float32)
-    for i in range(rows):
-        for j in range(cols):
-            expectations[i + j * rows, 0] = square_edge_mm * j
-            expectations[i + j * rows, 1] = grid_height - (square_edge_mm * i)
-
-    corrected_points = calib.correct_points(
-        distorted_grid, config, calib.Correction.lens_keystone_and_real_coordinates
-    )
-
-    print(config)
-    print(config.to_dict())
-
-    distances = []
-    distance_hist = {}
-    highest = 0
-    for i in range(len(corrected_points)):
-        original = distorted_grid[i, 0]
-        point = corrected_points[i, 0]
-        expectation = expectations[i]
-        assert len(point) == 2
-        dist = distance(point, expectation)
-        if dist > highest:
-            highest = dist
-            print(
-                "new highest: px{} res{} exp{} dist{}".format(
-                    original, point, expectation, dist
-                )
-            )
-        distances.append(dist)
-        mm = math.ceil(dist)
-        if mm in distance_hist:
-            distance_hist[mm] += 1
-        else:
-            distance_hist[mm] = 1
-
-    print(
-        "image: {} corners_only_homography: {}".format(
-            image_path, corner_only_homography
-        )
-    )
-    print("average deviation:\n{}mm".format(sum(distances) / len(distances)))
-    print("max deviation:\n{}mm".format(max(distances)))
-    print("deviation spread:")
-    pprint(distance_hist)
-
-    config.save("distcor_04_corner_homography")
-
-
-def search_for_best_config():
-
-    for image_path in (
-        "sample_images/pupil_allignment_chessboard/distcor_001.bmp",
-        "sample_images/pupil_allignment_chessboard/distcor_002.bmp",
-        "sample_images/pupil_allignment_chessboard/distcor_003.bmp",
-        "sample_images/pupil_allignment_chessboard/distcor_004.bmp",
-    ):
-        chess_image = cv.imread(image_path)
-        grey = cv.cvtColor(chess_image, cv.COLOR_BGR2GRAY)
-
-        _, distorted_grid = cv.findChessboardCorners(grey, (rows, cols))
-
-        for corner_only_homography in (True, False):
-            assess_config(
-                image_path, chess_image, distorted_grid, corner_only_homography
-            )
-
-        cv.drawChessboardCorners(chess_image, (rows, cols), distorted_grid, True)
-        cv.imshow("{} grid".format(image_path), chess_image)
-
-    cv.waitKey()
-
-
-if __name__ == "__main__":
-    search_for_best_config()
+"""
+Usage: python search_for_best_pupil_config.py [options] [IMAGE...]
+
+Searches for the pupil alignment camera calibration which best maps
+a chessboard image to its known geometry. Each candidate calibration
+is computed from one image and one combination of parameters:
+
+  --corners-only  homography from the grid corners only, from all
+                  grid points, or both (yes, no, both; default both)
+  --border        comma separated border sizes in pixels around the
+                  keystone corrected grid (default 200)
+  --lens-model    comma separated lens distortion models (default,
+                  rational, thin-prism, no-tangential, fix-k3;
+                  default default)
+
+The candidates are evaluated in parallel worker processes (-j,
+default: number of CPUs), without any windows, so that the search
+can run unattended. The deviations of the corrected grid points from
+their expected positions are written to a CSV results table (-r),
+sorted by the selection criterion (-c, mean, rms or max deviation),
+and the best calibration is saved with Config.save() (-o).
+"""
+
+from __future__ import division, print_function
+
+import csv
+import math
+import multiprocessing
+import sys
+from argparse import ArgumentParser, ArgumentTypeError
+from itertools import product
+
+import camera_calibration as calib
+import cv2 as cv
+import numpy as np
+
+rows = 11
+cols = 8
+
+lengths_mm = [45.65, 91.13, 136.58, 64.30, 128.78]
+lengths_edges = [1, 2, 3, math.sqrt(2), math.sqrt(2) * 2]
+
+square_edge_mm = sum(
+    lengths_mm[i] / lengths_edges[i] for i in range(len(lengths_mm))
+) / len(lengths_mm)
+
+grid_width = square_edge_mm * (cols - 1)
+grid_height = square_edge_mm * (rows - 1)
+
+DEFAULT_IMAGES = [
+    "sample_images/pupil_allignment_chessboard/distcor_001.bmp",
+    "sample_images/pupil_allignment_chessboard/distcor_002.bmp",
+    "sample_images/pupil_allignment_chessboard/distcor_003.bmp",
+    "sample_images/pupil_allignment_chessboard/distcor_004.bmp",
+]
+
+LENS_MODELS = {
+    "default": 0,
+    "rational": cv.CALIB_RATIONAL_MODEL,
+    "thin-prism": cv.CALIB_RATIONAL_MODEL | cv.CALIB_THIN_PRISM_MODEL,
+    "no-tangential": cv.CALIB_ZERO_TANGENT_DIST,
+    "fix-k3": cv.CALIB_FIX_K3,
+}
+
+CORNERS_ONLY = {"yes": (True,), "no": (False,), "both": (True, False)}
+
+RESULT_FIELDS = [
+    "image",
+    "corners_only",
+    "border",
+    "lens_model",
+    "mean_mm",
+    "rms_mm",
+    "max_mm",
+    "error",
+]
+
+# grid points of the last image, to find the chessboard corners
+# only once for all candidates of an image in a worker process
+_grid_cache = {}
+
+
+def expected_grid_points():
+    """returns the real positions of the chessboard corners, in the
+    order in which findChessboardCorners() returns them."""
+    # grid[0] -> bottom left
+    # grid[10] -> top left
+    # grid[-11] -> bottom right
+    # grid[-1] -> top right
+    expectations = np.zeros((rows * cols, 2), np.float32)
+    for i in range(rows):
+        for j in range(cols):
+            expectations[i + j * rows, 0] = square_edge_mm * j
+            expectations[i + j * rows, 1] = grid_height - (square_edge_mm * i)
+    return expectations
+
+
+def load_chessboard(image_path):
+    """returns the image and its distorted grid of chessboard
+    corners, or raises ValueError if the grid is not found."""
+    if image_path not in _grid_cache:
+        chess_image = cv.imread(image_path)
+        if chess_image is None:
+            raise ValueError("image could not be read")
+
+        grey = cv.cvtColor(chess_image, cv.COLOR_BGR2GRAY)
+        found, distorted_grid = cv.findChessboardCorners(grey, (rows, cols))
+        if not found:
+            raise ValueError("chessboard grid not found")
+
+        _grid_cache.clear()
+        _grid_cache[image_path] = (chess_image, distorted_grid)
+
+    return _grid_cache[image_path]
+
+
+def assess_config(candidate):
+    """computes the calibration for one candidate, and returns its
+    result row and configuration dictionary. The configuration is
+    None if the calibration failed."""
+    image_path, corners_only, border, lens_model = candidate
+    result = dict(
+        image=image_path,
+        corners_only=corners_only,
+        border=border,
+        lens_model=lens_model,
+        mean_mm=float("NaN"),
+        rms_mm=float("NaN"),
+        max_mm=float("NaN"),
+        error="",
+    )
+
+    try:
+        chess_image, distorted_grid = load_chessboard(image_path)
+
+        config = calib.Config()
+        if not config.populate_lens_parameters_from_chessboard(
+            chess_image, rows, cols, LENS_MODELS[lens_model]
+        ):
+            raise ValueError("lens calibration failed")
+        if not config.populate_keystone_and_real_parameters_from_chessboard(
+            chess_image,
+            cols,
+            rows,
+            grid_width,
+            grid_height,
+            corners_only=corners_only,
+            border=border,
+        ):
+            raise ValueError("keystone calibration failed")
+
+        corrected_points = calib.correct_points(
+            distorted_grid, config, calib.Correction.lens_keystone_and_real_coordinates
+        )
+    except (ValueError, cv.error) as err:
+        result["error"] = str(err).strip()
+        return result, None
+
+    distances = np.hypot(*(corrected_points[:, 0, :] - expected_grid_points()).T)
+    if not np.all(np.isfinite(distances)):
+        result["error"] = "correction is not finite"
+        return result, None
+
+    result.update(
+        mean_mm=float(np.mean(distances)),
+        rms_mm=float(np.sqrt(np.mean(distances ** 2))),
+        max_mm=float(np.max(distances)),
+    )
+    return result, config.to_dict()
+
+
+def init_worker():
+    # the candidates are evaluated in parallel already
+    cv.setNumThreads(1)
+
+
+def search_for_best_config(candidates, criterion="max_mm", workers=None):
+    """evaluates the candidates in a process pool, and returns the
+    result rows sorted by the criterion, and the configuration
+    dictionary of the best candidate (None if all failed)."""
+    results = []
+    configs = {}
+
+    pool = multiprocessing.Pool(processes=workers, initializer=init_worker)
+    try:
+        for result, config_dict in pool.imap_unordered(assess_config, candidates):
+            results.append(result)
+            if config_dict is None:
+                print(
+                    "{image} {corners_only} {border} {lens_model}: {error}".format(
+                        **result
+                    ),
+                    file=sys.stderr,
+                )
+            else:
+                configs[candidate_key(result)] = config_dict
+    finally:
+        pool.close()
+        pool.join()
+
+    # failed candidates are sorted to the end
+    results.sort(key=lambda r: (bool(r["error"]), r[criterion], candidate_key(r)))
+    if not configs:
+        return results, None
+
+    return results, configs[candidate_key(results[0])]
+
+
+def candidate_key(result):
+    return (
+        result["image"],
+        result["corners_only"],
+        result["border"],
+        result["lens_model"],
+    )
+
+
+def write_results(file_name, results):
+    # the csv module needs binary files in Python 2
+    with open(file_name, "wb" if sys.version_info[0] < 3 else "w") as f:
+        writer = csv.DictWriter(f, RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def lens_model_list(value):
+    models = value.split(",")
+    for model in models:
+        if model not in LENS_MODELS:
+            raise ArgumentTypeError(
+                "invalid lens model %r (choose from %s)"
+                % (model, ", ".join(sorted(LENS_MODELS)))
+            )
+    return models
+
+
+def main(args):
+    parser = ArgumentParser(
+        description="search for the best pupil alignment camera calibration",
+        usage=__doc__.strip().splitlines()[0][len("Usage: ") :],
+    )
+    parser.add_argument("--corners-only", default="both", choices=sorted(CORNERS_ONLY))
+    parser.add_argument("--border", type=int_list, default=[200])
+    parser.add_argument("--lens-model", type=lens_model_list, default=["default"])
+    parser.add_argument(
+        "-c", "--criterion", default="max", choices=["mean", "rms", "max"]
+    )
+    parser.add_argument("-j", "--workers", type=int, default=0)
+    parser.add_argument("-r", "--results", default="pupil_config_search.csv")
+    parser.add_argument("-o", "--output", default="distcor_04_corner_homography")
+    parser.add_argument("images", nargs="*", default=DEFAULT_IMAGES)
+    opts = parser.parse_args(args[1:])
+
+    candidates = list(
+        product(
+            opts.images, CORNERS_ONLY[opts.corners_only], opts.border, opts.lens_model
+        )
+    )
+    print(
+        "edge: {}mm, width: {}mm, height: {}mm, {} candidates".format(
+            square_edge_mm, grid_width, grid_height, len(candidates)
+        )
+    )
+
+    criterion = opts.criterion + "_mm"
+    results, best_config = search_for_best_config(
+        candidates, criterion, workers=(opts.workers or None)
+    )
+    write_results(opts.results, results)
+
+    if best_config is None:
+        print("no candidate calibration succeeded", file=sys.stderr)
+        return 1
+
+    best = results[0]
+    print(
+        "best: image: {image} corners_only_homography: {corners_only}"
+        " border: {border} lens model: {lens_model}".format(**best)
+    )
+    print(
+        "average deviation: {mean_mm}mm, rms deviation: {rms_mm}mm,"
+        " max deviation: {max_mm}mm".format(**best)
+    )
+    calib.Config.from_dict(best_config).save(opts.output)
+    print(
+        "results written to {}, calibration saved to {}".format(
+            opts.results, opts.output
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -28,6 +28,27 @@ PROTECTION_TOLERANCE = 0.15  # degrees of protection between measured
 
 DB_TIME_FORMAT = "%Y-%m-%dT%H.%M.%S.~%Z"  # "~" means number of milliseconds
 
+DB_RECORD_CODEC = "binary"  # storage format of new database records, see vfr/db/codec.py
+
+DB_CHUNK_SIZE = 256 * 1024  # records larger than this are split into chunks (bytes)
+
+DB_COMPRESSION = "zlib"  # compressor for large new records ("zlib", "lz4" or None)
+
+DB_COMPRESSION_BY_TYPE = {}  # compressor per record type, overrides DB_COMPRESSION
+
+DB_COMPRESSION_THRESHOLD = 16 * 1024  # records larger than this are compressed (bytes)
+
+DB_CACHE_SIZE = 64 * 1024 * 1024  # maximum encoded size of cached records (bytes)
+
+DB_MIGRATION_BATCH_SIZE = 500  # number of records per transaction in 'migrate' task
+
+IMAGE_ANALYSIS_WORKERS = 0  # worker processes for image analysis, 0 = number of CPUs
+
+ANALYSIS_QUEUE_LEN = 2  # captured images checked in the background, 0 = no queue
+
+IMAGE_FORMAT = "bmp"  # storage format of captured images, see vfr/image_store.py
+IMAGE_COMPRESSION = 3  # compression level of PNG (0-9), TIFF is LZW if > 0
+
 LAMP_WARMING_TIME_MILLISECONDS = 1000.0
 
 NR360_SERIALNUMBER = 40873952
@@ -102,7 +123,8 @@ DAT_REP_TARGET_DETECTION_OTSU_PARS = Namespace(
     GROUP_RANGE=TARGET_SEPERATION,  # in mm
     QUALITY_METRIC=0.4,  # dimensionless
     BLOB_SIZE_TOLERANCE=0.2, # dimensionless
-    GROUP_RANGE_TOLERANCE=0.2 # dimensionless
+    GROUP_RANGE_TOLERANCE=0.2, # dimensionless
+    BLOB_DETECTION="simple",  # "simple" (SimpleBlobDetector) or "components"
 )
 DAT_REP_TARGET_DETECTION_CONTOUR_PARS = Namespace(
     CALIBRATION_PARS=DAT_REP_CALIBRATION_PARS,
@@ -169,7 +191,8 @@ MET_CAL_TARGET_DETECTION_OTSU_PARS = Namespace(
     GROUP_RANGE=TARGET_SEPERATION,  # in mm
     QUALITY_METRIC=0.4,  # dimensionless
     BLOB_SIZE_TOLERANCE=0.2, # dimensionless
-    GROUP_RANGE_TOLERANCE=0.2 # dimensionless
+    GROUP_RANGE_TOLERANCE=0.2, # dimensionless
+    BLOB_DETECTION="simple",  # "simple" (SimpleBlobDetector) or "components"
 )
 MET_CAL_TARGET_DETECTION_CONTOUR_PARS = Namespace(
     SMALL_DIAMETER=1.42,  # millimeter
@@ -284,7 +307,8 @@ POS_REP_TARGET_DETECTION_OTSU_PARS = Namespace(
     GROUP_RANGE=TARGET_SEPERATION,  # in mm
     QUALITY_METRIC=0.4,  # dimensionless
     BLOB_SIZE_TOLERANCE=0.2, # dimensionless
-    GROUP_RANGE_TOLERANCE=0.2 # dimensionless
+    GROUP_RANGE_TOLERANCE=0.2, # dimensionless
+    BLOB_DETECTION="simple",  # "simple" (SimpleBlobDetector) or "components"
 )
 POS_REP_TARGET_DETECTION_CONTOUR_PARS = Namespace(
     CALIBRATION_PARS=POS_REP_CALIBRATION_PARS,
@@ -302,6 +326,11 @@ POS_REP_ANALYSIS_PARS = Namespace(
     TARGET_DETECTION_CONTOURS_PARS=POS_REP_TARGET_DETECTION_CONTOUR_PARS,
     PLATESCALE=POS_REP_PLATESCALE,  # millimeter per pixel
     MAX_FAILURE_QUOTIENT=0.2,
+    ROI_TRACKING=False,  # search targets first around their
+    # position in the previous image of the sweep
+    ROI_MARGIN=2.5,  # millimeter, margin of the tracked region
+    ROI_RUN_LENGTH=16,  # number of consecutive images which are
+    # tracked before the tracker is reset
     display=False,
     verbosity=0,
     loglevel=0,
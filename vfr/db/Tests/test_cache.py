@@ -0,0 +1,51 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+from vfr.db.cache import RecordCache
+
+KEYBASE = ("MP001", "test-record")
+
+
+class TestRecordCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = RecordCache(max_bytes=100)
+        for count in range(3):
+            cache.put(KEYBASE, count, {"value": count}, 40)
+
+        # the oldest entry was evicted
+        self.assertIsNone(cache.get(KEYBASE, 0))
+        self.assertEqual(cache.get(KEYBASE, 1), {"value": 1})
+        self.assertEqual(cache.size_bytes, 80)
+
+        # entry 1 was used last, so entry 2 is evicted
+        cache.put(KEYBASE, 3, {"value": 3}, 40)
+        self.assertIsNone(cache.get(KEYBASE, 2))
+        self.assertEqual(cache.get(KEYBASE, 1), {"value": 1})
+
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses), (2, 2))
+        self.assertEqual((stats.entries, stats.size_bytes), (2, 80))
+
+    def test_too_large_record(self):
+        cache = RecordCache(max_bytes=100)
+        cache.put(KEYBASE, 0, {"value": 0}, 101)
+        self.assertIsNone(cache.get(KEYBASE, 0))
+        self.assertEqual(cache.size_bytes, 0)
+
+    def test_record_saved(self):
+        cache = RecordCache(max_bytes=100)
+        cache.set_latest_count(KEYBASE, 0)
+        cache.put(KEYBASE, 1, {"value": 1}, 10)
+
+        cache.record_saved(KEYBASE, 1)
+        self.assertEqual(cache.get_latest_count(KEYBASE), 1)
+        self.assertIsNone(cache.get(KEYBASE, 1))
+        self.assertEqual(cache.size_bytes, 0)
+
+        cache.clear()
+        self.assertIsNone(cache.get_latest_count(KEYBASE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,238 @@
+from __future__ import absolute_import, division, print_function
+
+import math
+import struct
+import unittest
+from argparse import Namespace
+from collections import namedtuple
+
+import numpy as np
+
+from vfr.db.codec import (
+    HEADER_LENGTH,
+    TAG_BIGINT,
+    TAG_BYTES,
+    TAG_DICT,
+    TAG_FALSE,
+    TAG_FLOAT,
+    TAG_FLOAT_LIST,
+    TAG_FLOAT_TUPLE,
+    TAG_INT,
+    TAG_LIST,
+    TAG_NAMESPACE,
+    TAG_NDARRAY,
+    TAG_NONE,
+    TAG_TEXT,
+    TAG_TRUE,
+    TAG_TUPLE,
+    RecordDecodeError,
+    RecordEncodeError,
+    compress_record,
+    decode_fields,
+    decode_record,
+    decompress_record,
+    encode_record,
+    get_codec,
+    get_compressor,
+    is_complete_binary_record,
+    join_chunks,
+    read_chunk_manifest,
+    read_compressed_header,
+    split_record,
+)
+
+Point = namedtuple("Point", ["x", "y"])
+
+
+def assert_same(testcase, val, expected):
+    """compares decoded values, including their types, NaNs and arrays."""
+    testcase.assertIs(type(val), type(expected))
+    if isinstance(expected, np.ndarray):
+        testcase.assertEqual(val.dtype, expected.dtype)
+        testcase.assertEqual(val.shape, expected.shape)
+        testcase.assertTrue(np.array_equal(val, expected))
+    elif isinstance(expected, float) and math.isnan(expected):
+        testcase.assertTrue(math.isnan(val))
+    elif isinstance(expected, (tuple, list)):
+        testcase.assertEqual(len(val), len(expected))
+        for v, e in zip(val, expected):
+            assert_same(testcase, v, e)
+    elif isinstance(expected, dict):
+        testcase.assertEqual(sorted(val, key=repr), sorted(expected, key=repr))
+        for k in expected:
+            assert_same(testcase, val[k], expected[k])
+    elif isinstance(expected, Namespace):
+        assert_same(testcase, vars(val), vars(expected))
+    else:
+        testcase.assertEqual(val, expected)
+
+
+class TestRecordCodec(unittest.TestCase):
+    def setUp(self):
+        self.codec = get_codec("binary")
+
+    def round_trip(self, val):
+        return self.codec.decode(self.codec.encode(val))
+
+    def test_tags(self):
+        # (value, type tag, expected decoded value)
+        cases = [
+            (None, TAG_NONE, None),
+            (True, TAG_TRUE, True),
+            (False, TAG_FALSE, False),
+            (-42, TAG_INT, -42),
+            (2 ** 70, TAG_BIGINT, 2 ** 70),
+            (-(2 ** 70), TAG_BIGINT, -(2 ** 70)),
+            (1.25, TAG_FLOAT, 1.25),
+            (float("nan"), TAG_FLOAT, float("nan")),
+            (float("-inf"), TAG_FLOAT, float("-inf")),
+            (np.float64(0.5), TAG_FLOAT, 0.5),
+            (b"\x00\xffraw", TAG_BYTES, b"\x00\xffraw"),
+            (u"\u00b5m", TAG_TEXT, u"\u00b5m"),
+            ((1, "a", None), TAG_TUPLE, (1, "a", None)),
+            ((), TAG_TUPLE, ()),
+            ([1, (2, 3)], TAG_LIST, [1, (2, 3)]),
+            ([], TAG_LIST, []),
+            ((0.5, float("nan")), TAG_FLOAT_TUPLE, (0.5, float("nan"))),
+            ([0.5, 1.5], TAG_FLOAT_LIST, [0.5, 1.5]),
+            (Point(1.0, 2.0), TAG_FLOAT_TUPLE, (1.0, 2.0)),
+            (
+                {("alpha", 1): (1.0, 2.0), "key": {"nested": [1]}},
+                TAG_DICT,
+                {("alpha", 1): (1.0, 2.0), "key": {"nested": [1]}},
+            ),
+            (Namespace(a=1, b=(2.0,)), TAG_NAMESPACE, Namespace(a=1, b=(2.0,))),
+            (np.arange(6.0).reshape(2, 3), TAG_NDARRAY, np.arange(6.0).reshape(2, 3)),
+            (np.array(["x", 1], dtype=object), TAG_LIST, ["x", 1]),
+        ]
+        for val, tag, expected in cases:
+            raw = self.codec.encode(val)
+            self.assertEqual(raw[HEADER_LENGTH : HEADER_LENGTH + 1], tag, repr(val))
+            assert_same(self, self.codec.decode(raw), expected)
+
+    def test_arrays(self):
+        arrays = [
+            np.array(3.5),
+            np.array(7, dtype=np.int32),
+            np.zeros((0, 3)),
+            np.arange(12).reshape(3, 4)[:, ::2],
+            np.array([[1, 2], [3, 4]], dtype=">i4").T,
+            np.array([True, False]),
+            np.arange(24, dtype=np.uint16).reshape(2, 3, 4),
+        ]
+        for arr in arrays:
+            decoded = self.round_trip(arr)
+            assert_same(self, decoded, arr)
+            # the decoded array is a writeable copy
+            self.assertTrue(decoded.flags.writeable)
+
+    def test_unsupported_value(self):
+        with self.assertRaises(RecordEncodeError):
+            self.codec.encode({"value": object()})
+
+    def test_decode_fields(self):
+        record = {
+            "result": "OK",
+            "time": "2019-06-01T12.00.00.000UTC",
+            "analysis_results": {(i, 0): (i * 0.5, 1.0) for i in range(100)},
+            "measures": Namespace(max=1.0),
+        }
+        raw = encode_record(record)
+        self.assertEqual(
+            decode_fields(raw, ["time", "result", "missing"]),
+            {"time": record["time"], "result": "OK"},
+        )
+
+        legacy = encode_record(record, codec="repr")
+        self.assertEqual(decode_fields(legacy, ["result"]), {"result": "OK"})
+
+    def test_legacy_repr_record(self):
+        record = {
+            "result": "OK",
+            "value": float("nan"),
+            "measures": Namespace(max=1.5, min=-float("inf")),
+            "coords": {(0, 1): (1.0, 2.0)},
+        }
+        raw = encode_record(record, codec="repr")
+        self.assertEqual(raw, repr(record))
+
+        decoded = decode_record(raw)
+        self.assertTrue(math.isnan(decoded["value"]))
+        self.assertEqual(vars(decoded["measures"]), vars(record["measures"]))
+        self.assertEqual(decoded["coords"], record["coords"])
+
+        # literal records are parsed without eval()
+        self.assertEqual(decode_record(repr({"a": (1, "b")})), {"a": (1, "b")})
+
+    def test_truncated_record(self):
+        raw = encode_record({"values": list(range(100))})
+        self.assertTrue(is_complete_binary_record(raw))
+        self.assertFalse(is_complete_binary_record(raw[:-10]))
+        self.assertFalse(is_complete_binary_record(repr({"a": 1})))
+
+        with self.assertRaises(RecordDecodeError):
+            decode_record(raw[:-10])
+
+    def test_chunked_record(self):
+        raw = encode_record({"values": np.arange(1000.0)})
+        manifest, chunks = split_record(raw, 1000)
+
+        self.assertEqual(len(chunks), int(math.ceil(len(raw) / 1000)))
+        self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+        self.assertEqual(read_chunk_manifest(manifest), (len(chunks), len(raw)))
+        self.assertIsNone(read_chunk_manifest(raw))
+
+        joined = join_chunks(chunks, len(raw))
+        self.assertEqual(joined, raw)
+        assert_same(self, decode_record(joined)["values"], np.arange(1000.0))
+
+        with self.assertRaises(RecordDecodeError):
+            join_chunks(chunks[:-1] + [None], len(raw))
+        with self.assertRaises(RecordDecodeError):
+            join_chunks(chunks[:-1], len(raw))
+        with self.assertRaises(RecordDecodeError):
+            decode_record(manifest)
+
+    def test_compressed_record(self):
+        record = {"coords": {(i, 0): (1.0, 2.0) for i in range(200)}}
+        compressors = ["zlib"]
+        try:
+            compressors.append(get_compressor("lz4").name)
+        except ValueError:
+            pass
+
+        raw = encode_record(record)
+        for name in compressors:
+            compressed = compress_record(raw, get_compressor(name))
+            self.assertLess(len(compressed), len(raw))
+            compressor_id, _, length = read_compressed_header(compressed)
+            self.assertEqual(compressor_id, get_compressor(name).compressor_id)
+            self.assertEqual(length, len(raw))
+
+            self.assertEqual(decompress_record(compressed), raw)
+            self.assertEqual(decode_record(compressed), record)
+            self.assertTrue(is_complete_binary_record(compressed))
+
+            # compressed records are not compressed again
+            self.assertEqual(
+                compress_record(compressed, get_compressor(name)), compressed
+            )
+
+            with self.assertRaises(RecordDecodeError):
+                decode_record(compressed[:-1])
+
+    def test_incompressible_record(self):
+        raw = encode_record({"value": 1})
+        self.assertEqual(compress_record(raw, get_compressor("zlib")), raw)
+        self.assertIsNone(read_compressed_header(raw))
+
+    def test_float_payload(self):
+        raw = self.codec.encode((0.5, 1.5))
+        self.assertEqual(
+            raw[HEADER_LENGTH + 5 :],
+            struct.pack("<2d", 0.5, 1.5),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
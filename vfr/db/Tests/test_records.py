@@ -0,0 +1,238 @@
+from __future__ import absolute_import, division, print_function
+
+import shutil
+import tempfile
+import unittest
+from argparse import Namespace
+from functools import partial
+
+import lmdb
+
+from vfr.db.base import (
+    CURRENT_SCHEMA_VERSION,
+    RECORD_SCHEMAS,
+    TestResult,
+    get_named_record,
+    get_test_status,
+    named_keyfunc,
+    register_record_schema,
+    save_named_record,
+    status_index_key,
+    upgrade_version,
+)
+from vfr.db.codec import (
+    decode_record,
+    get_codec,
+    read_chunk_manifest,
+    read_compressed_header,
+    read_header,
+)
+from vfr.db.migration import UnknownRecordTypeError, migrate_database
+from vfr.db.toplevel import Database
+
+RECORD_TYPE = ("test-record", "result")
+
+DEFAULT_VALS = {"extra": 0}
+
+upgrade_func = partial(upgrade_version, fieldname="algorithm_version")
+
+
+class TestRecords(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.env = lmdb.open(self.tmpdir, max_dbs=10, map_size=1 << 26)
+        self.dbe = Database(opts=Namespace(mockup=False), env=self.env)
+        self.dbe.fpu_config = {0: {"serialnumber": "MP001"}}
+        self.dbe.compression = None
+        self.keybase = named_keyfunc(RECORD_TYPE, self.dbe)(0)
+
+        register_record_schema(
+            RECORD_TYPE, default_vals=DEFAULT_VALS, upgrade_func=upgrade_func
+        )
+
+    def tearDown(self):
+        del RECORD_SCHEMAS[RECORD_TYPE]
+        self.env.close()
+        shutil.rmtree(self.tmpdir)
+
+    def save(self, **fields):
+        record = Namespace(result=TestResult.OK, algorithm_version=(1, 0, 0))
+        vars(record).update(fields)
+        save_named_record(RECORD_TYPE, self.dbe, 0, record)
+
+    def get(self, count=None):
+        # read the record from the database, not from the record cache
+        self.dbe.cache.clear()
+        return get_named_record(
+            RECORD_TYPE,
+            self.dbe,
+            0,
+            count=count,
+            default_vals=DEFAULT_VALS,
+            upgrade_func=upgrade_func,
+        )
+
+    def get_raw(self, count):
+        with self.dbe.begin() as txn:
+            return txn.get(repr(self.keybase + ("data", count)))
+
+    def put_legacy(self, keybase, count, record):
+        # a record as written by software versions before the binary codec
+        with self.dbe.begin(write=True) as txn:
+            txn.put(str(keybase + ("ntests",)), str(count))
+            txn.put(repr(keybase + ("data", count)), repr(record))
+
+    def status(self):
+        return get_test_status(self.dbe, 0, named_keyfunc(RECORD_TYPE, self.dbe))
+
+    def test_save_and_get(self):
+        for value in range(3):
+            self.save(value=value)
+
+        val = self.get()
+        self.assertEqual(val["value"], 2)
+        self.assertEqual(val["record-count"], 2)
+        self.assertEqual(val["extra"], 0)
+        self.assertEqual(self.get(count=0)["value"], 0)
+        self.assertIsNone(self.get(count=3))
+
+        self.assertIsNotNone(read_header(self.get_raw(2)))
+
+        status = self.status()
+        self.assertEqual(status["count"], 2)
+        self.assertEqual(status["result"], TestResult.OK)
+        self.assertEqual(status["time"], val["time"])
+
+    def test_broken_status_index(self):
+        self.save(value=0)
+        with self.dbe.begin(write=True) as txn:
+            txn.put(status_index_key("MP001"), "{'broken")
+        self.assertIsNone(self.status())
+
+        # the measurement is stored, and a new index is written
+        self.save(value=1)
+        self.assertEqual(self.get()["value"], 1)
+        self.assertEqual(self.status()["count"], 1)
+
+    def test_chunked_record(self):
+        self.dbe.chunk_size = 1000
+        self.save(values=[float(i) for i in range(1000)])
+
+        self.assertIsNotNone(read_chunk_manifest(self.get_raw(0)))
+        self.assertEqual(self.get()["values"], [float(i) for i in range(1000)])
+
+    def test_compressed_record(self):
+        self.dbe.compression = "zlib"
+        self.dbe.compression_threshold = 500
+        self.save(values=[1.0] * 1000)
+        self.save(values=[1.0])
+
+        self.assertIsNotNone(read_compressed_header(self.get_raw(0)))
+        self.assertIsNone(read_compressed_header(self.get_raw(1)))
+        self.assertEqual(self.get(count=0)["values"], [1.0] * 1000)
+        self.assertEqual(self.get()["values"], [1.0])
+
+    def test_chunked_compressed_record(self):
+        self.dbe.compression = "zlib"
+        self.dbe.compression_threshold = 500
+        self.dbe.chunk_size = 500
+        values = [float(i) / 7 for i in range(1000)]
+        self.save(values=values)
+
+        self.assertIsNotNone(read_chunk_manifest(self.get_raw(0)))
+        self.assertEqual(self.get()["values"], values)
+
+    def test_legacy_record(self):
+        self.put_legacy(
+            self.keybase,
+            0,
+            {"result": TestResult.OK, "value": float("nan"), "algorithm_version": 2.5},
+        )
+
+        val = self.get()
+        self.assertNotEqual(val["value"], val["value"])
+        self.assertEqual(val["algorithm_version"], (2, 5, 0))
+        self.assertEqual(val["extra"], 0)
+        # there is no status index entry for legacy records
+        self.assertIsNone(self.status())
+
+    def fill_legacy(self):
+        records = [
+            {"result": TestResult.FAILED, "value": i, "algorithm_version": 2.5}
+            for i in range(3)
+        ]
+        for count, record in enumerate(records):
+            self.put_legacy(self.keybase, count, record)
+        return records
+
+    def test_migration_dry_run(self):
+        records = self.fill_legacy()
+
+        stats = migrate_database(self.dbe, dry_run=True)
+        self.assertEqual(stats.records, 3)
+        self.assertEqual(stats.upgraded, 3)
+        self.assertEqual(stats.reencoded, 3)
+        self.assertEqual(stats.broken, 0)
+
+        for count, record in enumerate(records):
+            self.assertEqual(self.get_raw(count), repr(record))
+        self.assertIsNone(self.status())
+        self.assertEqual(self.dbe.schema_version, 0)
+
+    def test_migration(self):
+        self.fill_legacy()
+        with self.dbe.begin(write=True) as txn:
+            txn.put(repr(self.keybase + ("data", 3)), "{'result': ")
+            txn.put(str(self.keybase + ("ntests",)), "3")
+
+        stats = migrate_database(self.dbe, batch_size=2)
+        self.assertEqual(stats.records, 4)
+        self.assertEqual(stats.reencoded, 3)
+        self.assertEqual(stats.broken, 1)
+
+        for count in range(3):
+            raw = self.get_raw(count)
+            self.assertEqual(read_header(raw)[1], get_codec("binary").codec_id)
+            # defaults and upgrades are stored, so that they
+            # are not applied again when reading
+            self.assertEqual(
+                decode_record(raw),
+                {
+                    "result": TestResult.FAILED,
+                    "value": count,
+                    "algorithm_version": (2, 5, 0),
+                    "extra": 0,
+                },
+            )
+
+        self.assertEqual(self.dbe.schema_version, CURRENT_SCHEMA_VERSION)
+        self.assertEqual(self.get(count=1)["value"], 1)
+
+        # nothing is left to be done
+        stats = migrate_database(self.dbe)
+        self.assertEqual((stats.upgraded, stats.reencoded), (0, 0))
+
+    def test_migration_rebuilds_status_index(self):
+        self.fill_legacy()
+        self.assertIsNone(self.status())
+
+        migrate_database(self.dbe)
+
+        status = self.status()
+        self.assertEqual(status["count"], 2)
+        self.assertEqual(status["result"], TestResult.FAILED)
+        self.assertEqual(status["algorithm_version"], (2, 5, 0))
+
+    def test_migration_of_unknown_type(self):
+        records = self.fill_legacy()
+        self.put_legacy(("MP001", "unknown-type"), 0, {"result": TestResult.OK})
+
+        with self.assertRaises(UnknownRecordTypeError):
+            migrate_database(self.dbe)
+
+        self.assertEqual(self.get_raw(0), repr(records[0]))
+        self.assertEqual(self.dbe.schema_version, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,258 @@
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import logging
+import os
+from argparse import Namespace
+
+import numpy as np
+
+from ImageAnalysisFuncs.base import ImageAnalysisError
+from vfr.db.codec import RecordDecodeError, RecordEncodeError, decode_record, get_codec
+
+# parameters which do not change the result of an image analysis
+IGNORED_PARS = frozenset(["display", "verbosity", "loglevel"])
+
+# parameters which the analysis functions copy from the top-level
+# parameters into the parameters of the target detection
+COPIED_PARS = frozenset(["PLATESCALE"])
+
+
+def canonical_pars(pars, nested=False):
+    """returns a representation of analysis parameters which does
+    not depend on the ordering of dictionary or Namespace fields."""
+    if isinstance(pars, Namespace):
+        ignored = (IGNORED_PARS | COPIED_PARS) if nested else IGNORED_PARS
+        return tuple(
+            (k, canonical_pars(v, nested=True))
+            for k, v in sorted(vars(pars).items())
+            if k not in ignored
+        )
+    elif isinstance(pars, dict):
+        return tuple(
+            (str(k), canonical_pars(v, nested=nested))
+            for k, v in sorted(pars.items(), key=lambda kv: str(kv[0]))
+        )
+    elif isinstance(pars, (list, tuple)):
+        return tuple(canonical_pars(v, nested=nested) for v in pars)
+    elif isinstance(pars, np.ndarray):
+        # repr() abbreviates large arrays
+        return (
+            str(pars.dtype),
+            pars.shape,
+            hashlib.sha1(np.ascontiguousarray(pars).tobytes()).hexdigest(),
+        )
+    elif isinstance(pars, float):
+        # repr() keeps all digits
+        return repr(pars)
+    else:
+        return pars
+
+
+def hash_image_file(ipath):
+    """returns the file identity (path, size, mtime) and the SHA-1
+    hash of an image file. This does not need database access,
+    so that it can also run in worker processes."""
+    st = os.stat(ipath)
+    file_key = (os.path.abspath(ipath), st.st_size, st.st_mtime)
+    sha = hashlib.sha1()
+    with open(ipath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return file_key, sha.hexdigest()
+
+
+class AnalysisCache:
+    """Persistent cache of image analysis results.
+
+    Entries are keyed by the SHA-1 hash of the image file, the
+    name and algorithm version of the analysis function, and the
+    analysis parameters. Any change of the image, of the parameters,
+    or of the algorithm version selects a new entry, so that entries
+    never need to be invalidated. Failed analyses are cached as well,
+    and raise the same ImageAnalysisError again.
+
+    The entries are stored in the LMDB database "analysis-cache"
+    next to the verification database. They are accessed through the
+    transactions of the verification database, so that they are part
+    of a running batch (see Database.batch()), and put_many() writes
+    several entries in one batch. Results are filled in
+    when images are checked right after capture (see
+    check_image_analyzability()), and reused by the evaluation tasks.
+    """
+
+    def __init__(self, dbe, dbname="analysis-cache"):
+        self.dbe = dbe
+        self.db = dbe.env.open_db(dbname)
+        # image hashes by (path, size, mtime), so that each
+        # image file is read only once per process
+        self.image_hashes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def image_hash(self, ipath):
+        st = os.stat(ipath)
+        file_key = (os.path.abspath(ipath), st.st_size, st.st_mtime)
+        digest = self.image_hashes.get(file_key)
+        if digest is None:
+            file_key, digest = hash_image_file(ipath)
+            self.image_hashes[file_key] = digest
+        return digest
+
+    def key(self, ipath, analysis_func, version, pars, key_pars=None, tracker=None):
+        """returns the cache key of an analysis, or None if the
+        image cannot be read.
+
+        The mode of a TargetTracker passed to the analysis is part
+        of the key, because a tracked analysis searches a region of
+        interest and can differ slightly from a full-frame search.
+
+        ipath can also be an image array with the hash of its
+        file contents in the digest attribute (see
+        vfr.image_writer.ImageFrame), which is used while the
+        file is still being written.
+        """
+        image_hash = getattr(ipath, "digest", None)
+        if image_hash is None:
+            try:
+                image_hash = self.image_hash(getattr(ipath, "path", ipath))
+            except (IOError, OSError):
+                return None
+
+        if tracker is not None:
+            key_pars = (key_pars, tracker.key())
+
+        pars_hash = hashlib.sha1(
+            repr(canonical_pars((pars, key_pars))).encode("utf-8")
+        ).hexdigest()
+
+        return str(
+            repr(
+                (
+                    image_hash,
+                    analysis_func.__name__,
+                    tuple(version) if version is not None else None,
+                    pars_hash,
+                )
+            )
+        )
+
+    def get(self, key):
+        """returns the stored entry {"result": ..., "error": ...}, or None."""
+        with self.dbe.begin() as txn:
+            raw = txn.get(key, db=self.db)
+        if raw is None:
+            return None
+        try:
+            return decode_record(raw)
+        except (SyntaxError, RecordDecodeError):
+            logging.getLogger(__name__).warning(
+                "analysis cache entry %r is broken, ignoring it" % key
+            )
+            return None
+
+    def put(self, key, result=None, error=None):
+        try:
+            raw = get_codec("binary").encode({"result": result, "error": error})
+        except RecordEncodeError as e:
+            logging.getLogger(__name__).debug("analysis result not cached: %s" % e)
+            return
+        with self.dbe.begin(write=True) as txn:
+            txn.put(key, raw, db=self.db)
+
+    def put_many(self, entries):
+        """stores a sequence of (key, result, error) entries in one
+        write transaction."""
+        with self.dbe.batch():
+            for key, result, error in entries:
+                self.put(key, result=result, error=error)
+
+    def analyze(
+        self, ipath, analysis_func, pars=None, version=None, key_pars=None, **kwargs
+    ):
+        """returns analysis_func(ipath, pars=pars, **kwargs), using the
+        cached result if the same image was already analyzed with the
+        same parameters and algorithm version.
+
+        key_pars holds any values which determine the result but are
+        not part of pars, like the calibration of a correction function
+        passed in kwargs.
+        """
+        key = self.key(
+            ipath,
+            analysis_func,
+            version,
+            pars,
+            key_pars=key_pars,
+            tracker=kwargs.get("tracker"),
+        )
+        entry = None if key is None else self.get(key)
+
+        if entry is not None:
+            self.hits += 1
+            if entry["error"] is not None:
+                raise ImageAnalysisError(entry["error"])
+            return entry["result"]
+
+        self.misses += 1
+        try:
+            result = analysis_func(ipath, pars=pars, **kwargs)
+        except ImageAnalysisError as err:
+            if key is not None:
+                self.put(key, error=str(err))
+            raise
+
+        if key is not None:
+            self.put(key, result=result)
+        return result
+
+    def analyze_batch(
+        self, ipaths, analysis_func, batch_func, pars=None, version=None, key_pars=None
+    ):
+        """analyzes a sequence of images, like analyze(), with a function
+        which processes several images in one call.
+
+        Cached results are looked up under the name of analysis_func,
+        which analyzes a single image, so that they are shared with
+        analyze(). The remaining images are passed in one call to
+        batch_func(ipaths, pars=pars), which returns a list of
+        (result, error) pairs, where error is None or an
+        ImageAnalysisError.
+
+        Returns a list of (result, error) pairs in input order.
+        """
+        ipaths = list(ipaths)
+        keys = [
+            self.key(ipath, analysis_func, version, pars, key_pars=key_pars)
+            for ipath in ipaths
+        ]
+        outcomes = [None] * len(ipaths)
+        missing = []
+        for i, key in enumerate(keys):
+            entry = None if key is None else self.get(key)
+            if entry is None:
+                self.misses += 1
+                missing.append(i)
+                continue
+
+            self.hits += 1
+            if entry["error"] is not None:
+                outcomes[i] = (None, ImageAnalysisError(entry["error"]))
+            else:
+                outcomes[i] = (entry["result"], None)
+
+        if missing:
+            computed = batch_func([ipaths[i] for i in missing], pars=pars)
+            new_entries = []
+            for i, (result, err) in zip(missing, computed):
+                outcomes[i] = (result, err)
+                if keys[i] is not None:
+                    new_entries.append(
+                        (keys[i], result, None if err is None else str(err))
+                    )
+            self.put_many(new_entries)
+
+        return outcomes
+
+    def stats(self):
+        return Namespace(hits=self.hits, misses=self.misses)
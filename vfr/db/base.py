@@ -1,21 +1,26 @@
 from __future__ import absolute_import, division, print_function
 
 import types
-import ast
 import inspect
 import logging
 import os.path
 import subprocess
-
-from argparse import Namespace
-
-# "Namespace" is needed in eval()
-assert Namespace
-from numpy import array, Inf, NaN, inf, nan  # these values are used!!
-
-assert Inf or NaN or inf or nan or array or True
+from collections import MutableMapping
 
 from vfr.tests_common import timestamp
+from vfr.db.codec import (
+    RecordDecodeError,
+    RecordEncodeError,
+    compress_record,
+    decode_fields,
+    decode_record,
+    get_codec,
+    get_compressor,
+    is_complete_binary_record,
+    join_chunks,
+    read_chunk_manifest,
+    split_record,
+)
 
 
 def get_version():
@@ -38,9 +43,16 @@ class TestResult:
 
 
 def save_test_result(dbe, fpuset, keyfunc, valfunc):
+    """stores the value returned by valfunc for each FPU in fpuset.
+
+    If valfunc returns a dictionary, it is encoded with the
+    record codec of the database, and compressed if it is large
+    (see compress_for_storage()). Strings are stored as they are.
+    """
     trace = logging.getLogger(__name__).trace
 
-    with dbe.env.begin(write=True, db=dbe.vfdb) as txn:
+    saved = []
+    with dbe.begin(write=True) as txn:
 
         for fpu_id in fpuset:
 
@@ -60,8 +72,192 @@ def save_test_result(dbe, fpuset, keyfunc, valfunc):
             trace("putting %r : %r" % (key1, count))
             trace("putting %r : %r" % (key2, val))
 
+            if isinstance(val, dict):
+                update_status_index(dbe, txn, keybase, count, val)
+                try:
+                    val = dbe.codec.encode(val)
+                except RecordEncodeError as e:
+                    # keep the measurement, in the legacy format
+                    logging.getLogger(__name__).warning(
+                        "%s, storing record %r as repr() string" % (e, key2)
+                    )
+                    val = get_codec("repr").encode(val)
+                val = compress_for_storage(dbe, keybase, val)
+
             txn.put(key1, str(count))
-            txn.put(key2, val)
+            put_record(txn, keybase + ("data", count), val, dbe.chunk_size)
+            saved.append((keybase, count))
+
+    # the transaction was committed (or is part of a batch,
+    # which clears the cache if it is aborted), update the cache
+    for keybase, count in saved:
+        dbe.cache.record_saved(keybase, count)
+
+
+def get_record_compressor(dbe, keybase):
+    """returns the compressor for records stored under keybase, or None."""
+    name = dbe.compression_by_type.get(keybase[1], dbe.compression)
+    if name is None:
+        return None
+    return get_compressor(name)
+
+
+def compress_for_storage(dbe, keybase, val):
+    """compresses an encoded record if it is at least as large as the
+    compression threshold of the database. The compressor is selected
+    by the record type, which is the second element of keybase."""
+    if len(val) < dbe.compression_threshold:
+        return val
+
+    compressor = get_record_compressor(dbe, keybase)
+    if compressor is None:
+        return val
+
+    return compress_record(val, compressor)
+
+
+def chunk_key(datakey, index):
+    return repr(datakey + ("chunk", index))
+
+
+def put_record(txn, datakey, val, chunk_size):
+    """stores an encoded record under the key repr(datakey).
+
+    Values larger than chunk_size are split into chunks which
+    are stored under separate keys, and a small manifest with the
+    number and total length of the chunks is stored under the
+    record key.
+    """
+    if len(val) <= chunk_size:
+        txn.put(repr(datakey), val)
+        return
+
+    manifest, chunks = split_record(val, chunk_size)
+    for index, chunk in enumerate(chunks):
+        txn.put(chunk_key(datakey, index), chunk)
+
+    txn.put(repr(datakey), manifest)
+
+
+def get_record(txn, datakey):
+    """returns the encoded record stored under the key repr(datakey),
+    reassembling it if it was stored in chunks."""
+    val = txn.get(repr(datakey))
+    if val is None:
+        return None
+
+    manifest = read_chunk_manifest(val)
+    if manifest is None:
+        return val
+
+    num_chunks, total_length = manifest
+    chunks = (txn.get(chunk_key(datakey, index)) for index in range(num_chunks))
+    try:
+        return join_chunks(chunks, total_length)
+    except RecordDecodeError as e:
+        logging.getLogger(__name__).error(
+            "could not reassemble record %r: %s" % (repr(datakey), e)
+        )
+        # returned value will fail to decode
+        return val
+
+
+# fields of the latest record of each type which are copied
+# into the status index of the serial number
+STATUS_INDEX_FIELDS = ("result", "time", "algorithm_version")
+
+
+def status_index_key(serialnumber):
+    return str((serialnumber, "status-index"))
+
+
+def update_status_index(dbe, txn, keybase, count, record):
+    """updates the status index entry of the record type in keybase,
+    within the write transaction of the new record.
+
+    The status index of a serial number is a small dictionary which
+    maps each record type (the keybase without the serial number)
+    to the count and the STATUS_INDEX_FIELDS of its latest record.
+    It allows to check whether a test was passed without decoding
+    the test record.
+    """
+    serialnumber = keybase[0]
+    index_key = status_index_key(serialnumber)
+
+    raw_index = txn.get(index_key)
+    index = {}
+    if raw_index is not None:
+        try:
+            index = decode_record(raw_index)
+        except (SyntaxError, RecordDecodeError):
+            # readers check the counts of the entries, so a new
+            # index with only this entry is safe
+            logging.getLogger(__name__).warning(
+                "status index %r is broken, replacing it" % index_key
+            )
+
+    entry = {"count": count}
+    for field in STATUS_INDEX_FIELDS:
+        entry[field] = record.get(field, None)
+
+    index[keybase[1:]] = entry
+    txn.put(index_key, dbe.codec.encode(index))
+
+
+def get_test_status(dbe, fpu_id, keyfunc, txn=None):
+    """returns the status index entry for the latest record of a test,
+    or None if there is no valid index entry.
+
+    The entry is only returned if its count matches the record counter,
+    which is not the case for records written by software versions
+    without status index.
+    """
+    keybase = keyfunc(fpu_id)
+    record_type = keybase[1:]
+
+    def read(txn):
+        return (
+            txn.get(status_index_key(keybase[0])),
+            txn.get(str(keybase + ("ntests",))),
+        )
+
+    if txn is None:
+        with dbe.begin() as txn:
+            raw_index, last_cnt = read(txn)
+    else:
+        raw_index, last_cnt = read(txn)
+
+    if (raw_index is None) or (last_cnt is None):
+        return None
+
+    try:
+        entry = decode_fields(raw_index, [record_type]).get(record_type)
+    except (SyntaxError, RecordDecodeError):
+        return None
+
+    if (entry is None) or (entry["count"] != int(last_cnt)):
+        return None
+
+    return entry
+
+
+def get_passed_p(dbe, fpu_id, keyfunc, get_result, count=None):
+    """returns True if the test record selected by count has a passed result.
+
+    For the latest record, the status index is used, otherwise
+    the record is retrieved with the get_result function.
+    """
+    if count is None:
+        status = get_test_status(dbe, fpu_id, keyfunc)
+        if status is not None:
+            return status["result"] == TestResult.OK
+
+    val = get_result(dbe, fpu_id, count=count)
+
+    if val is None:
+        return False
+
+    return val["result"] == TestResult.OK
 
 
 def identity(x):
@@ -89,76 +285,341 @@ def upgrade_version(record, fieldname="version"):
     return record
 
 
-def get_test_result(
-    dbe, fpu_id, keyfunc, count=None, default_vals={}, upgrade_func=identity
-):
+# version of the record schemas. Databases which were migrated to
+# this version (see vfr.db.migration) contain only records with all
+# default values and upgrades applied, so that reading them does
+# not need the upgrade functions.
+CURRENT_SCHEMA_VERSION = 1
 
-    with dbe.env.begin(write=False, db=dbe.vfdb) as txn:
+SCHEMA_VERSION_KEY = "schema-version"
 
-        keybase = keyfunc(fpu_id)
+# default values and upgrade functions of record types
+RECORD_SCHEMAS = {}
 
-        if (count is None) or (count < 0):
-            key1 = str(keybase + ("ntests",))
 
-            try:
-                rcount = int(txn.get(key1))
-            except TypeError:
-                return None
+def register_record_schema(record_type, default_vals={}, upgrade_func=identity):
+    """registers the default values and upgrade function which
+    convert stored records of record_type to the current schema."""
+    RECORD_SCHEMAS[record_type] = (default_vals, upgrade_func)
 
-            if count is None:
-                # default value: last record
-                count = rcount
-            else:
-                count = rcount - count
-                if count < 0:
-                    return None
 
-        key2 = repr(keybase + ("data", count))
+def get_schema_version(dbe):
+    """returns the schema version of the database, which is zero
+    if the database was never migrated."""
+    with dbe.begin() as txn:
+        val = txn.get(SCHEMA_VERSION_KEY)
+
+    if val is None:
+        return 0
+
+    return int(val)
+
+
+def set_schema_version(dbe, version):
+    with dbe.begin(write=True) as txn:
+        txn.put(SCHEMA_VERSION_KEY, str(version))
+    dbe.schema_version = version
+
+
+def read_raw_record(txn, keybase, count=None):
+    """reads a stored record within the read transaction txn.
+
+    Returns a tuple (key, count, raw_value), or None if the
+    record does not exist.
+    """
 
-        val = txn.get(key2)
+    if (count is None) or (count < 0):
+        key1 = str(keybase + ("ntests",))
 
-    if val is not None:
         try:
-            try:
-                val = ast.literal_eval(val)
-
-            except ValueError:
-                # Resolve Namespace constructors.
-                # We also need to work around the disappointing fact that
-                # literal_eval() does not recognize IEEE754 NaN
-                # symbols.
-                val = eval(val)
-
-        except SyntaxError:
-            # A syntax error is an indication that the record isn't a valid
-            # python literal and the likely cause is that the data was
-            # too large for LMDB, so that only a partial result was returned.
-            #
-            # In this case, log an error and return None.
-            logging.getLogger(__name__).error("" % key2)
-            record_length = len(val)
-            logger = logging.getLogger(__name__)
-            logger.error(
-                "syntax error when trying to retrieve for key = %r, count = %r (record length = %i):"
-                " broken record / record too long, returning None"
-                % (key2, count, record_length)
-            )
+            rcount = int(txn.get(key1))
+        except TypeError:
             return None
 
-        val["record-count"] = count
+        if count is None:
+            # default value: last record
+            count = rcount
+        else:
+            count = rcount - count
+            if count < 0:
+                return None
 
-        trace = logging.getLogger(__name__).trace
-        trace("got %r : %r" % (key2, val))
+    key2 = repr(keybase + ("data", count))
 
+    val = get_record(txn, keybase + ("data", count))
     if val is None:
-        result = None
+        return None
+
+    return key2, count, val
+
+
+def decode_raw_record(key, count, raw):
+    """decodes a raw record and adds the record count.
+    Returns None if the record is broken."""
+    try:
+        val = decode_record(raw)
+
+    except (SyntaxError, RecordDecodeError):
+        # A syntax or decoding error is an indication that the record
+        # is broken and the likely cause is that the data was
+        # too large for LMDB, so that only a partial result was returned.
+        # (This can happen for records which were written before
+        # large records were stored in chunks.)
+        #
+        # In this case, log an error and return None.
+        record_length = len(raw)
+        logger = logging.getLogger(__name__)
+        logger.error(
+            "syntax error when trying to retrieve for key = %r, count = %r (record length = %i):"
+            " broken record / record too long, returning None"
+            % (key, count, record_length)
+        )
+        return None
+
+    val["record-count"] = count
+
+    trace = logging.getLogger(__name__).trace
+    trace("got %r : %r" % (key, val))
+
+    return val
+
+
+def apply_defaults(val, default_vals={}, upgrade_func=identity):
+    """returns a new dictionary with the default values
+    and the upgrade function applied to val."""
+    rval = default_vals.copy()
+    rval.update(val)
+    return upgrade_func(rval)
+
+
+class LazyRecord(MutableMapping):
+    """A record which is decoded when one of its fields is first accessed.
+
+    It behaves like the dictionary returned by get_test_result(). Only
+    binary records which were checked to be complete are wrapped, so
+    that a broken record still yields None when it is retrieved.
+    """
+
+    def __init__(
+        self, keybase, count, raw, default_vals={}, upgrade_func=identity, cache=None
+    ):
+        self._args = (keybase, count, raw, default_vals, upgrade_func, cache)
+        self._record = None
+
+    @property
+    def record(self):
+        if self._record is None:
+            keybase, count, raw, default_vals, upgrade_func, cache = self._args
+            val = decode_raw_record(repr(keybase + ("data", count)), count, raw)
+            if val is None:
+                self._record = {}
+            else:
+                if cache is not None:
+                    cache.put(keybase, count, val, len(raw))
+                self._record = apply_defaults(val, default_vals, upgrade_func)
+            self._args = None
+        return self._record
+
+    def __getitem__(self, key):
+        return self.record[key]
+
+    def __setitem__(self, key, val):
+        self.record[key] = val
+
+    def __delitem__(self, key):
+        del self.record[key]
+
+    def __iter__(self):
+        return iter(self.record)
+
+    def __len__(self):
+        return len(self.record)
+
+    def __contains__(self, key):
+        return key in self.record
+
+    def copy(self):
+        return dict(self.record)
+
+    def __repr__(self):
+        return repr(self.record)
+
+
+def get_test_result(
+    dbe,
+    fpu_id,
+    keyfunc,
+    count=None,
+    default_vals={},
+    upgrade_func=identity,
+    txn=None,
+    lazy=False,
+):
+    """retrieves a test result record.
+
+    If txn is given, the record is read within that read transaction,
+    which allows to retrieve many records from one consistent snapshot.
+    If lazy is True, binary records are returned as LazyRecord
+    instances which are decoded only when they are accessed.
+
+    Decoded records are kept in the record cache of the database
+    (see vfr.db.cache), and returned as new dictionaries which
+    share their values with the cached record.
+    """
+
+    keybase = keyfunc(fpu_id)
+    cache = dbe.cache
+
+    if dbe.schema_version >= CURRENT_SCHEMA_VERSION:
+        # the records were already upgraded by the migration
+        default_vals, upgrade_func = {}, identity
+
+    if count is None:
+        cached_count = cache.get_latest_count(keybase)
+    elif count >= 0:
+        cached_count = count
+    else:
+        cached_count = None
+
+    if cached_count is not None:
+        val = cache.get(keybase, cached_count)
+        if val is not None:
+            return apply_defaults(val, default_vals, upgrade_func)
+
+    if txn is None:
+        with dbe.begin() as txn:
+            entry = read_raw_record(txn, keybase, count=count)
     else:
-        # apply default values and upgrade function
-        rval = default_vals.copy()
-        rval.update(val)
-        result = upgrade_func(rval)
+        entry = read_raw_record(txn, keybase, count=count)
+
+    if entry is None:
+        return None
+
+    key, rcount, raw = entry
+    if count is None:
+        cache.set_latest_count(keybase, rcount)
+
+    if lazy and is_complete_binary_record(raw):
+        return LazyRecord(
+            keybase,
+            rcount,
+            raw,
+            default_vals=default_vals,
+            upgrade_func=upgrade_func,
+            cache=cache,
+        )
+
+    val = decode_raw_record(key, rcount, raw)
+    if val is None:
+        return None
+
+    cache.put(keybase, rcount, val, len(raw))
+
+    return apply_defaults(val, default_vals, upgrade_func)
+
+
+def history_key_prefix(keybase):
+    """returns the common prefix of the data keys of all
+    records with this keybase."""
+    return repr(keybase + ("data",))[:-1] + ", "
+
+
+def iter_test_results(
+    dbe,
+    fpu_id,
+    keyfunc,
+    min_count=None,
+    max_count=None,
+    min_time=None,
+    max_time=None,
+    default_vals={},
+    upgrade_func=identity,
+    lazy=False,
+):
+    """iterates over all stored records of a test, in order of their count.
 
-    return result
+    The data keys are collected with a single LMDB cursor over the key
+    prefix of the test, and the records are read from the same read
+    transaction. The optional count range includes both
+    limits. The time range compares the "time" field of the records,
+    using strings in the format of DB_TIME_FORMAT. For binary
+    records, only the time field is decoded to check it.
+
+    If lazy is True, complete binary records are yielded as
+    LazyRecord instances.
+    """
+    keybase = keyfunc(fpu_id)
+    prefix = history_key_prefix(keybase)
+    cache = dbe.cache
+
+    if dbe.schema_version >= CURRENT_SCHEMA_VERSION:
+        default_vals, upgrade_func = {}, identity
+
+    with dbe.begin() as txn:
+        counts = []
+        cursor = txn.cursor()
+        if cursor.set_range(prefix):
+            for key in cursor.iternext(keys=True, values=False):
+                if not key.startswith(prefix):
+                    break
+                suffix = key[len(prefix) : -1]
+                # skip the keys of record chunks
+                if suffix.isdigit():
+                    counts.append(int(suffix))
+
+        counts.sort()
+        for count in counts:
+            if (min_count is not None) and (count < min_count):
+                continue
+            if (max_count is not None) and (count > max_count):
+                break
+
+            val = cache.get(keybase, count)
+            if val is None:
+                raw = get_record(txn, keybase + ("data", count))
+                if raw is None:
+                    continue
+
+            if (min_time is not None) or (max_time is not None):
+                if val is None:
+                    rtime = get_record_time(raw)
+                else:
+                    rtime = val.get("time", None)
+
+                if (
+                    (rtime is None)
+                    or ((min_time is not None) and (rtime < min_time))
+                    or ((max_time is not None) and (rtime > max_time))
+                ):
+                    continue
+
+            if val is None:
+                if lazy and is_complete_binary_record(raw):
+                    yield LazyRecord(
+                        keybase,
+                        count,
+                        raw,
+                        default_vals=default_vals,
+                        upgrade_func=upgrade_func,
+                        cache=cache,
+                    )
+                    continue
+
+                val = decode_raw_record(repr(keybase + ("data", count)), count, raw)
+                if val is None:
+                    continue
+
+                cache.put(keybase, count, val, len(raw))
+
+            yield apply_defaults(val, default_vals, upgrade_func)
+
+
+def get_record_time(raw):
+    """returns the time field of an encoded record, or None."""
+    try:
+        return decode_fields(raw, ["time"]).get("time", None)
+    except (SyntaxError, RecordDecodeError):
+        return None
 
 
 def save_named_record(
@@ -168,10 +629,7 @@ def save_named_record(
     log = logging.getLogger(__name__).trace
 
     # define two closures - one for the unique key, another for the stored value
-    def keyfunc(fpu_id):
-        serialnumber = dbe.fpu_config[fpu_id]["serialnumber"]
-        keybase = (serialnumber,) + record_type
-        return keybase
+    keyfunc = named_keyfunc(record_type, dbe)
 
     def valfunc(fpu_id):
 
@@ -179,13 +637,32 @@ def save_named_record(
         val.update({"git_version": GIT_VERSION, "time": timestamp()})
         if include_fpu_id:
             val.update({"fpu_id": fpu_id})
-        return repr(val)
+        return val
 
     log(loglevel, "saving {!r} = {!r}".format(record_type, record))
 
     save_test_result(dbe, [fpu_id], keyfunc, valfunc)
 
 
+def named_keyfunc(record_type, dbe):
+    """returns the key function for records of record_type."""
+
+    def keyfunc(fpu_id):
+        serialnumber = dbe.fpu_config[fpu_id]["serialnumber"]
+        keybase = (serialnumber,) + record_type
+        return keybase
+
+    return keyfunc
+
+
+def get_named_passed_p(record_type, get_result, dbe, fpu_id, count=None):
+    """returns True if the selected record of record_type
+    has a passed result."""
+    return get_passed_p(
+        dbe, fpu_id, named_keyfunc(record_type, dbe), get_result, count=count
+    )
+
+
 def get_named_record(
     record_type,
     dbe,
@@ -194,13 +671,11 @@ def get_named_record(
     loglevel=logging.DEBUG - 5,
     default_vals={},
     upgrade_func=identity,
+    txn=None,
+    lazy=False,
 ):
 
-    # define two closures - one for the unique key, another for the stored value
-    def keyfunc(fpu_id):
-        serialnumber = dbe.fpu_config[fpu_id]["serialnumber"]
-        keybase = (serialnumber,) + record_type
-        return keybase
+    keyfunc = named_keyfunc(record_type, dbe)
 
     rval = get_test_result(
         dbe,
@@ -209,9 +684,40 @@ def get_named_record(
         count=count,
         default_vals=default_vals,
         upgrade_func=upgrade_func,
+        txn=txn,
+        lazy=lazy,
     )
 
     logger = logging.getLogger(__name__)
     logger.log(loglevel, "getting " + str(record_type))
 
     return rval
+
+
+def iter_named_records(
+    record_type,
+    dbe,
+    fpu_id,
+    min_count=None,
+    max_count=None,
+    min_time=None,
+    max_time=None,
+    default_vals={},
+    upgrade_func=identity,
+    lazy=False,
+):
+    """iterates over all stored records of record_type for an FPU,
+    see iter_test_results()."""
+
+    return iter_test_results(
+        dbe,
+        fpu_id,
+        named_keyfunc(record_type, dbe),
+        min_count=min_count,
+        max_count=max_count,
+        min_time=min_time,
+        max_time=max_time,
+        default_vals=default_vals,
+        upgrade_func=upgrade_func,
+        lazy=lazy,
+    )
@@ -0,0 +1,89 @@
+from __future__ import absolute_import, division, print_function
+
+from argparse import Namespace
+from collections import OrderedDict
+
+
+class RecordCache:
+    """Bounded LRU cache of decoded verification records.
+
+    Entries are keyed by (keybase, count), where keybase is the
+    serial number followed by the record type. Because stored records
+    are never changed, an entry stays valid until it is evicted. The
+    size of an entry is accounted as the length of its encoded value,
+    and least recently used entries are evicted when the total
+    exceeds max_bytes.
+
+    The cache also remembers the latest count of each keybase, so
+    that retrieving the latest record of a test does not need to
+    read the record counter from the database. save_test_result()
+    updates it with record_saved().
+
+    The cached records are shared between all callers, so they need
+    to treat them as read-only, except for replacing top-level values
+    in the copies returned by get_test_result().
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.latest_counts = {}
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, keybase, count):
+        key = (keybase, count)
+        try:
+            record, size = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+
+        # re-insert as most recently used entry
+        self.entries[key] = (record, size)
+        self.hits += 1
+        return record
+
+    def put(self, keybase, count, record, size):
+        if size > self.max_bytes:
+            return
+
+        key = (keybase, count)
+        if key in self.entries:
+            self.size_bytes -= self.entries.pop(key)[1]
+
+        self.entries[key] = (record, size)
+        self.size_bytes += size
+
+        while self.size_bytes > self.max_bytes:
+            _, (_, old_size) = self.entries.popitem(last=False)
+            self.size_bytes -= old_size
+
+    def get_latest_count(self, keybase):
+        return self.latest_counts.get(keybase, None)
+
+    def set_latest_count(self, keybase, count):
+        self.latest_counts[keybase] = count
+
+    def record_saved(self, keybase, count):
+        """updates the cache after a new record was committed."""
+        key = (keybase, count)
+        if key in self.entries:
+            self.size_bytes -= self.entries.pop(key)[1]
+
+        self.latest_counts[keybase] = count
+
+    def clear(self):
+        self.entries.clear()
+        self.latest_counts.clear()
+        self.size_bytes = 0
+
+    def stats(self):
+        return Namespace(
+            hits=self.hits,
+            misses=self.misses,
+            entries=len(self.entries),
+            size_bytes=self.size_bytes,
+            max_bytes=self.max_bytes,
+        )
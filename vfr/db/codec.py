@@ -0,0 +1,673 @@
+"""Encoding and decoding of verification database records.
+
+Originally, every record was stored as the repr() string of a Python
+dictionary, and parsed back with ast.literal_eval() or, when NaN or
+Namespace values are present, with eval(). This is slow for large
+records like the positional repeatability results, which contain
+thousands of float tuples.
+
+This module defines a small set of pluggable record codecs. New
+records are stored in a compact, tagged binary format which is
+prefixed by a header with a magic number, a format version, and
+the identifier of the codec which wrote it. Records which do not
+start with that magic number are legacy repr() records and are
+decoded as before, so that old databases remain readable without
+any conversion.
+
+The binary format supports None, bools, integers, floats, byte
+strings, unicode strings, tuples, lists, dictionaries,
+argparse.Namespace objects, and numpy arrays, which are stored as
+raw buffers together with their dtype and shape. Containers carry
+their payload length, so that single fields of a record can be
+extracted without decoding the rest (see decode_fields()).
+
+Large records are stored in chunks under separate keys. In this
+case, the record key holds a manifest, which is a header with the
+FLAG_CHUNKED flag set, followed by the number of chunks and the
+total record length.
+
+Large records can also be compressed. A compressed record is a header
+with the FLAG_COMPRESSED flag set and the codec id of the original
+record, followed by the compressor id, the compressed and the
+uncompressed length, and the compressed bytes of the original record
+(including its header). zlib is always available, lz4 only if the
+lz4 package is installed.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import ast
+import struct
+import sys
+import zlib
+from argparse import Namespace
+
+import numpy as np
+
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+
+if sys.version_info[0] < 3:
+    text_type = unicode  # noqa: F821 pylint: disable=undefined-variable
+    integer_types = (int, long)  # noqa: F821 pylint: disable=undefined-variable
+else:
+    text_type = str
+    integer_types = (int,)
+
+
+class RecordDecodeError(Exception):
+    pass
+
+
+class RecordEncodeError(Exception):
+    pass
+
+
+# header of binary records: magic number, format version, codec id, flags
+HEADER_MAGIC = b"\x93VFR"
+HEADER_FORMAT = "<4sBBB"
+HEADER_LENGTH = struct.calcsize(HEADER_FORMAT)
+
+# version of the binary record layout (each incompatible change of the
+# tag encoding must yield a version number increase)
+FORMAT_VERSION = 1
+
+CODEC_ID_REPR = 0
+CODEC_ID_BINARY = 1
+
+# header flags
+FLAG_CHUNKED = 0x01  # value is a manifest of a record stored in chunks
+FLAG_COMPRESSED = 0x02  # value is a compressed record
+
+# payload of compressed records: compressor id, compressed
+# and uncompressed length
+COMPRESSED_FORMAT = "<BQQ"
+COMPRESSED_HEADER_LENGTH = HEADER_LENGTH + struct.calcsize(COMPRESSED_FORMAT)
+
+# payload of chunk manifests: number of chunks, total record length
+MANIFEST_FORMAT = "<IQ"
+
+# type tags of the binary encoding
+TAG_NONE = b"N"
+TAG_TRUE = b"T"
+TAG_FALSE = b"F"
+TAG_INT = b"i"
+TAG_BIGINT = b"I"
+TAG_FLOAT = b"d"
+TAG_BYTES = b"s"
+TAG_TEXT = b"u"
+TAG_TUPLE = b"t"
+TAG_LIST = b"l"
+TAG_FLOAT_TUPLE = b"f"
+TAG_FLOAT_LIST = b"g"
+TAG_DICT = b"D"
+TAG_NAMESPACE = b"n"
+TAG_NDARRAY = b"a"
+
+# tags which are followed by a fixed-size payload
+FIXED_SIZE = {TAG_NONE: 0, TAG_TRUE: 0, TAG_FALSE: 0, TAG_INT: 8, TAG_FLOAT: 8}
+
+INT64_MIN = -(2**63)
+INT64_MAX = 2**63 - 1
+
+_pack_len = struct.Struct("<I").pack
+_pack_int = struct.Struct("<q").pack
+_pack_float = struct.Struct("<d").pack
+_pack_len_count = struct.Struct("<II").pack
+
+_unpack_len = struct.Struct("<I").unpack_from
+_unpack_int = struct.Struct("<q").unpack_from
+_unpack_float = struct.Struct("<d").unpack_from
+_unpack_len_count = struct.Struct("<II").unpack_from
+
+
+def _encode_sequence(seq, out, tag, float_tag):
+    if seq and all(isinstance(x, float) for x in seq):
+        payload = struct.pack("<%id" % len(seq), *seq)
+        out.append(float_tag)
+        out.append(_pack_len(len(payload)))
+        out.append(payload)
+        return
+
+    parts = []
+    for item in seq:
+        _encode(item, parts)
+    payload = b"".join(parts)
+    out.append(tag)
+    out.append(_pack_len_count(len(payload) + 4, len(seq)))
+    out.append(payload)
+
+
+def _encode_mapping(mapping, out, tag):
+    parts = []
+    for key, val in mapping.items():
+        _encode(key, parts)
+        _encode(val, parts)
+    payload = b"".join(parts)
+    out.append(tag)
+    out.append(_pack_len_count(len(payload) + 4, len(mapping)))
+    out.append(payload)
+
+
+def _encode_ndarray(arr, out):
+    if arr.dtype.hasobject:
+        # object arrays have no raw buffer representation
+        _encode_sequence(arr.tolist(), out, TAG_LIST, TAG_FLOAT_LIST)
+        return
+
+    # np.ascontiguousarray() would turn 0-d arrays into 1-d arrays
+    arr = np.require(arr, requirements="C")
+    dtype = arr.dtype.str.encode("ascii")
+    shape = struct.pack("<%iq" % arr.ndim, *arr.shape)
+    data = arr.tobytes()
+    payload_len = 1 + len(dtype) + 1 + len(shape) + len(data)
+    out.append(TAG_NDARRAY)
+    out.append(_pack_len(payload_len))
+    out.append(struct.pack("<B", len(dtype)))
+    out.append(dtype)
+    out.append(struct.pack("<B", arr.ndim))
+    out.append(shape)
+    out.append(data)
+
+
+def _encode(val, out):
+    # the most frequent types are checked first
+    vtype = type(val)
+    if vtype is float:
+        out.append(TAG_FLOAT)
+        out.append(_pack_float(val))
+    elif vtype is tuple:
+        _encode_sequence(val, out, TAG_TUPLE, TAG_FLOAT_TUPLE)
+    elif val is None:
+        out.append(TAG_NONE)
+    elif vtype is bool:
+        out.append(TAG_TRUE if val else TAG_FALSE)
+    elif isinstance(val, integer_types):
+        if INT64_MIN <= val <= INT64_MAX:
+            out.append(TAG_INT)
+            out.append(_pack_int(val))
+        else:
+            digits = str(val).encode("ascii")
+            out.append(TAG_BIGINT)
+            out.append(_pack_len(len(digits)))
+            out.append(digits)
+    elif isinstance(val, bytes):
+        out.append(TAG_BYTES)
+        out.append(_pack_len(len(val)))
+        out.append(val)
+    elif isinstance(val, text_type):
+        data = val.encode("utf-8")
+        out.append(TAG_TEXT)
+        out.append(_pack_len(len(data)))
+        out.append(data)
+    elif isinstance(val, float):
+        out.append(TAG_FLOAT)
+        out.append(_pack_float(val))
+    elif isinstance(val, dict):
+        _encode_mapping(val, out, TAG_DICT)
+    elif isinstance(val, tuple):
+        # named tuples are stored as plain tuples
+        _encode_sequence(tuple(val), out, TAG_TUPLE, TAG_FLOAT_TUPLE)
+    elif isinstance(val, list):
+        _encode_sequence(val, out, TAG_LIST, TAG_FLOAT_LIST)
+    elif isinstance(val, Namespace):
+        _encode_mapping(vars(val), out, TAG_NAMESPACE)
+    elif isinstance(val, np.ndarray):
+        _encode_ndarray(val, out)
+    elif isinstance(val, np.generic):
+        # numpy scalars, like float64 values returned by np.mean()
+        _encode(val.item(), out)
+    else:
+        raise RecordEncodeError(
+            "value %r of type %s cannot be stored in a binary record"
+            % (val, vtype.__name__)
+        )
+
+
+def _decode(buf, pos):
+    """decodes the value at position pos, and returns
+    the value and the position of the next value."""
+    tag = buf[pos : pos + 1]
+    pos += 1
+
+    if tag == TAG_FLOAT:
+        return _unpack_float(buf, pos)[0], pos + 8
+    elif tag == TAG_FLOAT_TUPLE or tag == TAG_FLOAT_LIST:
+        (length,) = _unpack_len(buf, pos)
+        pos += 4
+        vals = struct.unpack_from("<%id" % (length // 8), buf, pos)
+        if tag == TAG_FLOAT_LIST:
+            vals = list(vals)
+        return vals, pos + length
+    elif tag == TAG_TUPLE or tag == TAG_LIST:
+        length, count = _unpack_len_count(buf, pos)
+        pos += 8
+        items = []
+        for _ in range(count):
+            item, pos = _decode(buf, pos)
+            items.append(item)
+        if tag == TAG_TUPLE:
+            items = tuple(items)
+        return items, pos
+    elif tag == TAG_DICT or tag == TAG_NAMESPACE:
+        length, count = _unpack_len_count(buf, pos)
+        pos += 8
+        mapping = {}
+        for _ in range(count):
+            key, pos = _decode(buf, pos)
+            val, pos = _decode(buf, pos)
+            mapping[key] = val
+        if tag == TAG_NAMESPACE:
+            return Namespace(**mapping), pos
+        return mapping, pos
+    elif tag == TAG_INT:
+        return _unpack_int(buf, pos)[0], pos + 8
+    elif tag == TAG_NONE:
+        return None, pos
+    elif tag == TAG_TRUE:
+        return True, pos
+    elif tag == TAG_FALSE:
+        return False, pos
+    elif tag == TAG_BYTES or tag == TAG_TEXT or tag == TAG_BIGINT:
+        (length,) = _unpack_len(buf, pos)
+        pos += 4
+        data = buf[pos : pos + length]
+        if len(data) != length:
+            raise RecordDecodeError("truncated string at position %i" % pos)
+        if tag == TAG_TEXT:
+            data = data.decode("utf-8")
+        elif tag == TAG_BIGINT:
+            data = int(data)
+        return data, pos + length
+    elif tag == TAG_NDARRAY:
+        (length,) = _unpack_len(buf, pos)
+        end = pos + 4 + length
+        pos += 4
+        (dtlen,) = struct.unpack_from("<B", buf, pos)
+        pos += 1
+        dtype = np.dtype(buf[pos : pos + dtlen].decode("ascii"))
+        pos += dtlen
+        (ndim,) = struct.unpack_from("<B", buf, pos)
+        pos += 1
+        shape = struct.unpack_from("<%iq" % ndim, buf, pos)
+        pos += 8 * ndim
+        count = int(np.prod(shape)) if ndim else 1
+        # copy, so that the returned array is writeable and
+        # does not reference the database buffer
+        arr = np.frombuffer(buf, dtype=dtype, count=count, offset=pos)
+        return arr.reshape(shape).copy(), end
+    else:
+        raise RecordDecodeError("invalid type tag %r at position %i" % (tag, pos - 1))
+
+
+def _skip(buf, pos):
+    """returns the position of the value which follows the one at pos,
+    without decoding it."""
+    tag = buf[pos : pos + 1]
+    try:
+        return pos + 1 + FIXED_SIZE[tag]
+    except KeyError:
+        (length,) = _unpack_len(buf, pos + 1)
+        return pos + 5 + length
+
+
+class ReprCodec(object):
+    """Legacy codec which stores the repr() string of a record.
+
+    Records written by it carry no header, which is why it is
+    also the fallback for any record without the binary magic number.
+    """
+
+    codec_id = CODEC_ID_REPR
+    name = "repr"
+
+    # names which may appear in repr() strings of records
+    eval_namespace = {
+        "__builtins__": {},
+        "Namespace": Namespace,
+        "array": np.array,
+        "Inf": np.Inf,
+        "NaN": np.NaN,
+        "inf": np.inf,
+        "nan": np.nan,
+        "True": True,
+        "False": False,
+        "None": None,
+    }
+
+    def encode(self, record):
+        return repr(record)
+
+    def decode(self, raw):
+        try:
+            return ast.literal_eval(raw)
+        except ValueError:
+            # Resolve Namespace constructors.
+            # We also need to work around the disappointing fact that
+            # literal_eval() does not recognize IEEE754 NaN
+            # symbols.
+            return eval(raw, dict(self.eval_namespace))
+
+    def decode_fields(self, raw, fields):
+        record = self.decode(raw)
+        return {k: record[k] for k in fields if k in record}
+
+
+class BinaryCodec(object):
+    """Codec which stores records in the tagged binary format."""
+
+    codec_id = CODEC_ID_BINARY
+    name = "binary"
+
+    def encode(self, record):
+        out = [
+            struct.pack(HEADER_FORMAT, HEADER_MAGIC, FORMAT_VERSION, self.codec_id, 0)
+        ]
+        _encode(record, out)
+        return b"".join(out)
+
+    def decode(self, raw):
+        try:
+            val, _ = _decode(raw, HEADER_LENGTH)
+        except (struct.error, ValueError, TypeError) as err:
+            raise RecordDecodeError("broken binary record: %s" % err)
+        return val
+
+    def decode_fields(self, raw, fields):
+        """decodes only the given top-level fields of a dictionary record."""
+        buf = raw
+        if buf[HEADER_LENGTH : HEADER_LENGTH + 1] != TAG_DICT:
+            raise RecordDecodeError("record is not a dictionary")
+
+        wanted = set(fields)
+        result = {}
+        try:
+            _, count = _unpack_len_count(buf, HEADER_LENGTH + 1)
+            pos = HEADER_LENGTH + 9
+            for _ in range(count):
+                key, pos = _decode(buf, pos)
+                if key in wanted:
+                    result[key], pos = _decode(buf, pos)
+                    if len(result) == len(wanted):
+                        break
+                else:
+                    pos = _skip(buf, pos)
+        except (struct.error, ValueError, TypeError) as err:
+            raise RecordDecodeError("broken binary record: %s" % err)
+
+        return result
+
+    def is_complete(self, raw):
+        """checks cheaply, without decoding, that the stored
+        length of the record matches the length of raw."""
+        try:
+            return _skip(raw, HEADER_LENGTH) == len(raw)
+        except struct.error:
+            return False
+
+
+CODECS = {}
+
+
+def register_codec(codec):
+    """adds a codec to the set of codecs which can be
+    selected for storing and decoding records."""
+    CODECS[codec.codec_id] = codec
+    CODECS[codec.name] = codec
+
+
+register_codec(ReprCodec())
+register_codec(BinaryCodec())
+
+DEFAULT_CODEC = "binary"
+
+
+def get_codec(name_or_id=DEFAULT_CODEC):
+    try:
+        return CODECS[name_or_id]
+    except KeyError:
+        raise ValueError("unknown record codec %r" % (name_or_id,))
+
+
+def read_header(raw):
+    """returns the tuple (format_version, codec_id, flags) of a
+    record, or None if the record is a legacy record without header."""
+
+    if raw[: len(HEADER_MAGIC)] != HEADER_MAGIC:
+        return None
+
+    _, version, codec_id, flags = struct.unpack_from(HEADER_FORMAT, raw, 0)
+    if version > FORMAT_VERSION:
+        raise RecordDecodeError(
+            "record format version %i is newer than supported version %i"
+            % (version, FORMAT_VERSION)
+        )
+    return version, codec_id, flags
+
+
+def codec_for(raw):
+    header = read_header(raw)
+    if header is None:
+        return CODECS[CODEC_ID_REPR]
+
+    _, codec_id, flags = header
+    if flags & FLAG_CHUNKED:
+        raise RecordDecodeError(
+            "chunked record needs to be reassembled before decoding"
+        )
+    if flags & FLAG_COMPRESSED:
+        raise RecordDecodeError("compressed record needs to be decompressed first")
+    try:
+        return CODECS[codec_id]
+    except KeyError:
+        raise RecordDecodeError("record was written by unknown codec %i" % codec_id)
+
+
+def split_record(raw, chunk_size):
+    """splits an encoded record into chunks of at most chunk_size bytes.
+
+    Returns the manifest which replaces the record value, and the
+    list of chunks.
+    """
+    header = read_header(raw)
+    codec_id = CODEC_ID_REPR if header is None else header[1]
+
+    chunks = [raw[i : i + chunk_size] for i in range(0, len(raw), chunk_size)]
+    manifest = struct.pack(
+        HEADER_FORMAT, HEADER_MAGIC, FORMAT_VERSION, codec_id, FLAG_CHUNKED
+    ) + struct.pack(MANIFEST_FORMAT, len(chunks), len(raw))
+
+    return manifest, chunks
+
+
+def read_chunk_manifest(raw):
+    """returns the tuple (num_chunks, total_length) if raw is a
+    chunk manifest, and None otherwise."""
+    header = read_header(raw)
+    if (header is None) or not (header[2] & FLAG_CHUNKED):
+        return None
+
+    return struct.unpack_from(MANIFEST_FORMAT, raw, HEADER_LENGTH)
+
+
+def join_chunks(chunks, total_length):
+    """reassembles a record from an iterable of chunks."""
+    buf = bytearray(total_length)
+    pos = 0
+    for chunk in chunks:
+        if chunk is None:
+            raise RecordDecodeError("missing chunk at position %i" % pos)
+        buf[pos : pos + len(chunk)] = chunk
+        pos += len(chunk)
+
+    if pos != total_length:
+        raise RecordDecodeError(
+            "chunked record has length %i, expected %i" % (pos, total_length)
+        )
+
+    return bytes(buf)
+
+
+class ZlibCompressor(object):
+    compressor_id = 1
+    name = "zlib"
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class LZ4Compressor(object):
+    compressor_id = 2
+    name = "lz4"
+
+    def compress(self, data):
+        return lz4frame.compress(data)
+
+    def decompress(self, data):
+        return lz4frame.decompress(data)
+
+
+COMPRESSORS = {}
+
+
+def register_compressor(compressor):
+    """adds a compressor to the set of compressors which can be
+    selected for storing records."""
+    COMPRESSORS[compressor.compressor_id] = compressor
+    COMPRESSORS[compressor.name] = compressor
+
+
+register_compressor(ZlibCompressor())
+if lz4frame is not None:
+    register_compressor(LZ4Compressor())
+
+
+def get_compressor(name_or_id):
+    try:
+        return COMPRESSORS[name_or_id]
+    except KeyError:
+        raise ValueError("unknown or unavailable compressor %r" % (name_or_id,))
+
+
+def compress_record(raw, compressor):
+    """compresses an encoded record.
+
+    The record is returned unchanged if compression does not make it
+    smaller, or if it is already compressed.
+    """
+    header = read_header(raw)
+    if header is None:
+        codec_id = CODEC_ID_REPR
+    else:
+        _, codec_id, flags = header
+        if flags & (FLAG_CHUNKED | FLAG_COMPRESSED):
+            return raw
+
+    payload = compressor.compress(raw)
+    if len(payload) + COMPRESSED_HEADER_LENGTH >= len(raw):
+        return raw
+
+    return (
+        struct.pack(
+            HEADER_FORMAT, HEADER_MAGIC, FORMAT_VERSION, codec_id, FLAG_COMPRESSED
+        )
+        + struct.pack(
+            COMPRESSED_FORMAT, compressor.compressor_id, len(payload), len(raw)
+        )
+        + payload
+    )
+
+
+def read_compressed_header(raw):
+    """returns the tuple (compressor_id, compressed_length,
+    uncompressed_length) if raw is a compressed record, and None
+    otherwise."""
+    header = read_header(raw)
+    if (header is None) or not (header[2] & FLAG_COMPRESSED):
+        return None
+
+    try:
+        return struct.unpack_from(COMPRESSED_FORMAT, raw, HEADER_LENGTH)
+    except struct.error:
+        raise RecordDecodeError("truncated header of compressed record")
+
+
+def decompress_record(raw):
+    """returns the original encoded record if raw is a compressed
+    record, and raw otherwise."""
+    compressed = read_compressed_header(raw)
+    if compressed is None:
+        return raw
+
+    compressor_id, compressed_length, length = compressed
+    try:
+        compressor = COMPRESSORS[compressor_id]
+    except KeyError:
+        raise RecordDecodeError(
+            "record was compressed by unknown or unavailable compressor %i"
+            % compressor_id
+        )
+
+    payload = raw[COMPRESSED_HEADER_LENGTH:]
+    if len(payload) != compressed_length:
+        raise RecordDecodeError(
+            "compressed record has length %i, expected %i"
+            % (len(payload), compressed_length)
+        )
+    try:
+        val = compressor.decompress(payload)
+    except Exception as err:
+        raise RecordDecodeError("broken compressed record: %s" % err)
+
+    if len(val) != length:
+        raise RecordDecodeError(
+            "decompressed record has length %i, expected %i" % (len(val), length)
+        )
+    return val
+
+
+def encode_record(record, codec=DEFAULT_CODEC):
+    return get_codec(codec).encode(record)
+
+
+def decode_record(raw):
+    """decodes a stored record, selecting the codec from the record header."""
+    raw = decompress_record(raw)
+    return codec_for(raw).decode(raw)
+
+
+def decode_fields(raw, fields):
+    """decodes only the passed top-level fields of a stored record."""
+    raw = decompress_record(raw)
+    return codec_for(raw).decode_fields(raw, fields)
+
+
+def is_complete_binary_record(raw):
+    """returns True if raw is a binary record which was not truncated.
+
+    Because legacy repr() records can only be validated by parsing
+    them, False is returned for them. For compressed records, only
+    the compressed length is checked.
+    """
+    try:
+        compressed = read_compressed_header(raw)
+        if compressed is not None:
+            return (read_header(raw)[1] != CODEC_ID_REPR) and (
+                len(raw) == COMPRESSED_HEADER_LENGTH + compressed[1]
+            )
+        codec = codec_for(raw)
+    except RecordDecodeError:
+        return False
+
+    if codec.codec_id == CODEC_ID_REPR:
+        return False
+
+    return codec.is_complete(raw)
@@ -14,7 +14,19 @@ from interval import Interval
 from protectiondb import ProtectionDB
 from vfr.conf import PROTECTION_TOLERANCE, ALPHA_RANGE_MAX, ALPHA_DATUM_OFFSET
 from vfr.tests_common import timestamp
-from vfr.db.base import TestResult, get_test_result, save_test_result
+from vfr.db.base import (
+    get_passed_p,
+    get_test_result,
+    register_record_schema,
+    save_test_result,
+)
+
+# limit records need no upgrade
+register_record_schema(("limit", "alpha_min"))
+register_record_schema(("limit", "alpha_max"))
+register_record_schema(("limit", "beta_min"))
+register_record_schema(("limit", "beta_max"))
+register_record_schema(("beta_collision",))
 
 LimitTestResult = namedtuple(
     "LimitTestResult",
@@ -40,12 +52,12 @@ def save_angular_limit(dbe, which_limit, record):
 
         val = dict(**vars(record))
         val.update({"time": timestamp()})
-        return repr(val)
+        return val
 
     save_test_result(dbe, [fpu_id], keyfunc, valfunc)
 
 
-def get_angular_limit(dbe, fpu_id, which_limit, count=None):
+def get_angular_limit(dbe, fpu_id, which_limit, count=None, txn=None, lazy=False):
 
     serialnumber = dbe.fpu_config[fpu_id]["serialnumber"]
 
@@ -56,16 +68,24 @@ def get_angular_limit(dbe, fpu_id, which_limit, count=None):
             keybase = (serialnumber, "limit", which_limit)
         return keybase
 
-    return get_test_result(dbe, fpu_id, keyfunc, count=count)
+    return get_test_result(dbe, fpu_id, keyfunc, count=count, txn=txn, lazy=lazy)
 
 
 def get_anglimit_passed_p(dbe, fpu_id, which_limit, count=None):
 
-    result = get_angular_limit(dbe, fpu_id, which_limit, count=count)
+    serialnumber = dbe.fpu_config[fpu_id]["serialnumber"]
+
+    def keyfunc(fpu_id):
+        if which_limit == "beta_collision":
+            keybase = (serialnumber, which_limit)
+        else:
+            keybase = (serialnumber, "limit", which_limit)
+        return keybase
+
+    def get_result(dbe, fpu_id, count=None):
+        return get_angular_limit(dbe, fpu_id, which_limit, count=count)
 
-    if result is None:
-        return False
-    return result["result"] == TestResult.OK
+    return get_passed_p(dbe, fpu_id, keyfunc, get_result, count=count)
 
 
 def get_colldect_passed_p(dbe, fpu_id, count=None):
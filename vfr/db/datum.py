@@ -3,10 +3,21 @@ from __future__ import absolute_import, division, print_function
 from vfr.auditlog import get_fpuLogger
 from FpuGridDriver import CAN_PROTOCOL_VERSION, DASEL_ALPHA, DASEL_BETA, DASEL_BOTH
 from vfr.tests_common import timestamp
-from vfr.db.base import TestResult, get_test_result, save_test_result
+from vfr.db.base import (
+    TestResult,
+    get_passed_p,
+    get_test_result,
+    register_record_schema,
+    save_test_result,
+)
 
 RECORD_TYPE = "findDatum"
 
+# datum records are stored for each arm selection, and need no upgrade
+register_record_schema((RECORD_TYPE, str(DASEL_ALPHA)))
+register_record_schema((RECORD_TYPE, str(DASEL_BETA)))
+register_record_schema((RECORD_TYPE, str(DASEL_BOTH)))
+
 
 def save_datum_result(rig, dbe, dasel, rigstate):
 
@@ -43,23 +54,21 @@ def save_datum_result(rig, dbe, dasel, rigstate):
             fsuccess = TestResult.FAILED
 
         fpu = rig.grid_state.FPU[fpu_id]
-        val = repr(
-            {
-                "result": fsuccess,
-                "datumed": (a_ok, b_ok),
-                "fpu_id": fpu_id,
-                "counter_deviation": (fpu.alpha_deviation, fpu.alpha_deviation),
-                "result_state": str(fpu.state),
-                "diagnostic": "OK" if fsuccess else rigstate,
-                "time": timestamp(),
-            }
-        )
+        val = {
+            "result": fsuccess,
+            "datumed": (a_ok, b_ok),
+            "fpu_id": fpu_id,
+            "counter_deviation": (fpu.alpha_deviation, fpu.alpha_deviation),
+            "result_state": str(fpu.state),
+            "diagnostic": "OK" if fsuccess else rigstate,
+            "time": timestamp(),
+        }
         return val
 
     save_test_result(dbe, rig.measure_fpuset, keyfunc, valfunc)
 
 
-def get_datum_result(dbe, fpu_id, dasel=DASEL_BOTH, count=None):
+def get_datum_result(dbe, fpu_id, dasel=DASEL_BOTH, count=None, txn=None, lazy=False):
 
     # define two closures - one for the unique key, another for the stored value
     def keyfunc(fpu_id):
@@ -67,16 +76,16 @@ def get_datum_result(dbe, fpu_id, dasel=DASEL_BOTH, count=None):
         keybase = (serialnumber, RECORD_TYPE, str(dasel))
         return keybase
 
-    return get_test_result(dbe, fpu_id, keyfunc, count=count)
+    return get_test_result(dbe, fpu_id, keyfunc, count=count, txn=txn, lazy=lazy)
 
 
 def get_datum_passed_p(dbe, fpu_id, count=None):
     """returns True if the latest datum repeatability test for this FPU
     was passed successfully."""
 
-    val = get_datum_result(dbe, fpu_id, count=count)
-
-    if val is None:
-        return False
+    def keyfunc(fpu_id):
+        serialnumber = dbe.fpu_config[fpu_id]["serialnumber"]
+        keybase = (serialnumber, RECORD_TYPE, str(DASEL_BOTH))
+        return keybase
 
-    return val["result"] == TestResult.OK
+    return get_passed_p(dbe, fpu_id, keyfunc, get_datum_result, count=count)
@@ -2,7 +2,13 @@ from __future__ import absolute_import, division, print_function
 
 from collections import namedtuple
 from functools import partial
-from vfr.db.base import save_named_record, get_named_record, upgrade_version
+from vfr.db.base import (
+    save_named_record,
+    get_named_record,
+    iter_named_records,
+    register_record_schema,
+    upgrade_version,
+)
 
 RECORD_TYPE = "metrology-height"
 
@@ -22,12 +28,20 @@ save_metrology_height_images = partial(
     save_named_record, (RECORD_TYPE, "images"), include_fpu_id=True
 )
 
+register_record_schema((RECORD_TYPE, "images"))
+
 get_metrology_height_images = partial(get_named_record, (RECORD_TYPE, "images"))
 
 save_metrology_height_result = partial(save_named_record, (RECORD_TYPE, "result"))
 
 upgrade_func = partial(upgrade_version, fieldname="algorithm_version")
 
+register_record_schema((RECORD_TYPE, "result"), upgrade_func=upgrade_func)
+
 get_metrology_height_result = partial(
     get_named_record, (RECORD_TYPE, "result"), upgrade_func=upgrade_func
 )
+
+iter_metrology_height_results = partial(
+    iter_named_records, (RECORD_TYPE, "result"), upgrade_func=upgrade_func
+)
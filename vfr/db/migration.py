@@ -0,0 +1,211 @@
+from __future__ import absolute_import, division, print_function
+
+import logging
+from argparse import Namespace
+from ast import literal_eval
+
+from vfr.conf import DB_MIGRATION_BATCH_SIZE
+from vfr.db.base import (
+    CURRENT_SCHEMA_VERSION,
+    RECORD_SCHEMAS,
+    chunk_key,
+    compress_for_storage,
+    get_record,
+    get_record_compressor,
+    put_record,
+    set_schema_version,
+    update_status_index,
+)
+from vfr.db.codec import (
+    CODEC_ID_REPR,
+    RecordDecodeError,
+    RecordEncodeError,
+    decode_record,
+    get_codec,
+    read_chunk_manifest,
+    read_compressed_header,
+    read_header,
+)
+
+# the record modules register the schemas of all stored record types
+from vfr.db import (  # noqa: F401
+    colldect_limits,
+    datum,
+    datum_repeatability,
+    metrology_calibration,
+    metrology_height,
+    positional_repeatability,
+    positional_verification,
+    pupil_alignment,
+)
+
+
+class UnknownRecordTypeError(Exception):
+    pass
+
+
+def list_records(dbe):
+    """returns the sorted list of (keybase, count) tuples of all stored
+    records, and a dictionary with the latest count of each keybase."""
+
+    records = []
+    latest_counts = {}
+    with dbe.begin() as txn:
+        for key in txn.cursor().iternext(keys=True, values=False):
+            if not (key.startswith("(") and key.endswith(")")):
+                continue
+            try:
+                tkey = literal_eval(key)
+            except (ValueError, SyntaxError):
+                continue
+
+            if (len(tkey) >= 3) and (tkey[-1] == "ntests"):
+                latest_counts[tkey[:-1]] = int(txn.get(key))
+
+            # this skips chunk keys and the status index
+            elif (
+                (len(tkey) >= 4) and (tkey[-2] == "data") and isinstance(tkey[-1], int)
+            ):
+                records.append((tkey[:-2], tkey[-1]))
+
+    records.sort()
+    return records, latest_counts
+
+
+def upgrade_record(record_type, record):
+    """returns the record with the default values and upgrade function of
+    its type applied, and whether this changed anything."""
+
+    try:
+        default_vals, upgrade_func = RECORD_SCHEMAS[record_type]
+    except KeyError:
+        raise UnknownRecordTypeError("record type %r is not known" % (record_type,))
+    new_record = default_vals.copy()
+    new_record.update(record)
+    new_record = upgrade_func(new_record)
+
+    # the upgrade functions replace the values which they change
+    changed = (set(new_record) != set(record)) or any(
+        new_record[k] is not record[k] for k in record
+    )
+
+    return new_record, changed
+
+
+def migrate_database(dbe, dry_run=False, batch_size=DB_MIGRATION_BATCH_SIZE):
+    """Converts all records of the verification database to the current schema.
+
+    Records are upgraded with the default values and upgrade functions of
+    their record type, and re-encoded with the record codec of the database
+    if they were stored in another format. If a record type has no
+    registered schema, UnknownRecordTypeError is raised before anything
+    is changed. Large uncompressed records are
+    compressed according to the compression settings of the database.
+    Records are rewritten in transactions of at most batch_size records.
+    The status index is rebuilt from the latest records. Finally, the database schema version is set,
+    so that the upgrade functions are skipped when reading records.
+
+    If dry_run is True, the database is not changed, and only the
+    number of records which would be changed is reported.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    records, latest_counts = list_records(dbe)
+
+    # records of unknown types could not be upgraded when they are read
+    # after the schema version is set, so nothing is migrated then
+    unknown_types = sorted(
+        set(keybase[1:] for keybase, _ in records) - set(RECORD_SCHEMAS)
+    )
+    if unknown_types:
+        raise UnknownRecordTypeError(
+            "database contains records of unknown types %s, not migrating"
+            % ", ".join(repr(t) for t in unknown_types)
+        )
+    stats = Namespace(
+        records=len(records), upgraded=0, reencoded=0, compressed=0, broken=0
+    )
+
+    logger.info(
+        "migrating %i records to schema version %i%s"
+        % (len(records), CURRENT_SCHEMA_VERSION, " (dry run)" if dry_run else "")
+    )
+
+    for start in range(0, len(records), batch_size):
+        with dbe.env.begin(write=not dry_run, db=dbe.vfdb) as txn:
+            for keybase, count in records[start : start + batch_size]:
+                datakey = keybase + ("data", count)
+                raw = get_record(txn, datakey)
+                try:
+                    record = decode_record(raw)
+                except (SyntaxError, TypeError, ValueError, RecordDecodeError):
+                    logger.warning("record %r is broken, skipping it" % (datakey,))
+                    stats.broken += 1
+                    continue
+
+                new_record, upgraded = upgrade_record(keybase[1:], record)
+
+                header = read_header(raw)
+                codec_id = CODEC_ID_REPR if header is None else header[1]
+                reencoded = codec_id != dbe.codec.codec_id
+                compressed = (
+                    (read_compressed_header(raw) is None)
+                    and (len(raw) >= dbe.compression_threshold)
+                    and (get_record_compressor(dbe, keybase) is not None)
+                )
+
+                stats.upgraded += upgraded
+                stats.reencoded += reencoded
+                stats.compressed += compressed
+
+                if dry_run:
+                    continue
+
+                if upgraded or reencoded or compressed:
+                    try:
+                        val = dbe.codec.encode(new_record)
+                    except RecordEncodeError as e:
+                        logger.warning(
+                            "%s, storing record %r as repr() string" % (e, datakey)
+                        )
+                        val = get_codec("repr").encode(new_record)
+                    val = compress_for_storage(dbe, keybase, val)
+
+                    # remove chunks of the old value
+                    manifest = read_chunk_manifest(txn.get(repr(datakey)))
+                    if manifest is not None:
+                        for index in range(manifest[0]):
+                            txn.delete(chunk_key(datakey, index))
+
+                    put_record(txn, datakey, val, dbe.chunk_size)
+
+                if latest_counts.get(keybase, None) == count:
+                    update_status_index(dbe, txn, keybase, count, new_record)
+
+        logger.debug(
+            "migration: processed %i of %i records"
+            % (min(start + batch_size, len(records)), len(records))
+        )
+
+    if not dry_run:
+        set_schema_version(dbe, CURRENT_SCHEMA_VERSION)
+        dbe.cache.clear()
+
+    logger.info(
+        "migration%s: %i records, %i %supgraded, %i %sre-encoded,"
+        " %i %scompressed, %i broken"
+        % (
+            " (dry run)" if dry_run else "",
+            stats.records,
+            stats.upgraded,
+            "would be " if dry_run else "",
+            stats.reencoded,
+            "would be " if dry_run else "",
+            stats.compressed,
+            "would be " if dry_run else "",
+            stats.broken,
+        )
+    )
+
+    return stats
@@ -2,7 +2,14 @@ from __future__ import absolute_import, division, print_function
 
 from collections import namedtuple
 from functools import partial
-from vfr.db.base import TestResult, save_named_record, get_named_record, upgrade_version
+from vfr.db.base import (
+    save_named_record,
+    get_named_record,
+    get_named_passed_p,
+    iter_named_records,
+    register_record_schema,
+    upgrade_version,
+)
 
 RECORD_TYPE = "positional-repeatability"
 
@@ -37,6 +44,8 @@ save_positional_repeatability_images = partial(
     save_named_record, (RECORD_TYPE, "images"), include_fpu_id=True
 )
 
+register_record_schema((RECORD_TYPE, "images"))
+
 get_positional_repeatability_images = partial(get_named_record, (RECORD_TYPE, "images"))
 
 save_positional_repeatability_result = partial(
@@ -54,6 +63,10 @@ def upgrade_func(x):
 
 default_vals = {"gearbox_correction_version": (0, 1, 0)}
 
+register_record_schema(
+    (RECORD_TYPE, "result"), upgrade_func=upgrade_func, default_vals=default_vals
+)
+
 get_positional_repeatability_result = partial(
     get_named_record,
     (RECORD_TYPE, "result"),
@@ -61,14 +74,22 @@ get_positional_repeatability_result = partial(
     default_vals=default_vals,
 )
 
+iter_positional_repeatability_results = partial(
+    iter_named_records,
+    (RECORD_TYPE, "result"),
+    upgrade_func=upgrade_func,
+    default_vals=default_vals,
+)
+
 
 def get_positional_repeatability_passed_p(dbe, fpu_id, count=None):
     """returns True if the latest positional repeatability test for this FPU
     was passed successfully."""
 
-    val = get_positional_repeatability_result(dbe, fpu_id, count=count)
-
-    if val is None:
-        return False
-
-    return val["result"] == TestResult.OK
+    return get_named_passed_p(
+        (RECORD_TYPE, "result"),
+        get_positional_repeatability_result,
+        dbe,
+        fpu_id,
+        count=count,
+    )
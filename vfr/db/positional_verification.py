@@ -2,7 +2,14 @@ from __future__ import absolute_import, division, print_function
 
 from collections import namedtuple
 from functools import partial
-from vfr.db.base import TestResult, save_named_record, get_named_record, upgrade_version
+from vfr.db.base import (
+    save_named_record,
+    get_named_record,
+    get_named_passed_p,
+    iter_named_records,
+    register_record_schema,
+    upgrade_version,
+)
 
 import numpy as np
 
@@ -41,6 +48,8 @@ save_positional_verification_images = partial(
     save_named_record, (RECORD_TYPE, "images"), include_fpu_id=True
 )
 
+register_record_schema((RECORD_TYPE, "images"))
+
 get_positional_verification_images = partial(get_named_record, (RECORD_TYPE, "images"))
 
 save_positional_verification_result = partial(
@@ -56,10 +65,18 @@ DEFAULT_RECORD = {
     "evaluation_version" : (0, 1, 0),
 }
 
+register_record_schema(
+    (RECORD_TYPE, "result"), upgrade_func=upgrade_func, default_vals=DEFAULT_RECORD
+)
+
 get_positional_verification_result = partial(
     get_named_record, (RECORD_TYPE, "result"), upgrade_func=upgrade_func, default_vals=DEFAULT_RECORD,
 )
 
+iter_positional_verification_results = partial(
+    iter_named_records, (RECORD_TYPE, "result"), upgrade_func=upgrade_func, default_vals=DEFAULT_RECORD,
+)
+
 
 def get_positional_verification_passed_p(dbe, fpu_id, count=None):
     """returns True if the latest positional verification test for this
@@ -67,9 +84,10 @@ def get_positional_verification_passed_p(dbe, fpu_id, count=None):
 
     """
 
-    val = get_positional_verification_result(dbe, fpu_id, count=count)
-
-    if val is None:
-        return False
-
-    return val["result"] == TestResult.OK
+    return get_named_passed_p(
+        (RECORD_TYPE, "result"),
+        get_positional_verification_result,
+        dbe,
+        fpu_id,
+        count=count,
+    )
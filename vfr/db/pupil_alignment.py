@@ -2,7 +2,14 @@ from __future__ import absolute_import, division, print_function
 
 from collections import namedtuple
 from functools import partial
-from vfr.db.base import TestResult, save_named_record, get_named_record, upgrade_version
+from vfr.db.base import (
+    save_named_record,
+    get_named_record,
+    get_named_passed_p,
+    iter_named_records,
+    register_record_schema,
+    upgrade_version,
+)
 
 RECORD_TYPE = "pupil-alignment"
 
@@ -27,24 +34,29 @@ save_pupil_alignment_images = partial(
     save_named_record, (RECORD_TYPE, "images"), include_fpu_id=True
 )
 
+register_record_schema((RECORD_TYPE, "images"))
+
 get_pupil_alignment_images = partial(get_named_record, (RECORD_TYPE, "images"))
 
 save_pupil_alignment_result = partial(save_named_record, (RECORD_TYPE, "result"))
 
 upgrade_func = partial(upgrade_version, fieldname="algorithm_version")
 
+register_record_schema((RECORD_TYPE, "result"), upgrade_func=upgrade_func)
+
 get_pupil_alignment_result = partial(
     get_named_record, (RECORD_TYPE, "result"), upgrade_func=upgrade_func
 )
 
+iter_pupil_alignment_results = partial(
+    iter_named_records, (RECORD_TYPE, "result"), upgrade_func=upgrade_func
+)
+
 
 def get_pupil_alignment_passed_p(dbe, fpu_id, count=None):
     """returns True if the latest datum repeatability test for this FPU
     was passed successfully."""
 
-    val = get_pupil_alignment_result(dbe, fpu_id, count=count)
-
-    if val is None:
-        return False
-
-    return val["result"] == TestResult.OK
+    return get_named_passed_p(
+        (RECORD_TYPE, "result"), get_pupil_alignment_result, dbe, fpu_id, count=count
+    )
@@ -31,48 +31,63 @@ from vfr.db.pupil_alignment import (
 )
 
 
-def get_data(dbe, fpu_id):
+def get_data(dbe, fpu_id, txn=None, lazy=False):
+    """retrieves all verification records of an FPU.
+
+    If txn is passed, all records are read within this read
+    transaction. If lazy is True, records are decoded only
+    when they are used.
+    """
     serial_number = dbe.fpu_config[fpu_id]["serialnumber"]
     count = dbe.opts.record_count
+    kw = dict(count=count, txn=txn, lazy=lazy)
 
     data = Namespace(
         serial_number=serial_number,
-        datum_result=get_datum_result(dbe, fpu_id, count=count),
-        alpha_min_result=get_angular_limit(dbe, fpu_id, "alpha_min", count=count),
-        alpha_max_result=get_angular_limit(dbe, fpu_id, "alpha_max", count=count),
-        beta_min_result=get_angular_limit(dbe, fpu_id, "beta_min", count=count),
-        beta_max_result=get_angular_limit(dbe, fpu_id, "beta_max", count=count),
-        beta_collision_result=get_angular_limit(
-            dbe, fpu_id, "beta_collision", count=count
-        ),
-        datum_repeatability_result=get_datum_repeatability_result(
-            dbe, fpu_id, count=count
-        ),
-        datum_repeatability_images=get_datum_repeatability_images(
-            dbe, fpu_id, count=count
-        ),
+        datum_result=get_datum_result(dbe, fpu_id, **kw),
+        alpha_min_result=get_angular_limit(dbe, fpu_id, "alpha_min", **kw),
+        alpha_max_result=get_angular_limit(dbe, fpu_id, "alpha_max", **kw),
+        beta_min_result=get_angular_limit(dbe, fpu_id, "beta_min", **kw),
+        beta_max_result=get_angular_limit(dbe, fpu_id, "beta_max", **kw),
+        beta_collision_result=get_angular_limit(dbe, fpu_id, "beta_collision", **kw),
+        datum_repeatability_result=get_datum_repeatability_result(dbe, fpu_id, **kw),
+        datum_repeatability_images=get_datum_repeatability_images(dbe, fpu_id, **kw),
         metrology_calibration_result=get_metrology_calibration_result(
-            dbe, fpu_id, count=count
+            dbe, fpu_id, **kw
         ),
         metrology_calibration_images=get_metrology_calibration_images(
-            dbe, fpu_id, count=count
+            dbe, fpu_id, **kw
         ),
-        metrology_height_result=get_metrology_height_result(dbe, fpu_id, count=count),
-        metrology_height_images=get_metrology_height_images(dbe, fpu_id, count=count),
+        metrology_height_result=get_metrology_height_result(dbe, fpu_id, **kw),
+        metrology_height_images=get_metrology_height_images(dbe, fpu_id, **kw),
         positional_repeatability_result=get_positional_repeatability_result(
-            dbe, fpu_id, count=count
+            dbe, fpu_id, **kw
         ),
         positional_repeatability_images=get_positional_repeatability_images(
-            dbe, fpu_id, count=count
+            dbe, fpu_id, **kw
         ),
         positional_verification_result=get_positional_verification_result(
-            dbe, fpu_id, count=count
+            dbe, fpu_id, **kw
         ),
         positional_verification_images=get_positional_verification_images(
-            dbe, fpu_id, count=count
+            dbe, fpu_id, **kw
         ),
-        pupil_alignment_result=get_pupil_alignment_result(dbe, fpu_id, count=count),
-        pupil_alignment_images=get_pupil_alignment_images(dbe, fpu_id, count=count),
+        pupil_alignment_result=get_pupil_alignment_result(dbe, fpu_id, **kw),
+        pupil_alignment_images=get_pupil_alignment_images(dbe, fpu_id, **kw),
     )
 
     return data
+
+
+def get_data_bulk(dbe, fpu_ids):
+    """retrieves the verification records of all FPUs in fpu_ids
+    from a single consistent snapshot of the database.
+
+    Returns a list of (fpu_id, data) pairs in the order of fpu_ids. The
+    records are decoded lazily, when their fields are first accessed.
+    """
+
+    with dbe.begin() as txn:
+        return [
+            (fpu_id, get_data(dbe, fpu_id, txn=txn, lazy=True)) for fpu_id in fpu_ids
+        ]
@@ -26,7 +26,7 @@ def add_sns_to_set(dbe, new_serialnumbers):
     """
 
     logger = logging.getLogger(__name__)
-    with dbe.env.begin(write=True, db=dbe.vfdb) as txn:
+    with dbe.begin(write=True) as txn:
         existing_serial_numbers = _get_set(txn, KEY)
 
         new_set = set(new_serialnumbers)
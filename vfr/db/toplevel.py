@@ -1,16 +1,34 @@
 from __future__ import absolute_import, division, print_function
 
+import threading
+from contextlib import contextmanager
+
 from protectiondb import open_database_env
 
+from vfr.conf import (
+    DB_CACHE_SIZE,
+    DB_CHUNK_SIZE,
+    DB_COMPRESSION,
+    DB_COMPRESSION_BY_TYPE,
+    DB_COMPRESSION_THRESHOLD,
+    DB_RECORD_CODEC,
+)
 from vfr.options import load_config_and_sets
+from vfr.db.analysis_cache import AnalysisCache
+from vfr.db.base import get_schema_version
+from vfr.db.cache import RecordCache
+from vfr.db.codec import get_codec, get_compressor
 from vfr.db.snset import get_snset
 
 
 class Database:
-    def __init__(self, eval_fpuset=None, fpu_config=None, opts=None):
+    def __init__(self, eval_fpuset=None, fpu_config=None, opts=None, env=None):
+        """opens the verification database in the LMDB environment which
+        is selected by the FPU_DATABASE environment variable, or in the
+        passed LMDB environment env (which is used by the tests)."""
 
         self.opts = opts
-        self.env = open_database_env(mockup=opts.mockup)
+        self.env = open_database_env(mockup=opts.mockup) if env is None else env
 
         if self.env is None:
             raise ValueError(
@@ -20,6 +38,30 @@ class Database:
 
         self.vfdb = self.env.open_db("verification")
         self.fpudb = self.env.open_db("fpu")
+        # codec used for storing new records (existing records
+        # are decoded according to their header)
+        self.codec = get_codec(getattr(opts, "record_codec", DB_RECORD_CODEC))
+        # records larger than this are stored in chunks
+        self.chunk_size = DB_CHUNK_SIZE
+        # compression of new records, see compress_for_storage()
+        compression = getattr(opts, "record_compression", DB_COMPRESSION)
+        if compression == "none":
+            compression = None
+        elif compression is not None:
+            # fail early if the compressor is not available
+            get_compressor(compression)
+        self.compression = compression
+        self.compression_by_type = DB_COMPRESSION_BY_TYPE
+        self.compression_threshold = DB_COMPRESSION_THRESHOLD
+        # decoded records, see vfr.db.cache
+        self.cache = RecordCache(DB_CACHE_SIZE)
+        # image analysis results, see vfr.db.analysis_cache
+        self.analysis_cache = AnalysisCache(self)
+        # write transaction of the current batch of each thread, if any;
+        # LMDB transactions must not be used by other threads
+        self._batch = threading.local()
+        # if the schema version is current, upgrades on read are skipped
+        self.schema_version = get_schema_version(self)
         self.eval_fpuset = None
         self.fpu_config = None
 
@@ -33,3 +75,59 @@ class Database:
         self.fpu_config = fpu_config
 
         return fpu_config, measure_fpuset, eval_fpuset
+
+    def begin(self, write=False):
+        """returns a transaction context for the verification database.
+
+        Within a batch() of the calling thread, the batch transaction
+        is returned for reading and writing, so that records written
+        in the batch are visible. Other threads get transactions of
+        their own.
+        """
+        if self.batch_txn is not None:
+            return _joined_txn(self.batch_txn)
+
+        return self.env.begin(write=write, db=self.vfdb)
+
+    @property
+    def batch_txn(self):
+        """the write transaction of the batch of the calling thread, or None."""
+        return getattr(self._batch, "txn", None)
+
+    @contextmanager
+    def batch(self):
+        """groups all verification records which are saved within the
+        context into one write transaction.
+
+        The transaction is committed when the context is left, and
+        aborted if an exception is raised, in which case none of the
+        records is stored. Nested batches join the outer batch.
+
+        Within a batch, no other write transaction may be opened on the
+        database environment (for example, to update the protection
+        database), because LMDB allows only one writer at a time. Write
+        transactions of other threads wait until the batch is committed.
+        """
+        if self.batch_txn is not None:
+            yield self.batch_txn
+            return
+
+        txn = self.env.begin(write=True, db=self.vfdb)
+        self._batch.txn = txn
+        try:
+            yield txn
+        except BaseException:
+            self._batch.txn = None
+            txn.abort()
+            # the cache may refer to records which were not committed
+            self.cache.clear()
+            raise
+
+        self._batch.txn = None
+        txn.commit()
+
+
+@contextmanager
+def _joined_txn(txn):
+    # a transaction context which leaves committing to its owner
+    yield txn
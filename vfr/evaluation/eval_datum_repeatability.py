@@ -6,7 +6,11 @@ from __future__ import division, print_function
 
 import argparse
 
-from vfr.evaluation.measures import get_errors, NO_MEASURES
+import numpy as np
+
+from vfr.conf import BLOB_WEIGHT_FACTOR
+from vfr.evaluation.measures import get_weighted_errors, NO_MEASURES
+from Gearbox.gear_correction import get_weighted_coordinates
 
 NO_RESULT = argparse.Namespace(
     datum_only=NO_MEASURES, moved=NO_MEASURES, combined=NO_MEASURES
@@ -28,10 +32,30 @@ def evaluate_datum_repeatability(datumed_coords, moved_coords, pars=None):
 
     """
 
-    all_coords = list(datumed_coords)
-    all_coords.extend(moved_coords)
+    datumed_coords = np.asarray(datumed_coords, dtype=float).reshape(-1, 6)
+    moved_coords = np.asarray(moved_coords, dtype=float).reshape(-1, 6)
+
+    return evaluate_datum_repeatability_array(
+        np.concatenate([datumed_coords, moved_coords]), len(datumed_coords)
+    )
+
+
+def evaluate_datum_repeatability_array(
+    coords, num_datumed, weight_factor=BLOB_WEIGHT_FACTOR
+):
+    """Like evaluate_datum_repeatability(), but takes one (N, 6) array
+    of blob coordinates, in which the first num_datumed rows are the
+    coordinates of the datumed-only FPU, and the remaining rows those
+    of the moved FPU.
+
+    The weighted coordinates are computed once, and the three
+    measures are computed from slices of them.
+    """
+
+    weighted_coordinates = get_weighted_coordinates(coords, weight_factor)
+
     return argparse.Namespace(
-        datum_only=get_errors(datumed_coords),
-        moved=get_errors(moved_coords),
-        combined=get_errors(all_coords),
+        datum_only=get_weighted_errors(weighted_coordinates[:num_datumed]),
+        moved=get_weighted_errors(weighted_coordinates[num_datumed:]),
+        combined=get_weighted_errors(weighted_coordinates),
     )
@@ -116,6 +116,24 @@ def get_errors(coordinate_sequence, centroid=None, weight_factor=BLOB_WEIGHT_FAC
     return get_measures(error_magnitudes)
 
 
+def get_weighted_errors(weighted_coordinates, centroid=None):
+    """computes error measures from an (N, 2) array of weighted
+    coordinates, as returned by get_weighted_coordinates().
+
+    This allows to compute the measures of several subsets of
+    one coordinate array without converting it again.
+    """
+    if len(weighted_coordinates) == 0:
+        return NO_MEASURES
+
+    if centroid is None:
+        centroid = np.mean(weighted_coordinates, axis=0)
+
+    error_magnitudes = np.sqrt(np.sum((weighted_coordinates - centroid) ** 2, axis=1))
+
+    return get_measures(error_magnitudes)
+
+
 def get_grouped_errors(
     coordinate_sequence_list,
     list_of_centroids=None,
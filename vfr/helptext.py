@@ -211,6 +211,12 @@ summary = cleandoc(
     {TASK_REPORT!r:<20}  - report results of all performed tests
     {TASK_DUMP!r:<20}  - dump content of last database entry for
                             each FPU and test
+    {TASK_MIGRATE!r:<20}  - convert all database records to the current
+                            schema and storage format (use "--dry-run"
+                            to only count the records which would change)
+    {TASK_EXPORT!r:<20}  - append new results of all tests to the HDF5
+                            file given by "--export-file", with one
+                            table per test
 
 
 
@@ -0,0 +1,126 @@
+"""File formats of the stored images.
+
+Captured images are stored in the format IMAGE_FORMAT of vfr/conf.py:
+
+  "bmp"  - uncompressed bitmap, as in all earlier versions
+  "png"  - lossless PNG, with zlib level IMAGE_COMPRESSION (0-9)
+  "tiff" - lossless TIFF, LZW compressed if IMAGE_COMPRESSION > 0
+  "npy"  - raw numpy array, which is read memory-mapped
+
+PNG and TIFF keep 16-bit frames at full depth. The path patterns of
+the measurement tasks name ".bmp" files; the extension is replaced by
+the one of the configured format.
+
+Image paths which are recorded in the database are never rewritten.
+If an image was converted to another format (see
+scripts/recompress_images.py), resolve_image_path() finds the file
+under the other extension, so that old records keep working.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import io
+import os
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = {"bmp": ".bmp", "png": ".png", "tiff": ".tiff", "npy": ".npy"}
+
+# TIFF compression schemes of libtiff
+TIFF_COMPRESSION_NONE = 1
+TIFF_COMPRESSION_LZW = 5
+
+
+def check_format(fmt):
+    if fmt not in IMAGE_EXTENSIONS:
+        raise ValueError(
+            "unknown image format %r, must be one of %s"
+            % (fmt, ", ".join(sorted(IMAGE_EXTENSIONS)))
+        )
+
+
+def image_format(ipath):
+    """returns the format of an image path, by its extension."""
+    ext = os.path.splitext(ipath)[1].lower()
+    for fmt, fmt_ext in IMAGE_EXTENSIONS.items():
+        if ext == fmt_ext:
+            return fmt
+    raise ValueError("image path %r has no known image extension" % ipath)
+
+
+def store_path(ipath, fmt):
+    """returns ipath with the extension of format fmt."""
+    check_format(fmt)
+    return os.path.splitext(ipath)[0] + IMAGE_EXTENSIONS[fmt]
+
+
+# formats which store 16-bit images at full depth
+DEEP_FORMATS = ("png", "tiff", "npy")
+
+
+def storable_image(image, fmt):
+    """returns image as it is stored in format fmt. 16-bit frames are
+    reduced to their high byte for 8-bit formats, as load_image()
+    reduces them, because encoding them would saturate every pixel."""
+    check_format(fmt)
+    if (fmt not in DEEP_FORMATS) and (np.asarray(image).dtype == np.uint16):
+        return (np.asarray(image) >> 8).astype(np.uint8)
+    return image
+
+
+def encode_image(image, fmt, compression=0):
+    """returns the file contents of image in format fmt."""
+    image = storable_image(image, fmt)
+    if fmt == "npy":
+        buf = io.BytesIO()
+        np.save(buf, np.ascontiguousarray(image), allow_pickle=False)
+        return buf.getvalue()
+
+    if fmt == "png":
+        params = [cv2.IMWRITE_PNG_COMPRESSION, int(compression)]
+    elif fmt == "tiff":
+        params = [
+            cv2.IMWRITE_TIFF_COMPRESSION,
+            TIFF_COMPRESSION_LZW if compression > 0 else TIFF_COMPRESSION_NONE,
+        ]
+    else:
+        params = []
+
+    # pylint: disable=no-member
+    ok, buf = cv2.imencode(IMAGE_EXTENSIONS[fmt], image, params)
+    if not ok:
+        raise IOError("image could not be encoded as %s" % fmt)
+    return buf.tobytes()
+
+
+def decode_image(data, fmt):
+    """returns the image encoded in data at full bit depth,
+    or raises IOError."""
+    check_format(fmt)
+    if fmt == "npy":
+        try:
+            return np.load(io.BytesIO(data), allow_pickle=False)
+        except ValueError as err:
+            raise IOError("image could not be decoded as npy: %s" % err)
+
+    # pylint: disable=no-member
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise IOError("image could not be decoded as %s" % fmt)
+    return image
+
+
+def resolve_image_path(ipath):
+    """returns the path of an existing image file for ipath,
+    which can be stored in another format than its extension says.
+    If none is found, ipath is returned unchanged."""
+    if os.path.exists(ipath):
+        return ipath
+
+    root = os.path.splitext(ipath)[0]
+    for ext in sorted(IMAGE_EXTENSIONS.values()):
+        if os.path.exists(root + ext):
+            return root + ext
+
+    return ipath
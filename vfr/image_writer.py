@@ -0,0 +1,128 @@
+"""Background persistence of captured images.
+
+The capture path used to write each grabbed frame to an image file and
+then read the same file back for the analyzability check. Instead,
+the grabbed frame is now handed to the analysis as an array, and the
+file is written by a background thread while the rig moves on.
+
+The frame carries the SHA-1 hash of the encoded file contents, so
+that the analysis cache (see vfr.db.analysis_cache) can key the
+result before the file exists. The file contents are exactly the
+hashed bytes, so that the evaluation finds the cached entry when it
+reads the file later.
+
+Files are written under a temporary name and renamed when complete,
+so that a partially written image is never visible under its final
+name. Call flush() before the images are read from disk; the
+measurement tasks do this when they finish.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import atexit
+import hashlib
+import logging
+import os
+import threading
+from Queue import Queue
+
+import numpy as np
+
+from vfr.conf import IMAGE_COMPRESSION
+from vfr.image_store import encode_image, image_format, storable_image
+
+# maximum number of encoded images waiting to be written. Capturing
+# blocks when the disk falls behind, which bounds the memory use.
+IMAGE_WRITE_QUEUE_LEN = 8
+
+
+class ImageFrame(np.ndarray):
+    """grayscale image array which remembers the path of its image
+    file, and the SHA-1 hash of the file contents (None if unknown).
+
+    str() returns the path, so that messages of the image analysis
+    functions name the file, as they do for images loaded from disk.
+    """
+
+    def __array_finalize__(self, obj):
+        self.path = getattr(obj, "path", None)
+        self.digest = getattr(obj, "digest", None)
+
+    def __str__(self):
+        return str(self.path)
+
+
+def image_frame(image, ipath, digest=None):
+    frame = np.asarray(image).view(ImageFrame)
+    frame.path = ipath
+    frame.digest = digest
+    return frame
+
+
+class ImageWriter:
+    """writes encoded images to files in a background thread."""
+
+    def __init__(self, maxsize=IMAGE_WRITE_QUEUE_LEN):
+        self.queue = Queue(maxsize=maxsize)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.errors = []
+
+    def _start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="image-writer")
+                self.thread.daemon = True
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            ipath, data = self.queue.get()
+            try:
+                tmp_path = ipath + ".part"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.rename(tmp_path, ipath)
+                logging.getLogger(__name__).debug("File saved as : {}".format(ipath))
+            except (IOError, OSError) as err:
+                self.errors.append((ipath, err))
+            finally:
+                self.queue.task_done()
+
+    def submit(self, ipath, image):
+        """encodes image in the format given by the extension of
+        ipath (see vfr.image_store), queues it to be written to ipath,
+        and returns it as ImageFrame.
+
+        The frame holds the image as it is stored, so that the
+        analysis of the frame and of the file are the same."""
+        fmt = image_format(ipath)
+        image = storable_image(image, fmt)
+        data = encode_image(image, fmt, compression=IMAGE_COMPRESSION)
+
+        self._start()
+        self.queue.put((ipath, data))
+
+        return image_frame(image, ipath, digest=hashlib.sha1(data).hexdigest())
+
+    def flush(self):
+        """waits until all queued images are written, and raises
+        an IOError if any of them failed."""
+        self.queue.join()
+        if self.errors:
+            errors, self.errors = self.errors, []
+            raise IOError(
+                "%i image(s) could not be saved, first was %s: %s"
+                % (len(errors), errors[0][0], errors[0][1])
+            )
+
+
+image_writer = ImageWriter()
+
+# images of a measurement which was aborted by an exception are
+# still written, because their paths can already be in the database
+atexit.register(image_writer.queue.join)
+
+
+def flush_images():
+    image_writer.flush()
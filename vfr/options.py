@@ -16,7 +16,13 @@ from fpu_constants import (
     BETA_MAX_DEGREE,
 )
 from vfr.tests_common import lit_eval_file
-from vfr.conf import DEFAULT_TASKS, DEFAULT_TASKS_NONFIBRE
+from vfr.conf import (
+    DEFAULT_TASKS,
+    DEFAULT_TASKS_NONFIBRE,
+    DB_COMPRESSION,
+    DB_RECORD_CODEC,
+    IMAGE_ANALYSIS_WORKERS,
+)
 from vfr.db.snset import get_snset
 from vfr.helptext import examples, summary, plot_selection_help
 from vfr.task_config import USERTASKS, MEASUREMENT_TASKS, T
@@ -340,6 +346,55 @@ def parse_args():
         " back from the latest. Default is the latest record.",
     )
 
+    parser.add_argument(
+        "-dry",
+        "--dry-run",
+        default=False,
+        action="store_true",
+        help="in the 'migrate' task, only report how many records would be changed",
+    )
+
+    parser.add_argument(
+        "-rc",
+        "--record-codec",
+        choices=["binary", "repr"],
+        default=DB_RECORD_CODEC,
+        type=str,
+        help="format in which new database records are stored. Records"
+        " in either format can always be read. (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-rz",
+        "--record-compression",
+        choices=["zlib", "lz4", "none"],
+        default=DB_COMPRESSION or "none",
+        type=str,
+        help="compression of large new database records ('lz4' requires the"
+        " lz4 package). Compressed records are decoded transparently."
+        " (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--analysis-workers",
+        metavar="NUM_WORKERS",
+        type=int,
+        default=IMAGE_ANALYSIS_WORKERS,
+        help="number of worker processes which analyze images in evaluation"
+        " tasks. 0 selects the number of CPUs. (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "-xf",
+        "--export-file",
+        metavar="EXPORT_FILE",
+        default="verification_export.h5",
+        type=str,
+        help="HDF5 file to which the 'export' task appends results. Relative"
+        " paths are relative to VERIFICATION_ROOT_FOLDER. (default: %(default)s)",
+    )
+
     parser.add_argument(
         "-L",
         "--loglevel",
@@ -405,6 +460,11 @@ def parse_args():
                 "display_beta_max",
                 "display_beta_min",
                 "record_count",
+                "record_codec",
+                "record_compression",
+                "dry_run",
+                "export_file",
+                "analysis_workers",
                 "colorize",
             ]
         }
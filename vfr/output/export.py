@@ -0,0 +1,287 @@
+"""Export of verification results into an HDF5 file.
+
+Each test type is written to a table /results/<test>, with one row per
+stored record. The scalar fields of the records are columns: numbers
+are stored as float64, strings as fixed-size strings, short numeric
+sequences (like version tuples) as one column per element, and the
+fields of nested dictionaries and Namespaces (like error measures)
+with the joined field names. Each row has the serial number, the
+record count, and a record_id which is the row number.
+
+Dictionaries which map image keys to coordinate tuples (like the
+analysis results of positional repeatability) are written to
+extendable, chunked arrays /coordinates/<test>/<field>. Each array row
+holds the record_id, the dictionary key, and the coordinates.
+
+The export is incremental: each table stores the latest exported
+count for each serial number, and later exports only append
+newer records.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+import numbers
+import re
+from argparse import Namespace
+
+import numpy as np
+import tables
+
+from FpuGridDriver import DASEL_BOTH
+
+from vfr.db.base import RECORD_SCHEMAS, identity, iter_test_results
+from vfr.db.datum import RECORD_TYPE as DATUM_RECORD_TYPE
+from vfr.db.datum_repeatability import RECORD_TYPE as DAT_REP_RECORD_TYPE
+from vfr.db.metrology_calibration import RECORD_TYPE as MET_CAL_RECORD_TYPE
+from vfr.db.metrology_height import RECORD_TYPE as MET_HEIGHT_RECORD_TYPE
+from vfr.db.positional_repeatability import RECORD_TYPE as POS_REP_RECORD_TYPE
+from vfr.db.positional_verification import RECORD_TYPE as POS_VER_RECORD_TYPE
+from vfr.db.pupil_alignment import RECORD_TYPE as PUP_ALGN_RECORD_TYPE
+from vfr.db.snset import get_snset
+
+# tables which are exported, and the record types stored in them
+EXPORTED_RECORDS = [
+    ("datum", (DATUM_RECORD_TYPE, str(DASEL_BOTH))),
+    ("alpha_min", ("limit", "alpha_min")),
+    ("alpha_max", ("limit", "alpha_max")),
+    ("beta_min", ("limit", "beta_min")),
+    ("beta_max", ("limit", "beta_max")),
+    ("beta_collision", ("beta_collision",)),
+    ("datum_repeatability", (DAT_REP_RECORD_TYPE, "result")),
+    ("metrology_calibration", (MET_CAL_RECORD_TYPE, "result")),
+    ("metrology_height", (MET_HEIGHT_RECORD_TYPE, "result")),
+    ("positional_repeatability", (POS_REP_RECORD_TYPE, "result")),
+    ("positional_verification", (POS_VER_RECORD_TYPE, "result")),
+    ("pupil_alignment", (PUP_ALGN_RECORD_TYPE, "result")),
+]
+
+STRING_LENGTH = 64  # maximum length of exported string values
+MAX_SEQUENCE_COLUMNS = 8  # longer sequences are not exported as columns
+
+FILTERS = tables.Filters(complevel=5, complib="zlib")
+
+
+def column_name(name):
+    return re.sub(r"\W", "_", str(name))
+
+
+def is_number(val):
+    return isinstance(val, numbers.Number)
+
+
+def is_string(val):
+    return isinstance(val, (str, type(u"")))
+
+
+def flatten_record(record, prefix="", depth=0):
+    """yields (column name, value) for the scalar fields of a record."""
+    for key in sorted(record, key=str):
+        val = record[key]
+        name = prefix + column_name(key)
+
+        if isinstance(val, Namespace):
+            val = vars(val)
+
+        if isinstance(val, dict):
+            if depth < 2:
+                for item in flatten_record(val, name + "__", depth + 1):
+                    yield item
+        elif is_number(val) or is_string(val):
+            yield name, val
+        elif (
+            isinstance(val, (tuple, list, np.ndarray))
+            and (0 < len(val) <= MAX_SEQUENCE_COLUMNS)
+            and all(is_number(x) for x in val)
+        ):
+            for i, x in enumerate(val):
+                yield "%s_%i" % (name, i), x
+
+
+def coordinate_rows(val):
+    """returns the rows (key..., coordinates...) of a dictionary
+    with numeric keys and coordinate tuples, or None."""
+    if not isinstance(val, dict) or len(val) == 0:
+        return None
+
+    rows = []
+    for key, coords in val.items():
+        if not isinstance(key, tuple):
+            key = (key,)
+        if not isinstance(coords, (tuple, list)):
+            continue
+        row = tuple(key) + tuple(coords)
+        if not all(is_number(x) for x in row):
+            return None
+        rows.append(row)
+
+    if not rows:
+        return None
+
+    return np.array(sorted(rows), dtype=np.float64)
+
+
+def record_columns(records):
+    """returns a dictionary which maps the column names of all fields
+    of the records to True for string columns, and False for numeric
+    ones. A field which has string values in some records is a
+    string column."""
+    columns = {}
+    for record in records:
+        for col, val in flatten_record(record):
+            columns[col] = columns.get(col, False) or is_string(val)
+    return columns
+
+
+def create_table(h5file, name, columns):
+    description = {
+        "record_id": tables.Int64Col(pos=0),
+        "serial_number": tables.StringCol(STRING_LENGTH, pos=1),
+        "count": tables.Int32Col(pos=2),
+    }
+    for col, string_col in columns.items():
+        if col in description:
+            continue
+        if string_col:
+            description[col] = tables.StringCol(STRING_LENGTH)
+        else:
+            description[col] = tables.Float64Col(dflt=np.nan)
+
+    table = h5file.create_table(
+        "/results", name, description, filters=FILTERS, createparents=True
+    )
+    table.attrs.last_counts = {}
+    return table
+
+
+def append_coordinates(h5file, name, field, record_id, rows):
+    logger = logging.getLogger(__name__)
+    path = "/coordinates/%s/%s" % (name, field)
+    width = rows.shape[1] + 1
+
+    if path in h5file:
+        earray = h5file.get_node(path)
+        if earray.shape[1] != width:
+            logger.warning(
+                "export: skipping %s of record %i, which has %i instead of %i columns"
+                % (path, record_id, width, earray.shape[1])
+            )
+            return
+    else:
+        earray = h5file.create_earray(
+            "/coordinates/%s" % name,
+            field,
+            atom=tables.Float64Atom(),
+            shape=(0, width),
+            filters=FILTERS,
+            createparents=True,
+        )
+
+    ids = np.full((rows.shape[0], 1), record_id, dtype=np.float64)
+    earray.append(np.hstack([ids, rows]))
+
+
+def export_record_type(dbe, h5file, name, record_type, serial_numbers):
+    """appends all records of record_type which are newer than the
+    last export to the table of the given name. Returns the number
+    of exported records."""
+    default_vals, upgrade_func = RECORD_SCHEMAS.get(record_type, ({}, identity))
+
+    def keyfunc(serialnumber):
+        return (serialnumber,) + record_type
+
+    table_path = "/results/" + name
+    if table_path in h5file:
+        table = h5file.get_node(table_path)
+        last_counts = dict(table.attrs.last_counts)
+    else:
+        table = None
+        last_counts = {}
+
+    def new_records(serialnumber):
+        return iter_test_results(
+            dbe,
+            serialnumber,
+            keyfunc,
+            min_count=last_counts.get(serialnumber, -1) + 1,
+            default_vals=default_vals,
+            upgrade_func=upgrade_func,
+        )
+
+    if table is None:
+        # the columns are collected from all records, because fields
+        # can be missing or None in some of them
+        columns = record_columns(
+            record
+            for serialnumber in sorted(serial_numbers)
+            for record in new_records(serialnumber)
+        )
+        if not columns:
+            return 0
+        table = create_table(h5file, name, columns)
+
+    colnames = table.colnames
+    dropped = {}
+    num_exported = 0
+    for serialnumber in sorted(serial_numbers):
+        for record in new_records(serialnumber):
+            record_id = table.nrows
+            count = record["record-count"]
+
+            row = table.row
+            row["record_id"] = record_id
+            row["serial_number"] = serialnumber
+            row["count"] = count
+            for col, val in flatten_record(record):
+                if col in ["record_id", "count"]:
+                    continue
+                if col not in colnames:
+                    dropped[col] = dropped.get(col, 0) + 1
+                    continue
+                if table.coltypes[col] == "string":
+                    if not is_string(val):
+                        val = str(val)
+                    val = val[:STRING_LENGTH]
+                elif is_string(val):
+                    dropped[col] = dropped.get(col, 0) + 1
+                    continue
+                row[col] = val
+            row.append()
+
+            for field, val in sorted(record.items(), key=lambda kv: str(kv[0])):
+                rows = coordinate_rows(val)
+                if rows is not None:
+                    append_coordinates(
+                        h5file, name, column_name(field), record_id, rows
+                    )
+
+            last_counts[serialnumber] = count
+            num_exported += 1
+
+        # the counts are stored with the rows, so that an interrupted
+        # export does not append the same records again
+        table.flush()
+        table.attrs.last_counts = last_counts
+
+    logger = logging.getLogger(__name__)
+    for col, num in sorted(dropped.items()):
+        logger.warning(
+            "export: field %s of %i %s record(s) was not exported,"
+            " the table has no column of its type" % (col, num, name)
+        )
+
+    return num_exported
+
+
+def export_data(dbe, opts):
+    """exports all verification results into the HDF5 file opts.export_file,
+    appending records which are newer than the previous export."""
+    logger = logging.getLogger(__name__)
+    serial_numbers = get_snset(dbe.env, dbe.vfdb, opts)
+
+    with tables.open_file(opts.export_file, mode="a") as h5file:
+        for name, record_type in EXPORTED_RECORDS:
+            num_exported = export_record_type(
+                dbe, h5file, name, record_type, serial_numbers
+            )
+            logger.info("export: %i new %s records" % (num_exported, name))
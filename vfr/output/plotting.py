@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function
-from vfr.db.retrieval import get_data
+from vfr.db.retrieval import get_data_bulk
 
 import numpy as np
 import types
@@ -148,8 +148,9 @@ def plot(dbe, opts):
     logger = logging.getLogger(__name__)
 
     plot_selection = dbe.opts.plot_selection
-    for count, fpu_id in enumerate(dbe.eval_fpuset):
-        ddict = vars(get_data(dbe, fpu_id))
+    all_data = get_data_bulk(dbe, dbe.eval_fpuset)
+    for count, (fpu_id, data) in enumerate(all_data):
+        ddict = vars(data)
         if ddict is None:
             logger.info("FPU %r: no plot data found" % fpu_id)
             continue
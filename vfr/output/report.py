@@ -5,7 +5,7 @@ from textwrap import TextWrapper
 import termcolor
 
 from vfr.db.base import TestResult
-from vfr.db.retrieval import get_data
+from vfr.db.retrieval import get_data_bulk
 
 from vfr.output.report_formats import (
     rfmt_datum,
@@ -1438,8 +1438,9 @@ def colorize(ddict):
 def report(dbe, opts):
 
     report_format = dbe.opts.report_format
-    for count, fpu_id in enumerate(dbe.eval_fpuset):
-        ddict = vars(get_data(dbe, fpu_id))
+    all_data = get_data_bulk(dbe, dbe.eval_fpuset)
+    for count, (fpu_id, data) in enumerate(all_data):
+        ddict = vars(data)
 
         if opts.colorize and report_format not in ["status", "brief", "csv"]:
             ddict = colorize(ddict)
@@ -1473,8 +1474,9 @@ def report(dbe, opts):
 def dump_data(dbe):
 
     print("{", file=dbe.opts.output_file)
-    for count, fpu_id in enumerate(dbe.eval_fpuset):
-        ddict = vars(get_data(dbe, fpu_id))
+    all_data = get_data_bulk(dbe, dbe.eval_fpuset)
+    for count, (fpu_id, data) in enumerate(all_data):
+        ddict = vars(data)
         if count > 0:
             print("\n\n", file=dbe.opts.output_file)
         print("%r : %r," % (fpu_id, ddict), file=dbe.opts.output_file)
@@ -0,0 +1,414 @@
+"""Parallel analysis of a series of images in a process pool.
+
+The images of one or more measurements are analyzed in worker processes. The
+results are collected in the order of the input, so that the results,
+the warnings about failed images, and the accounting of failures are
+the same as when the images are analyzed one after another. If the
+number of failures exceeds the allowed maximum, the remaining work is
+cancelled and the error of the image which exceeded it is raised.
+
+If an analysis cache is given (see vfr.db.analysis_cache), the image
+files are hashed in the worker processes, cached results are taken
+from the cache, and only the remaining images are analyzed. New
+results are stored in the cache by the main process, which is the
+only one accessing the database. They are written in one batch
+when all images are analyzed and the worker processes have ended,
+so that no write transaction is open while the workers are forked
+or running.
+
+The workers inherit the analysis function and its keyword arguments
+(like a correction function) when they are forked, so these do not
+need to be picklable.
+
+With a TargetTracker (see ImageAnalysisFuncs.target_tracking) in the
+keyword arguments, the images are analyzed in runs of consecutive
+images, and each run is sent to one worker, which resets its copy of
+the tracker at the start of the run. Runs with a missing cache entry
+are analyzed completely, so that the tracked region of each image
+does not depend on the number of workers or on the cache contents.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+import multiprocessing
+from collections import OrderedDict
+
+from ImageAnalysisFuncs.base import ImageAnalysisError
+from vfr.db.analysis_cache import hash_image_file
+
+# number of images which are sent to a worker at once
+CHUNKSIZE = 4
+
+# analysis function and arguments of the worker processes
+_worker_state = {}
+
+
+def get_num_workers(workers=None):
+    """returns the number of worker processes to use. None or
+    values smaller than 1 select the number of CPUs."""
+    if (workers is None) or (workers < 1):
+        try:
+            return multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 1
+    return workers
+
+
+def _init_worker(analysis_func, pars, kwargs):
+    _worker_state["analysis_func"] = analysis_func
+    _worker_state["pars"] = pars
+    _worker_state["kwargs"] = kwargs
+
+
+def analyze_run(ipaths, analysis_func, pars, kwargs):
+    """analyzes a run of consecutive images, and returns a list of
+    (result, error) pairs. A TargetTracker in kwargs is reset at the
+    start of the run, so that the results do not depend on images
+    analyzed before."""
+    tracker = kwargs.get("tracker")
+    if tracker is not None:
+        tracker.reset()
+
+    outcomes = []
+    for ipath in ipaths:
+        try:
+            outcomes.append((analysis_func(ipath, pars=pars, **kwargs), None))
+        except ImageAnalysisError as err:
+            outcomes.append((None, err))
+    return outcomes
+
+
+def _analyze_run(ipaths):
+    outcomes = analyze_run(
+        ipaths,
+        _worker_state["analysis_func"],
+        _worker_state["pars"],
+        _worker_state["kwargs"],
+    )
+    # the messages are passed, because exception
+    # objects are not always picklable
+    return [(result, None if err is None else str(err)) for result, err in outcomes]
+
+
+def _hash(ipath):
+    try:
+        return hash_image_file(ipath)
+    except (IOError, OSError):
+        return None
+
+
+class FailureCounter:
+    """counts failed images, and raises the analysis error
+    when more than max_failures images failed."""
+
+    def __init__(self, max_failures):
+        self.max_failures = max_failures
+        self.count = 0
+
+    def failed(self, ipath, err):
+        self.count += 1
+        if (self.max_failures is not None) and (self.count > self.max_failures):
+            raise err
+
+        logging.getLogger(__name__).warning(
+            "image analysis failed for image %s, "
+            "message = %s (continuing)" % (ipath, str(err))
+        )
+
+
+def get_runs(num_images, tracker=None):
+    """returns the runs (start, end) of consecutive images which are
+    analyzed together. With a TargetTracker, the images are split into
+    runs of tracker.run_length images, which start with a reset tracker,
+    so that the results are the same for any number of workers and any
+    cached results. Otherwise, each image is a run of its own."""
+    length = 1 if tracker is None else max(tracker.run_length, 1)
+    return [(i, min(i + length, num_images)) for i in range(0, num_images, length)]
+
+
+def lookup(cache, keys):
+    """returns the cache entries of the keys, with None for missing ones."""
+    entries = []
+    for key in keys:
+        entry = None
+        if key is not None:
+            entry = cache.get(key)
+            if entry is not None:
+                cache.hits += 1
+            else:
+                cache.misses += 1
+        entries.append(entry)
+    return entries
+
+
+def cached_outcomes(entries):
+    outcomes = []
+    for entry in entries:
+        if entry["error"] is None:
+            outcomes.append((entry["result"], None))
+        else:
+            outcomes.append((None, ImageAnalysisError(entry["error"])))
+    return outcomes
+
+
+def store(pending, keys, entries, outcomes):
+    """adds the outcomes of images which were missing in the cache
+    to the pending cache entries."""
+    for key, entry, (result, err) in zip(keys, entries, outcomes):
+        if (key is not None) and (entry is None):
+            pending.append((key, result, None if err is None else str(err)))
+
+
+def iter_serial(ipaths, analysis_func, pars, version, cache, key_pars, kwargs):
+    tracker = kwargs.get("tracker")
+    pending = []
+    try:
+        for start, end in get_runs(len(ipaths), tracker):
+            run = ipaths[start:end]
+            if cache is None:
+                outcomes = analyze_run(run, analysis_func, pars, kwargs)
+            else:
+                keys = [
+                    cache.key(
+                        ipath,
+                        analysis_func,
+                        version,
+                        pars,
+                        key_pars=key_pars,
+                        tracker=tracker,
+                    )
+                    for ipath in run
+                ]
+                entries = lookup(cache, keys)
+                if all(entry is not None for entry in entries):
+                    outcomes = cached_outcomes(entries)
+                else:
+                    outcomes = analyze_run(run, analysis_func, pars, kwargs)
+                    store(pending, keys, entries, outcomes)
+
+            for outcome in outcomes:
+                yield outcome
+    finally:
+        if pending:
+            cache.put_many(pending)
+
+
+def iter_parallel(
+    ipaths, analysis_func, pars, version, cache, key_pars, kwargs, workers
+):
+    tracker = kwargs.get("tracker")
+    runs = get_runs(len(ipaths), tracker)
+    pending = []
+    pool = multiprocessing.Pool(
+        workers, initializer=_init_worker, initargs=(analysis_func, pars, kwargs)
+    )
+    try:
+        # look up cached results
+        entries = [None] * len(ipaths)
+        cache_keys = [None] * len(ipaths)
+        if cache is not None:
+            for file_hash in pool.imap(_hash, ipaths, chunksize=CHUNKSIZE):
+                if file_hash is not None:
+                    cache.image_hashes[file_hash[0]] = file_hash[1]
+
+            cache_keys = [
+                cache.key(
+                    ipath,
+                    analysis_func,
+                    version,
+                    pars,
+                    key_pars=key_pars,
+                    tracker=tracker,
+                )
+                for ipath in ipaths
+            ]
+            entries = lookup(cache, cache_keys)
+
+        # analyze the runs with missing results, each run in one
+        # worker, and yield results in input order
+        missing = [
+            (start, end)
+            for start, end in runs
+            if any(entry is None for entry in entries[start:end])
+        ]
+        computed = pool.imap(
+            _analyze_run,
+            [ipaths[start:end] for start, end in missing],
+            chunksize=CHUNKSIZE if tracker is None else 1,
+        )
+        missing = set(missing)
+
+        for start, end in runs:
+            if (start, end) in missing:
+                outcomes = [
+                    (result, None if errmsg is None else ImageAnalysisError(errmsg))
+                    for result, errmsg in next(computed)
+                ]
+                if cache is not None:
+                    store(
+                        pending,
+                        cache_keys[start:end],
+                        entries[start:end],
+                        outcomes,
+                    )
+            else:
+                outcomes = cached_outcomes(entries[start:end])
+
+            for outcome in outcomes:
+                yield outcome
+
+        pool.close()
+    except BaseException:
+        # cancels remaining work, also when the
+        # consumer stops early because of too many failures
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        if pending:
+            cache.put_many(pending)
+
+
+def iter_analysis_results(
+    ipaths,
+    analysis_func,
+    pars=None,
+    version=None,
+    cache=None,
+    workers=None,
+    key_pars=None,
+    **kwargs
+):
+    """yields a tuple (result, error) for each image path, in input order.
+    error is None, or the ImageAnalysisError raised by the analysis.
+
+    key_pars holds any values which determine the result but are not
+    part of pars, like the calibration of a correction function passed
+    in kwargs. They are added to the cache keys (see
+    vfr.db.analysis_cache.AnalysisCache.analyze()).
+
+    Closing the iterator cancels the remaining work.
+    """
+    ipaths = list(ipaths)
+    workers = min(get_num_workers(workers), len(ipaths))
+
+    if workers <= 1:
+        return iter_serial(
+            ipaths, analysis_func, pars, version, cache, key_pars, kwargs
+        )
+
+    return iter_parallel(
+        ipaths, analysis_func, pars, version, cache, key_pars, kwargs, workers
+    )
+
+
+def analyze_images(
+    images,
+    analysis_func,
+    pars=None,
+    version=None,
+    max_failures=None,
+    cache=None,
+    workers=None,
+    key_pars=None,
+    **kwargs
+):
+    """analyzes a sequence of images with analysis_func(ipath, pars=pars, **kwargs).
+
+    images is a sequence of (key, image path) pairs. Returns an OrderedDict
+    which maps the keys of all successfully analyzed images to their
+    results, in the order of the input.
+
+    A warning is logged for each failed image. If more than max_failures
+    images fail, the remaining work is cancelled and the ImageAnalysisError
+    of the last failed image is raised. workers is the number of worker
+    processes; with one worker, the images are analyzed in the calling
+    process. key_pars are added to the cache keys, as in
+    iter_analysis_results().
+    """
+    images = list(images)
+    counter = FailureCounter(max_failures)
+    results = OrderedDict()
+
+    outcomes = iter_analysis_results(
+        [ipath for _, ipath in images],
+        analysis_func,
+        pars=pars,
+        version=version,
+        cache=cache,
+        workers=workers,
+        key_pars=key_pars,
+        **kwargs
+    )
+    try:
+        for i, (result, err) in enumerate(outcomes):
+            key, ipath = images[i]
+            if err is None:
+                results[key] = result
+            else:
+                counter.failed(ipath, err)
+    finally:
+        outcomes.close()
+
+    return results
+
+
+def analyze_image_groups(
+    groups,
+    analysis_func,
+    pars=None,
+    version=None,
+    cache=None,
+    workers=None,
+    key_pars=None,
+    **kwargs
+):
+    """analyzes several groups of images concurrently, like the image
+    sets of several FPUs.
+
+    groups is a sequence of (images, max_failures) pairs, where images
+    is a sequence of (key, image path) pairs. The failures are counted
+    separately for each group. Returns a list with an entry for each
+    group, which is either an OrderedDict like the one returned by
+    analyze_images(), or the ImageAnalysisError which was raised
+    because the group exceeded its maximum number of failures.
+    Remaining results of such a group are ignored.
+    """
+    groups = [(list(images), max_failures) for images, max_failures in groups]
+    counters = [FailureCounter(max_failures) for _, max_failures in groups]
+    results = [OrderedDict() for _ in groups]
+    flat = [
+        (index, key, ipath)
+        for index, (images, _) in enumerate(groups)
+        for key, ipath in images
+    ]
+
+    outcomes = iter_analysis_results(
+        [ipath for _, _, ipath in flat],
+        analysis_func,
+        pars=pars,
+        version=version,
+        cache=cache,
+        workers=workers,
+        key_pars=key_pars,
+        **kwargs
+    )
+    try:
+        for i, (result, err) in enumerate(outcomes):
+            index, key, ipath = flat[i]
+            if not isinstance(results[index], OrderedDict):
+                # group failed already
+                continue
+
+            if err is None:
+                results[index][key] = result
+            else:
+                try:
+                    counters[index].failed(ipath, err)
+                except ImageAnalysisError as group_err:
+                    results[index] = group_err
+    finally:
+        outcomes.close()
+
+    return results
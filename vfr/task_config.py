@@ -45,6 +45,8 @@ class T:
     TASK_REPORT = "report"
     TASK_PLOT = "plot"
     TASK_DUMP = "dump"
+    TASK_MIGRATE = "migrate"
+    TASK_EXPORT = "export"
     TASK_PARK_FPUS = "park_fpus"
     TASK_HOME_TURNTABLE = "home_turntable"
     TASK_REWIND_FPUS = "rewind_fpus"
@@ -99,10 +101,12 @@ USERTASKS = set(
         T.TASK_EVAL_ALL,
         T.TASK_EVAL_ALL,
         T.TASK_EVAL_NONFIBRE,
+        T.TASK_EXPORT,
         T.TASK_HOME_TURNTABLE,
         T.TASK_HOME_TURNTABLE,
         T.TASK_MEASURE_ALL,
         T.TASK_MEASURE_NONFIBRE,
+        T.TASK_MIGRATE,
         T.TASK_PARK_FPUS,
         T.TASK_PLOT,
         T.TASK_REFERENCE,
@@ -12,7 +12,9 @@ from os import path
 from os.path import expanduser, expandvars
 from textwrap import dedent
 import signal
+import threading
 import warnings
+from Queue import Queue
 import camera_calibration
 
 from fpu_commands import gen_wf, list_states
@@ -31,12 +33,16 @@ from FpuGridDriver import (
 )
 from numpy import array, zeros
 from vfr.conf import (
+    ANALYSIS_QUEUE_LEN,
     DB_TIME_FORMAT,
+    IMAGE_FORMAT,
     VERIFICATION_ROOT_FOLDER,
     NR360_SERIALNUMBER,
     MTS50_SERIALNUMBER,
 )
-from ImageAnalysisFuncs.base import ImageAnalysisError
+from ImageAnalysisFuncs.base import ImageAnalysisError, load_image
+from vfr.image_store import resolve_image_path, store_path
+from vfr.image_writer import image_frame, image_writer
 
 assert tuple(map(int, FpuGridDriver.__version__.split("."))) >= (
     1,
@@ -223,7 +229,7 @@ def cd_to_data_root(root_folder):
     os.chdir(data_root_path)
 
 
-def store_image(camera, format_string, **kwargs):
+def new_image_path(format_string, **kwargs):
 
     # requires current work directory set to image root folder
     ipath = os.path.join("images", format_string.format(**kwargs))
@@ -235,6 +241,35 @@ def store_image(camera, format_string, **kwargs):
             pass
         else:
             raise
+    return ipath
+
+
+def grab_image(camera, format_string, **kwargs):
+    """grabs an image, and returns it as an ImageFrame array with
+    the image path in its path attribute.
+
+    The image file is written in the background (see
+    vfr.image_writer) in the format IMAGE_FORMAT (see
+    vfr.image_store), so that the frame can be analyzed right away.
+    Cameras which can only save files keep the extension of the
+    format string, and the file is read back."""
+    ipath = new_image_path(format_string, **kwargs)
+
+    grab = getattr(camera, "grabImage", None)
+    image = None if grab is None else grab()
+    if image is not None:
+        frame = image_writer.submit(store_path(ipath, IMAGE_FORMAT), image)
+    else:
+        camera.saveImage(ipath)
+        frame = image_frame(load_image(ipath), ipath)
+
+    check_for_quit()
+    return frame
+
+
+def store_image(camera, format_string, **kwargs):
+
+    ipath = new_image_path(format_string, **kwargs)
     camera.saveImage(ipath)
 
     check_for_quit()
@@ -267,7 +302,48 @@ def lit_eval_file(file_name):
     return literal_eval("".join(filter(not_comment, open(file_name).readlines())))
 
 
+# calibrations loaded by get_config_from_mapfile(), by map file path
+_calibration_registry = {}
+_calibration_registry_lock = threading.Lock()
+
+
 def get_config_from_mapfile(filename):
+    """returns the calibration parameters selected by a map file.
+
+    The parameters are cached for the process, and the same
+    dictionary is returned again as long as neither the map file nor
+    the calibration file it names are modified. Because of this,
+    get_correction_func() can reuse its correction function for all
+    FPUs evaluated with the same map file. The returned dictionary
+    must not be modified.
+    """
+    key = path.abspath(filename)
+    mapfile_mtime = os.stat(filename).st_mtime
+
+    with _calibration_registry_lock:
+        entry = _calibration_registry.get(key)
+        if (entry is not None) and (entry[0] == mapfile_mtime):
+            _, config_file_name, config_mtime, calibration_pars = entry
+            try:
+                if os.stat(config_file_name).st_mtime == config_mtime:
+                    return calibration_pars
+            except OSError:
+                pass
+
+        config_file_name, calibration_pars = load_config_from_mapfile(filename)
+        _calibration_registry[key] = (
+            mapfile_mtime,
+            path.abspath(config_file_name),
+            os.stat(config_file_name).st_mtime,
+            calibration_pars,
+        )
+
+    return calibration_pars
+
+
+def load_config_from_mapfile(filename):
+    """reads a map file and the calibration it names, and returns
+    the calibration file name and the calibration parameters."""
     logger = logging.getLogger(__name__)
     map_config = lit_eval_file(filename)
     # current_dir = os.getcwd()
@@ -281,7 +357,96 @@ def get_config_from_mapfile(filename):
     # os.chdir(current_dir)
     config_dict = config.to_dict()
 
-    return {"algorithm": algorithm, "config": config_dict}
+    calibration_pars = {"algorithm": algorithm, "config": config_dict}
+
+    if "lookup_table" in map_config:
+        lookup_table = get_lookup_table_pars(
+            config, map_config["lookup_table"], path.dirname(config_file_name)
+        )
+        if lookup_table is not None:
+            calibration_pars["lookup_table"] = lookup_table
+
+    return config_file_name, calibration_pars
+
+
+def get_lookup_table_pars(config, table_config, directory):
+    """returns the parameters of the precomputed correction table
+    for the calibration, which is stored next to the calibration
+    file. The map file entry has the form
+
+        'lookup_table' : {'image_size' : (width, height), 'step' : 8,
+                          'max_deviation' : 0.0005},
+
+    When the table is first used, it is compared with the exact
+    correction, and the maximum deviation is stored with it. If the
+    deviation is larger than max_deviation (in millimetres), the table
+    is not used and the exact correction is applied instead.
+    """
+    logger = logging.getLogger(__name__)
+    width, height = table_config["image_size"]
+    step = table_config.get("step", 8)
+    max_deviation = table_config.get("max_deviation", 0.0005)
+    level = camera_calibration.Correction.lens_keystone_and_real_coordinates
+
+    file_name = camera_calibration.table_file_name(
+        directory, config, level, width, height, step
+    )
+    table = camera_calibration.load_or_build_table(
+        directory, config, level, width, height, step
+    )
+    if table.max_deviation is None:
+        logger.audit("validating correction table %s" % file_name)
+        report = camera_calibration.validate_table(table, config, level)
+        logger.audit(
+            "correction table deviation from exact correction:"
+            " max %.2e mm at pixel (%.1f, %.1f), mean %.2e mm (%i points)"
+            % (
+                (report["max_deviation"],)
+                + report["max_deviation_position"]
+                + (report["mean_deviation"], report["num_points"])
+            )
+        )
+        table.max_deviation = report["max_deviation"]
+        if not camera_calibration.save_table(table, file_name):
+            logger.warning(
+                "correction table %s could not be saved, it is validated"
+                " again on next use" % file_name
+            )
+
+    if table.max_deviation > max_deviation:
+        logger.warning(
+            "correction table deviation %.2e mm exceeds %.2e mm,"
+            " using exact correction" % (table.max_deviation, max_deviation)
+        )
+        return None
+
+    return {
+        "directory": directory,
+        "image_size": (width, height),
+        "step": step,
+    }
+
+
+def get_target_detection_pars(analysis_pars, mapfile=None):
+    """returns the parameters of the selected target detection
+    algorithm, after setting the plate scale and, if a map file is
+    given, the calibration which are used in the analysis.
+
+    This is done before images are checked after capture as well as
+    in the evaluation, so that both use the same parameters and
+    cached analysis results can be reused.
+    """
+    if analysis_pars.TARGET_DETECTION_ALGORITHM == "otsu":
+        pars = analysis_pars.TARGET_DETECTION_OTSU_PARS
+    else:
+        pars = analysis_pars.TARGET_DETECTION_CONTOUR_PARS
+
+    pars.PLATESCALE = analysis_pars.PLATESCALE
+
+    if mapfile:
+        pars.CALIBRATION_PARS = get_config_from_mapfile(mapfile)
+
+    return pars
 
 
 def safe_home_turntable(rig, grid_state, opts=None):
@@ -369,11 +534,13 @@ def fixup_ipath(ipath):
 
   See function store_image above to compare current layout.
 
+  Images which were converted to another storage format are found
+  under their new extension (see vfr.image_store).
   """
-    if ipath.startswith("images/"):
-        return ipath
-    else:
-        return os.path.join("images/", ipath)
+    if not ipath.startswith("images/"):
+        ipath = os.path.join("images/", ipath)
+
+    return resolve_image_path(ipath)
 
 
 image_error_count = {}
@@ -383,12 +550,20 @@ ECOUNT_LIMIT_WARN = 5  # limit for warnings
 ECOUNT_LIMIT_FATAL = 21  # limit to trigger a fatal error
 
 
-def check_image_analyzability(ipath, analysis_func, pars=None):
+def check_image_analyzability(
+    ipath, analysis_func, pars=None, cache=None, version=None, key_pars=None
+):
     """Check whether a captured image can be analyzed successfully,
   and keeps some statistics.
   If this is not the case, it can be a rare failure.
   However if such errors happen frequently,
 
+  If an analysis cache is passed (see vfr.db.analysis_cache), the
+  result is stored there under the algorithm version, so that the
+  evaluation does not need to analyze the image again.
+
+  ipath can also be an ImageFrame returned by grab_image(), which is
+  analyzed in memory, without reading back the image file.
   """
     fname = analysis_func.__name__
     if not fname in image_error_count:
@@ -396,7 +571,12 @@ def check_image_analyzability(ipath, analysis_func, pars=None):
 
     ecount = image_error_count[fname]
     try:
-        analysis_func(ipath, pars=pars)
+        if cache is None:
+            analysis_func(ipath, pars=pars)
+        else:
+            cache.analyze(
+                ipath, analysis_func, pars=pars, version=version, key_pars=key_pars
+            )
         ecount.append(0)
         if len(ecount) > ECOUNT_QUEUE_LEN:
             ecount.pop(0)
@@ -430,6 +610,98 @@ def check_image_analyzability(ipath, analysis_func, pars=None):
       message = %r.
 
       Stopping verification system."""
-                    % (fname, ECOUNT_LIMIT_FATAL, ECOUNT_QUEUE_LEN, ipath, err)
+                    % (
+                        fname,
+                        ECOUNT_LIMIT_FATAL,
+                        ECOUNT_QUEUE_LEN,
+                        getattr(ipath, "path", ipath),
+                        err,
+                    )
                 )
             )
+
+
+class AnalysisQueue:
+    """Checks captured images in a background thread, so that the
+  image analysis overlaps with the motion of the FPU to the next
+  position.
+
+  check() takes the arguments of check_image_analyzability() and
+  returns at once. The images are checked in the order of capture,
+  so that the error statistics are the same as without the queue.
+  At most maxsize images wait for their check; when the queue is
+  full, check() blocks until the oldest image is done. A fatal
+  error of a check is raised by the next call to check() or
+  join(), so that it stops the measurement at most maxsize + 1
+  images after the failed one.
+
+  With maxsize = 0, check() analyzes the image right away, as
+  check_image_analyzability() does.
+
+  The queue is used as context manager by the measurement tasks.
+  When the context is left normally, all queued images are checked;
+  when it is left by an exception, the remaining checks are skipped.
+  """
+
+    def __init__(self, maxsize=ANALYSIS_QUEUE_LEN):
+        self.queue = Queue(maxsize=maxsize) if maxsize > 0 else None
+        self.thread = None
+        self.error = None
+        self.aborted = False
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if (self.error is None) and (not self.aborted):
+                    args, kwargs = item
+                    try:
+                        check_image_analyzability(*args, **kwargs)
+                    except Exception as err:
+                        self.error = err
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            err, self.error = self.error, None
+            raise err
+
+    def check(self, ipath, analysis_func, **kwargs):
+        if self.queue is None:
+            check_image_analyzability(ipath, analysis_func, **kwargs)
+            return
+
+        self._raise_error()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="image-analysis")
+            self.thread.daemon = True
+            self.thread.start()
+        self.queue.put(((ipath, analysis_func), kwargs))
+
+    def join(self):
+        """waits until all queued images are checked, and raises
+      the error of a failed check."""
+        if self.queue is not None:
+            self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.join()
+            else:
+                self.aborted = True
+        finally:
+            self.close()
@@ -15,12 +15,12 @@ from ImageAnalysisFuncs.analyze_positional_repeatability import (
     posrepCoordinates,
 )
 from vfr.evaluation.eval_datum_repeatability import (
-    evaluate_datum_repeatability,
+    evaluate_datum_repeatability_array,
     NO_RESULT,
 )
 from numpy import NaN, array
 import numpy as np
-from vfr.conf import MET_CAL_CAMERA_IP_ADDRESS
+from vfr.conf import IMAGE_ANALYSIS_WORKERS, MET_CAL_CAMERA_IP_ADDRESS
 from vfr.db.base import TestResult
 from vfr.db.datum_repeatability import (
     DatumRepeatabilityImages,
@@ -30,11 +30,15 @@ from vfr.db.datum_repeatability import (
     save_datum_repeatability_images,
     save_datum_repeatability_result,
 )
+from vfr.image_writer import flush_images
+from vfr.parallel_analysis import analyze_image_groups
 from vfr.tests_common import (
+    AnalysisQueue,
     dirac,
     fixup_ipath,
     get_sorted_positions,
-    store_image,
+    get_target_detection_pars,
+    grab_image,
     timestamp,
     safe_home_turntable,
     turntable_safe_goto,
@@ -110,11 +114,16 @@ def move_then_datum(rig, fpu_id):
     gd.findDatum(grid_state, fpuset=[fpu_id])
 
 
-def grab_datumed_images(rig, fpu_id, capture_func, iterations):
+def grab_datumed_images(
+    rig, fpu_id, capture_func, iterations, analysis_cache=None, analysis_queue=None
+):
     """perform a number of datum operations, store
     an image after each, and return the path names
     of the images, together with the residual count."""
     fpu_log = get_fpuLogger(fpu_id, rig.fpu_config, __name__)
+    check = (
+        check_image_analyzability if analysis_queue is None else analysis_queue.check
+    )
 
     datumed_images = []
     datumed_residuals = []
@@ -125,10 +134,15 @@ def grab_datumed_images(rig, fpu_id, capture_func, iterations):
 
         rig.gd.findDatum(rig.grid_state, fpuset=[fpu_id])
 
-        ipath = capture_func("datumed", count)
+        image = capture_func("datumed", count)
+        ipath = image.path
         fpu_log.audit("saving image %i to %r" % (count, abspath(ipath)))
-        check_image_analyzability(
-            ipath, posrepCoordinates, pars=DATUM_REP_ANALYSIS_PARS
+        check(
+            image,
+            posrepCoordinates,
+            pars=DATUM_REP_ANALYSIS_PARS,
+            cache=analysis_cache,
+            version=DATUM_REPEATABILITY_ALGORITHM_VERSION,
         )
         datumed_images.append(ipath)
 
@@ -138,12 +152,17 @@ def grab_datumed_images(rig, fpu_id, capture_func, iterations):
     return datumed_images, datumed_residuals
 
 
-def grab_moved_images(rig, fpu_id, capture_func, iterations):
+def grab_moved_images(
+    rig, fpu_id, capture_func, iterations, analysis_cache=None, analysis_queue=None
+):
     """perform datum operations after moving, grab and
     collect images, and return resulting images and residual counts.
     """
 
     fpu_log = get_fpuLogger(fpu_id, rig.fpu_config, __name__)
+    check = (
+        check_image_analyzability if analysis_queue is None else analysis_queue.check
+    )
 
     rig.gd.findDatum(rig.grid_state)
     moved_images = []
@@ -152,10 +171,15 @@ def grab_moved_images(rig, fpu_id, capture_func, iterations):
         move_then_datum(rig, fpu_id)
 
         fpu_log.info("capturing moved+datumed-%02i" % count)
-        ipath = capture_func("moved+datumed", count)
+        image = capture_func("moved+datumed", count)
+        ipath = image.path
         fpu_log.audit("saving image %i to %r" % (count, abspath(ipath)))
-        check_image_analyzability(
-            ipath, posrepCoordinates, pars=DATUM_REP_ANALYSIS_PARS
+        check(
+            image,
+            posrepCoordinates,
+            pars=DATUM_REP_ANALYSIS_PARS,
+            cache=analysis_cache,
+            version=DATUM_REPEATABILITY_ALGORITHM_VERSION,
         )
         moved_images.append(ipath)
 
@@ -165,7 +189,9 @@ def grab_moved_images(rig, fpu_id, capture_func, iterations):
     return moved_images, moved_residuals
 
 
-def record_images_from_fpu(rig, fpu_id, capture_image, num_iterations):
+def record_images_from_fpu(
+    rig, fpu_id, capture_image, num_iterations, analysis_cache=None, analysis_queue=None
+):
     """make a mesaurement series for a specific FPU."""
 
     sn = rig.fpu_config[fpu_id]["serialnumber"]
@@ -173,12 +199,22 @@ def record_images_from_fpu(rig, fpu_id, capture_image, num_iterations):
 
     # capture images with datum-only hardware command
     datumed_images, datumed_residuals = grab_datumed_images(
-        rig, fpu_id, capture_for_sn, num_iterations
+        rig,
+        fpu_id,
+        capture_for_sn,
+        num_iterations,
+        analysis_cache=analysis_cache,
+        analysis_queue=analysis_queue,
     )
 
     # capture images whith FPU moveing, then datum
     moved_images, moved_residuals = grab_moved_images(
-        rig, fpu_id, capture_for_sn, num_iterations
+        rig,
+        fpu_id,
+        capture_for_sn,
+        num_iterations,
+        analysis_cache=analysis_cache,
+        analysis_queue=analysis_queue,
     )
 
     # wrap up the gathered data in a DB record
@@ -200,7 +236,7 @@ def measure_datum_repeatability(rig, dbe, pars=None):
     logger = logging.getLogger(__name__)
     logger.info("capturing datum repeatability")
 
-    with rig.lctrl.use_ambientlight():
+    with rig.lctrl.use_ambientlight(), AnalysisQueue() as analysis_queue:
 
         tstamp = timestamp()
         camera = config_camera(rig, pars.DATUM_REP_EXPOSURE_MS)
@@ -208,7 +244,7 @@ def measure_datum_repeatability(rig, dbe, pars=None):
         # define closure which stores images with unique path names
         # (using time stamp and camera object configured above)
         def capture_image(sn, subtest, cnt):
-            ipath = store_image(
+            image = grab_image(
                 camera,
                 "{sn}/{tn}/{ts}/{tp}-{ct:03d}.bmp",
                 sn=sn,
@@ -218,7 +254,7 @@ def measure_datum_repeatability(rig, dbe, pars=None):
                 ct=cnt,
             )
 
-            return ipath
+            return image
 
         # turn table along sorted positions
         for fpu_id, stage_position in get_sorted_positions(
@@ -235,11 +271,17 @@ def measure_datum_repeatability(rig, dbe, pars=None):
             turntable_safe_goto(rig, rig.grid_state, stage_position)
             # measure images
             image_record = record_images_from_fpu(
-                rig, fpu_id, capture_image, pars.DATUM_REP_ITERATIONS
+                rig,
+                fpu_id,
+                capture_image,
+                pars.DATUM_REP_ITERATIONS,
+                analysis_cache=dbe.analysis_cache,
+                analysis_queue=analysis_queue,
             )
             # store to database
             save_datum_repeatability_images(dbe, fpu_id, image_record)
 
+    flush_images()
     logger.info("datum repeatability successfully captured")
 
 
@@ -247,6 +289,9 @@ def eval_datum_repeatability(dbe, dat_rep_analysis_pars):
 
     logger = logging.getLogger(__name__)
 
+    # collect the images of all FPUs, so that they are analyzed together
+    measured_fpus = []
+    groups = []
     for fpu_id in dbe.eval_fpuset:
         sn = dbe.fpu_config[fpu_id]["serialnumber"]
         measurement = get_datum_repeatability_images(dbe, fpu_id)
@@ -256,70 +301,70 @@ def eval_datum_repeatability(dbe, dat_rep_analysis_pars):
             )
             continue
 
-        logger.info("evaluating datum repeatability for FPU %s" % sn)
-
         images = measurement["images"]
+        fpu_images = [
+            (("datumed", i), fixup_ipath(ipath))
+            for i, ipath in enumerate(images["datumed_images"])
+        ] + [
+            (("moved", i), fixup_ipath(ipath))
+            for i, ipath in enumerate(images["moved_images"])
+        ]
+
+        measured_fpus.append((fpu_id, sn, measurement["residual_counts"]))
+        groups.append(
+            (fpu_images, len(fpu_images) * dat_rep_analysis_pars.MAX_FAILURE_QUOTIENT)
+        )
 
-        residual_counts = measurement["residual_counts"]
+    if not groups:
+        return
 
-        if dat_rep_analysis_pars.TARGET_DETECTION_ALGORITHM == "otsu":
-            pars = dat_rep_analysis_pars.TARGET_DETECTION_OTSU_PARS
-        else:
-            pars = dat_rep_analysis_pars.TARGET_DETECTION_CONTOUR_PARS
+    pars = get_target_detection_pars(dat_rep_analysis_pars)
 
-        pars.PLATESCALE = dat_rep_analysis_pars.PLATESCALE
+    correct = get_correction_func(
+        calibration_pars=pars.CALIBRATION_PARS,
+        platescale=pars.PLATESCALE,
+        loglevel=dat_rep_analysis_pars.loglevel,
+    )
 
-        correct = get_correction_func(
-            calibration_pars=pars.CALIBRATION_PARS,
-            platescale=pars.PLATESCALE,
-            loglevel=dat_rep_analysis_pars.loglevel,
-        )
+    logger.info("analyzing datum repeatability images of %i FPUs" % len(groups))
+
+    group_results = analyze_image_groups(
+        groups,
+        posrepCoordinates,
+        pars=dat_rep_analysis_pars,
+        version=DATUM_REPEATABILITY_ALGORITHM_VERSION,
+        cache=dbe.analysis_cache,
+        workers=getattr(dbe.opts, "analysis_workers", IMAGE_ANALYSIS_WORKERS),
+        key_pars=pars.CALIBRATION_PARS,
+        correct=correct,
+    )
 
-        def analysis_func(ipath):
-            return posrepCoordinates(
-                fixup_ipath(ipath), pars=dat_rep_analysis_pars, correct=correct
-            )
+    for (fpu_id, sn, residual_counts), analysis_results in zip(
+        measured_fpus, group_results
+    ):
+        logger.info("evaluating datum repeatability for FPU %s" % sn)
 
         try:
-            count_images = len(images["datumed_images"]) + len(images["moved_images"])
-            count_failures = 0
-            datumed_coords = []
-            for ipath in images["datumed_images"]:
-                try:
-                    datumed_coords.append(analysis_func(ipath))
-                except ImageAnalysisError as err:
-                    count_failures += 1
-                    if (
-                        count_failures
-                        > count_images * dat_rep_analysis_pars.MAX_FAILURE_QUOTIENT
-                    ):
-                        raise
-                    else:
-                        logger.warning(
-                            "image analysis failed for image %s, "
-                            "message = %s (continuing)" % (ipath, str(err))
-                        )
-                        continue
-
-            moved_coords = []
-            for ipath in images["moved_images"]:
-                try:
-                    moved_coords.append(analysis_func(ipath))
-                except ImageAnalysisError as err:
-                    count_failures += 1
-                    if (
-                        count_failures
-                        > count_images * dat_rep_analysis_pars.MAX_FAILURE_QUOTIENT
-                    ):
-                        raise
-                    else:
-                        logger.warning(
-                            "image analysis failed for image %s, "
-                            "message = %s (continuing)" % (ipath, str(err))
-                        )
-                        continue
-
-            error_measures = evaluate_datum_repeatability(datumed_coords, moved_coords)
+            if isinstance(analysis_results, ImageAnalysisError):
+                raise analysis_results
+
+            datumed_coords = [
+                coords
+                for (series, _), coords in analysis_results.items()
+                if series == "datumed"
+            ]
+            moved_coords = [
+                coords
+                for (series, _), coords in analysis_results.items()
+                if series == "moved"
+            ]
+
+            # one array for both series, in the order of the analysis results
+            all_coords = array(analysis_results.values(), dtype=float).reshape(-1, 6)
+
+            error_measures = evaluate_datum_repeatability_array(
+                all_coords, len(datumed_coords)
+            )
 
             datum_repeatability_has_passed = (
                 TestResult.OK
@@ -337,9 +382,9 @@ def eval_datum_repeatability(dbe, dat_rep_analysis_pars):
             max_residual_datumed = np.max(array(residual_counts["datumed_residuals"]))
             max_residual_moved = np.max(array(residual_counts["moved_residuals"]))
 
-            min_quality_datumed = get_min_quality(datumed_coords)
+            min_quality_datumed = get_min_quality(all_coords[: len(datumed_coords)])
 
-            min_quality_moved = get_min_quality(moved_coords)
+            min_quality_moved = get_min_quality(all_coords[len(datumed_coords) :])
 
         except ImageAnalysisError as e:
             errmsg = str(e)
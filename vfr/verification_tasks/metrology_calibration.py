@@ -13,6 +13,7 @@ from ImageAnalysisFuncs.analyze_metrology_calibration import (
 from vfr.evaluation.eval_metrology_calibration import fibre_target_distance
 from numpy import NaN
 from vfr.conf import MET_CAL_CAMERA_IP_ADDRESS
+from vfr.image_writer import flush_images
 from vfr.db.metrology_calibration import (
     MetrologyCalibrationImages,
     MetrologyCalibrationResult,
@@ -23,7 +24,7 @@ from vfr.db.metrology_calibration import (
 from vfr.tests_common import (
     fixup_ipath,
     get_sorted_positions,
-    store_image,
+    grab_image,
     timestamp,
     safe_home_turntable,
     turntable_safe_goto,
@@ -68,7 +69,7 @@ def measure_metrology_calibration(rig, dbe, pars=None):
 
         def capture_image(camera, subtest):
 
-            ipath = store_image(
+            image = grab_image(
                 camera,
                 "{sn}/{tn}/{ts}/{st}.bmp",
                 sn=rig.fpu_config[fpu_id]["serialnumber"],
@@ -77,7 +78,7 @@ def measure_metrology_calibration(rig, dbe, pars=None):
                 st=subtest,
             )
 
-            return ipath
+            return image
 
         met_cal_cam.SetExposureTime(pars.METROLOGY_CAL_TARGET_EXPOSURE_MS)
         rig.lctrl.switch_fibre_backlight("off")
@@ -87,22 +88,32 @@ def measure_metrology_calibration(rig, dbe, pars=None):
         # and guarantee it is switched off after the
         # measurement (even if exceptions occur)
         with rig.lctrl.use_ambientlight():
-            target_ipath = capture_image(met_cal_cam, "target")
+            target_image = capture_image(met_cal_cam, "target")
 
+        target_ipath = target_image.path
         fpu_log.audit("saving target image to %r" % abspath(target_ipath))
         check_image_analyzability(
-            target_ipath, metcalTargetCoordinates, pars=MET_CAL_TARGET_ANALYSIS_PARS
+            target_image,
+            metcalTargetCoordinates,
+            pars=MET_CAL_TARGET_ANALYSIS_PARS,
+            cache=dbe.analysis_cache,
+            version=METROLOGY_ANALYSIS_ALGORITHM_VERSION,
         )
         met_cal_cam.SetExposureTime(pars.METROLOGY_CAL_FIBRE_EXPOSURE_MS)
 
         linear_stage_goto(rig, pars.METROLOGY_CAL_LINPOSITIONS[fpu_id])
 
         with rig.lctrl.use_backlight(pars.METROLOGY_CAL_BACKLIGHT_VOLTAGE):
-            fibre_ipath = capture_image(met_cal_cam, "fibre")
+            fibre_image = capture_image(met_cal_cam, "fibre")
 
+        fibre_ipath = fibre_image.path
         fpu_log.audit("saving fibre image to %r" % abspath(fibre_ipath))
         check_image_analyzability(
-            fibre_ipath, metcalFibreCoordinates, pars=MET_CAL_FIBRE_ANALYSIS_PARS
+            fibre_image,
+            metcalFibreCoordinates,
+            pars=MET_CAL_FIBRE_ANALYSIS_PARS,
+            cache=dbe.analysis_cache,
+            version=METROLOGY_ANALYSIS_ALGORITHM_VERSION,
         )
         images = {"target": target_ipath, "fibre": fibre_ipath}
 
@@ -111,6 +122,7 @@ def measure_metrology_calibration(rig, dbe, pars=None):
         save_metrology_calibration_images(dbe, fpu_id, record)
 
     home_linear_stage(rig)  # bring linear stage to home pos
+    flush_images()
     logger.info("metrology calibration captured successfully")
 
 
@@ -134,49 +146,58 @@ def eval_metrology_calibration(
         images = measurement["images"]
 
         logger.debug("images= %r" % images)
-        try:
-            target_coordinates = metcalTargetCoordinates(
-                fixup_ipath(images["target"]), pars=metcal_target_analysis_pars
+        # the cached analysis results and the evaluation result
+        # of each FPU are written in one transaction
+        with dbe.batch():
+            try:
+                target_coordinates = dbe.analysis_cache.analyze(
+                    fixup_ipath(images["target"]),
+                    metcalTargetCoordinates,
+                    pars=metcal_target_analysis_pars,
+                    version=METROLOGY_ANALYSIS_ALGORITHM_VERSION,
+                )
+                fibre_coordinates = dbe.analysis_cache.analyze(
+                    fixup_ipath(images["fibre"]),
+                    metcalFibreCoordinates,
+                    pars=metcal_fibre_analysis_pars,
+                    version=METROLOGY_ANALYSIS_ALGORITHM_VERSION,
+                )
+
+                coords = {
+                    "target_small_xy": target_coordinates[0:2],
+                    "target_small_q": target_coordinates[2],
+                    "target_big_xy": target_coordinates[3:5],
+                    "target_big_q": target_coordinates[5],
+                    "fibre_xy": fibre_coordinates[0:2],
+                    "fibre_q": fibre_coordinates[2],
+                }
+
+                (metcal_fibre_large_target_distance_mm,
+                 metcal_fibre_small_target_distance_mm,
+                 metcal_target_vector_angle_deg) = fibre_target_distance(
+                     target_coordinates[0:2], target_coordinates[3:5], fibre_coordinates[0:2]
+                )
+
+                errmsg = None
+
+            except ImageAnalysisError as e:
+                errmsg = str(e)
+                coords = {}
+                metcal_fibre_large_target_distance_mm = NaN
+                metcal_fibre_small_target_distance_mm = NaN
+                metcal_target_vector_angle_deg = NaN
+                logger.exception(
+                    "image analysis for FPU %s failed with message %s" % (sn, errmsg)
+                )
+
+            record = MetrologyCalibrationResult(
+                coords=coords,
+                metcal_fibre_large_target_distance_mm=metcal_fibre_large_target_distance_mm,
+                metcal_fibre_small_target_distance_mm=metcal_fibre_small_target_distance_mm,
+                metcal_target_vector_angle_deg=metcal_target_vector_angle_deg,
+                error_message=errmsg,
+                algorithm_version=METROLOGY_ANALYSIS_ALGORITHM_VERSION,
             )
-            fibre_coordinates = metcalFibreCoordinates(
-                fixup_ipath(images["fibre"]), pars=metcal_fibre_analysis_pars
-            )
-
-            coords = {
-                "target_small_xy": target_coordinates[0:2],
-                "target_small_q": target_coordinates[2],
-                "target_big_xy": target_coordinates[3:5],
-                "target_big_q": target_coordinates[5],
-                "fibre_xy": fibre_coordinates[0:2],
-                "fibre_q": fibre_coordinates[2],
-            }
-
-            (metcal_fibre_large_target_distance_mm,
-             metcal_fibre_small_target_distance_mm,
-             metcal_target_vector_angle_deg) = fibre_target_distance(
-                 target_coordinates[0:2], target_coordinates[3:5], fibre_coordinates[0:2]
-            )
-
-            errmsg = None
-
-        except ImageAnalysisError as e:
-            errmsg = str(e)
-            coords = {}
-            metcal_fibre_large_target_distance_mm = NaN
-            metcal_fibre_small_target_distance_mm = NaN
-            metcal_target_vector_angle_deg = NaN
-            logger.exception(
-                "image analysis for FPU %s failed with message %s" % (sn, errmsg)
-            )
-
-        record = MetrologyCalibrationResult(
-            coords=coords,
-            metcal_fibre_large_target_distance_mm=metcal_fibre_large_target_distance_mm,
-            metcal_fibre_small_target_distance_mm=metcal_fibre_small_target_distance_mm,
-            metcal_target_vector_angle_deg=metcal_target_vector_angle_deg,
-            error_message=errmsg,
-            algorithm_version=METROLOGY_ANALYSIS_ALGORITHM_VERSION,
-        )
 
-        logger.debug("FPU %r: saving result record = %r" % (sn, record))
-        save_metrology_calibration_result(dbe, fpu_id, record)
+            logger.debug("FPU %r: saving result record = %r" % (sn, record))
+            save_metrology_calibration_result(dbe, fpu_id, record)
@@ -5,6 +5,7 @@ from ImageAnalysisFuncs.analyze_metrology_height import (
     METROLOGY_HEIGHT_ANALYSIS_ALGORITHM_VERSION,
     ImageAnalysisError,
     methtHeight,
+    methtHeight_batch,
 )
 from vfr.evaluation.eval_metrology_height import eval_met_height_inspec
 from numpy import NaN
@@ -13,6 +14,7 @@ from os.path import abspath
 from vfr.auditlog import get_fpuLogger
 from vfr.conf import MET_HEIGHT_CAMERA_IP_ADDRESS
 from vfr.db.base import TestResult
+from vfr.image_writer import flush_images
 from vfr.db.metrology_height import (
     MetrologyHeightImages,
     MetrologyHeightResult,
@@ -23,7 +25,7 @@ from vfr.db.metrology_height import (
 from vfr.tests_common import (
     fixup_ipath,
     get_sorted_positions,
-    store_image,
+    grab_image,
     timestamp,
     safe_home_turntable,
     turntable_safe_goto,
@@ -65,7 +67,7 @@ def measure_metrology_height(rig, dbe, pars=None):
 
         def capture_image(camera):
 
-            ipath = store_image(
+            image = grab_image(
                 camera,
                 "{sn}/{tn}/{ts}.bmp",
                 sn=rig.fpu_config[fpu_id]["serialnumber"],
@@ -73,22 +75,33 @@ def measure_metrology_height(rig, dbe, pars=None):
                 ts=tstamp,
             )
 
-            return ipath
+            return image
 
         with rig.lctrl.use_silhouettelight():
-            ipath = capture_image(met_height_cam)
+            image = capture_image(met_height_cam)
+        ipath = image.path
         fpu_log.audit("saving height image to %r" % abspath(ipath))
-        check_image_analyzability(ipath, methtHeight, pars=MET_HEIGHT_ANALYSIS_PARS)
+        check_image_analyzability(
+            image,
+            methtHeight,
+            pars=MET_HEIGHT_ANALYSIS_PARS,
+            cache=dbe.analysis_cache,
+            version=METROLOGY_HEIGHT_ANALYSIS_ALGORITHM_VERSION,
+        )
 
         record = MetrologyHeightImages(images=ipath)
         fpu_log.debug("saving result record = %r" % record)
         save_metrology_height_images(dbe, fpu_id, record)
+    flush_images()
     logger.info("metrology height captured successfully")
 
 
 def eval_metrology_height(dbe, met_height_analysis_pars, met_height_evaluation_pars):
 
     logger = logging.getLogger(__name__)
+
+    # collect the images of all FPUs, so that they are analyzed in one batch
+    measured_fpus = []
     for fpu_id in dbe.eval_fpuset:
         measurement = get_metrology_height_images(dbe, fpu_id)
         sn = dbe.fpu_config[fpu_id]["serialnumber"]
@@ -97,15 +110,26 @@ def eval_metrology_height(dbe, met_height_analysis_pars, met_height_evaluation_p
             logger.info("FPU %s: no metrology height measurement data found" % sn)
             continue
 
-        logger.info("evaluating metrology height for FPU %s" % sn)
+        measured_fpus.append((fpu_id, sn, fixup_ipath(measurement["images"])))
 
-        images = fixup_ipath(measurement["images"])
+    outcomes = dbe.analysis_cache.analyze_batch(
+        [images for _, _, images in measured_fpus],
+        methtHeight,
+        methtHeight_batch,
+        pars=met_height_analysis_pars,
+        version=METROLOGY_HEIGHT_ANALYSIS_ALGORITHM_VERSION,
+    )
+
+    for (fpu_id, sn, _), (heights, analysis_error) in zip(
+        measured_fpus, outcomes
+    ):
+        logger.info("evaluating metrology height for FPU %s" % sn)
 
         try:
+            if analysis_error is not None:
+                raise analysis_error
 
-            metht_small_target_height_mm, metht_large_target_height_mm = methtHeight(
-                images, pars=met_height_analysis_pars
-            )
+            metht_small_target_height_mm, metht_large_target_height_mm = heights
 
             result_in_spec = eval_met_height_inspec(
                 metht_small_target_height_mm,
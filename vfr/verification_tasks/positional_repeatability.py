@@ -13,10 +13,12 @@ from Gearbox.gear_correction import (
 )
 from GigE.GigECamera import BASLER_DEVICE_CLASS, DEVICE_CLASS, IP_ADDRESS
 from ImageAnalysisFuncs.base import get_min_quality
+from ImageAnalysisFuncs.target_tracking import get_tracker
 from ImageAnalysisFuncs.analyze_positional_repeatability import (
     POSITIONAL_REPEATABILITY_ALGORITHM_VERSION,
     ImageAnalysisError,
-    posrepCoordinates,
+    correctCoordinates,
+    posrepPixelCoordinates,
 )
 from vfr.evaluation.measures import NO_MEASURES
 from vfr.evaluation.eval_positional_repeatability import (
@@ -24,7 +26,7 @@ from vfr.evaluation.eval_positional_repeatability import (
 )
 from vfr.evaluation.measures import arg_max_dict
 from numpy import NaN
-from vfr.conf import POS_REP_CAMERA_IP_ADDRESS
+from vfr.conf import IMAGE_ANALYSIS_WORKERS, POS_REP_CAMERA_IP_ADDRESS
 from vfr.db.base import TestResult
 from vfr.db.colldect_limits import get_range_limits
 from vfr.db.positional_repeatability import (
@@ -36,12 +38,15 @@ from vfr.db.positional_repeatability import (
     save_positional_repeatability_result,
 )
 from vfr.db.pupil_alignment import get_pupil_alignment_passed_p
+from vfr.image_writer import flush_images
+from vfr.parallel_analysis import analyze_images
 from vfr.tests_common import (
+    AnalysisQueue,
     fixup_ipath,
-    get_config_from_mapfile,
     get_sorted_positions,
+    get_target_detection_pars,
     goto_position,
-    store_image,
+    grab_image,
     timestamp,
     safe_home_turntable,
     turntable_safe_goto,
@@ -213,7 +218,16 @@ def get_step_counts(rig, fpu_id):
     return FPU_Position(alpha_steps, beta_steps)
 
 
-def capture_fpu_position(rig, fpu_id, midx, target_pos, capture_image, pars=None):
+def capture_fpu_position(
+    rig,
+    fpu_id,
+    midx,
+    target_pos,
+    capture_image,
+    pars=None,
+    analysis_cache=None,
+    analysis_queue=None,
+):
     fpu_log = get_fpuLogger(fpu_id, rig.fpu_config, __name__)
 
     sn = rig.fpu_config[fpu_id]["serialnumber"]
@@ -248,8 +262,19 @@ def capture_fpu_position(rig, fpu_id, midx, target_pos, capture_image, pars=None
     # counts.
     real_steps = get_step_counts(rig, fpu_id)
 
-    ipath = capture_image(midx, real_position)
-    check_image_analyzability(ipath, posrepCoordinates, pars=POS_REP_ANALYSIS_PARS)
+    image = capture_image(midx, real_position)
+    ipath = image.path
+    # with a queue, the image is checked while the FPU moves on
+    check = (
+        check_image_analyzability if analysis_queue is None else analysis_queue.check
+    )
+    check(
+        image,
+        posrepPixelCoordinates,
+        pars=POS_REP_ANALYSIS_PARS,
+        cache=analysis_cache,
+        version=POSITIONAL_REPEATABILITY_ALGORITHM_VERSION,
+    )
     fpu_log.audit(
         "saving image for position %r to %r" % (real_position, abspath(ipath))
     )
@@ -265,7 +290,15 @@ def capture_fpu_position(rig, fpu_id, midx, target_pos, capture_image, pars=None
     return key, val
 
 
-def get_images_for_fpu(rig, fpu_id, range_limits, pars, capture_image):
+def get_images_for_fpu(
+    rig,
+    fpu_id,
+    range_limits,
+    pars,
+    capture_image,
+    analysis_cache=None,
+    analysis_queue=None,
+):
 
     image_dict_alpha = {}
     image_dict_beta = {}
@@ -275,7 +308,14 @@ def get_images_for_fpu(rig, fpu_id, range_limits, pars, capture_image):
         target_pos = get_target_position(range_limits, pars, measurement_index)
 
         key, val = capture_fpu_position(
-            rig, fpu_id, measurement_index, target_pos, capture_image, pars=pars
+            rig,
+            fpu_id,
+            measurement_index,
+            target_pos,
+            capture_image,
+            pars=pars,
+            analysis_cache=analysis_cache,
+            analysis_queue=analysis_queue,
         )
 
         # the direction index tells whether the image
@@ -305,7 +345,11 @@ def measure_positional_repeatability(rig, dbe, pars=None):
 
     initialize_rig(rig)
 
-    with rig.lctrl.use_ambientlight():
+    # use the same calibration as the evaluation, so that
+    # it can reuse the results of the image checks
+    get_target_detection_pars(POS_REP_ANALYSIS_PARS, pars.POS_REP_CALIBRATION_MAPFILE)
+
+    with rig.lctrl.use_ambientlight(), AnalysisQueue() as analysis_queue:
         pos_rep_cam = prepare_cam(rig, pars.POS_REP_EXPOSURE_MS)
 
         # get sorted positions (this is needed because the turntable can only
@@ -337,7 +381,7 @@ def measure_positional_repeatability(rig, dbe, pars=None):
 
             def capture_image(measurement_index, real_pos):
                 res = "H" if measurement_index.hires else "L"
-                ipath = store_image(
+                image = grab_image(
                     pos_rep_cam,
                     "{sn}/{tn}/{ts}/i{itr:03d}-j{dir:03d}-k{inc:03d}-{res}_({alpha:+08.3f},_{beta:+08.3f}).bmp",
                     sn=sn,
@@ -351,15 +395,24 @@ def measure_positional_repeatability(rig, dbe, pars=None):
                     beta=real_pos.beta,
                 )
 
-                return ipath
+                return image
 
             # move rotary stage to POS_REP_POSN_N
             turntable_safe_goto(rig, rig.grid_state, stage_position)
 
-            record = get_images_for_fpu(rig, fpu_id, range_limits, pars, capture_image)
+            record = get_images_for_fpu(
+                rig,
+                fpu_id,
+                range_limits,
+                pars,
+                capture_image,
+                analysis_cache=dbe.analysis_cache,
+                analysis_queue=analysis_queue,
+            )
             fpu_log.debug("saving result record = %r" % (record,))
 
             save_positional_repeatability_images(dbe, fpu_id, record)
+    flush_images()
     logger.info("positional repeatability captured successfully")
 
 
@@ -383,15 +436,7 @@ def eval_positional_repeatability(dbe, pos_rep_analysis_pars, pos_rep_evaluation
 
         mapfile = measurement["calibration_mapfile"]
 
-        if pos_rep_analysis_pars.TARGET_DETECTION_ALGORITHM == "otsu":
-            pars = pos_rep_analysis_pars.TARGET_DETECTION_OTSU_PARS
-        else:
-            pars = pos_rep_analysis_pars.TARGET_DETECTION_CONTOUR_PARS
-
-        pars.PLATESCALE = pos_rep_analysis_pars.PLATESCALE
-
-        if mapfile:
-            pars.CALIBRATION_PARS = get_config_from_mapfile(mapfile)
+        pars = get_target_detection_pars(pos_rep_analysis_pars, mapfile)
 
         correct = get_correction_func(
             calibration_pars=pars.CALIBRATION_PARS,
@@ -399,97 +444,54 @@ def eval_positional_repeatability(dbe, pos_rep_analysis_pars, pos_rep_evaluation
             loglevel=pos_rep_analysis_pars.loglevel,
         )
 
-        def analysis_func(ipath):
-            return posrepCoordinates(
-                fixup_ipath(ipath), pars=pos_rep_analysis_pars, correct=correct
+        # images are analyzed in the order of capture, (iteration,
+        # direction, increment), so that the targets of consecutive
+        # images are close to each other, which ROI tracking uses
+        images = [
+            (("alpha", k), fixup_ipath(ipath))
+            for k, (alpha_steps, beta_steps, ipath) in sorted(
+                images_alpha.items(), key=lambda item: item[0][2:]
             )
+        ] + [
+            (("beta", k), fixup_ipath(ipath))
+            for k, (alpha_steps, beta_steps, ipath) in sorted(
+                images_beta.items(), key=lambda item: item[0][2:]
+            )
+        ]
 
         try:
+            # the images are analyzed in pixel coordinates, and the
+            # target positions of all images are corrected in one call
+            pixel_results = analyze_images(
+                images,
+                posrepPixelCoordinates,
+                pars=pos_rep_analysis_pars,
+                version=POSITIONAL_REPEATABILITY_ALGORITHM_VERSION,
+                max_failures=len(images) * pos_rep_analysis_pars.MAX_FAILURE_QUOTIENT,
+                cache=dbe.analysis_cache,
+                workers=getattr(dbe.opts, "analysis_workers", IMAGE_ANALYSIS_WORKERS),
+                tracker=get_tracker(pos_rep_analysis_pars),
+            )
+            analysis_results = correctCoordinates(pixel_results, correct)
+
             analysis_results_alpha = {}
-            analysis_results_alpha_short = {}
-
-            count_failures = 0
-            count_images = len(images_alpha) + len(images_beta)
-            for k, v in images_alpha.items():
-                alpha_steps, beta_steps, ipath = v
-                try:
-                    analysis_results_alpha[k] = analysis_func(ipath)
-                except ImageAnalysisError as err:
-                    count_failures += 1
-                    if (
-                        count_failures
-                        > count_images * pos_rep_analysis_pars.MAX_FAILURE_QUOTIENT
-                    ):
-                        raise
-                    else:
-                        logger.warning(
-                            "image analysis failed for image %s, "
-                            "message = %s (continuing)" % (ipath, str(err))
-                        )
-                        continue
-
-                (
-                    x_measured_small,
-                    y_measured_small,
-                    qual_small,
-                    x_measured_big,
-                    y_measured_big,
-                    qual_big,
-                ) = analysis_results_alpha[k]
-
-                analysis_results_alpha_short[k] = (
-                    x_measured_small,
-                    y_measured_small,
-                    x_measured_big,
-                    y_measured_big,
-                )
             analysis_results_beta = {}
-            analysis_results_beta_short = {}
-
-            for k, v in images_beta.items():
-                alpha_steps, beta_steps, ipath = v
-                try:
-                    analysis_results_beta[k] = analysis_func(ipath)
-                except ImageAnalysisError as err:
-                    count_failures += 1
-                    if (
-                        count_failures
-                        > count_images * pos_rep_analysis_pars.MAX_FAILURE_QUOTIENT
-                    ):
-                        raise
-                    else:
-                        logger.warning(
-                            "image analysis failed for image %s, "
-                            "message = %s (continuing)" % (ipath, str(err))
-                        )
-                        continue
-
-                (
-                    x_measured_small,
-                    y_measured_small,
-                    qual_small,
-                    x_measured_big,
-                    y_measured_big,
-                    qual_big,
-                ) = analysis_results_beta[k]
-
-                analysis_results_beta_short[k] = (
-                    x_measured_small,
-                    y_measured_small,
-                    x_measured_big,
-                    y_measured_big,
-                )
-
-                (
-                    posrep_alpha_max_at_angle,
-                    posrep_beta_max_at_angle,
-                    posrep_alpha_measures,
-                    posrep_beta_measures,
-                ) = evaluate_positional_repeatability(
-                    analysis_results_alpha,
-                    analysis_results_beta,
-                    pars=pos_rep_evaluation_pars,
-                )
+            for (series, k), coords in analysis_results.items():
+                if series == "alpha":
+                    analysis_results_alpha[k] = coords
+                else:
+                    analysis_results_beta[k] = coords
+
+            (
+                posrep_alpha_max_at_angle,
+                posrep_beta_max_at_angle,
+                posrep_alpha_measures,
+                posrep_beta_measures,
+            ) = evaluate_positional_repeatability(
+                analysis_results_alpha,
+                analysis_results_beta,
+                pars=pos_rep_evaluation_pars,
+            )
 
             positional_repeatability_has_passed = (
                 TestResult.OK
@@ -28,6 +28,7 @@ from vfr.evaluation.measures import arg_max_dict
 from numpy import NaN
 from vfr.conf import POS_REP_CAMERA_IP_ADDRESS
 from vfr.db.base import TestResult
+from vfr.image_writer import flush_images
 from vfr.db.colldect_limits import get_range_limits
 from vfr.db.datum_repeatability import get_datum_repeatability_passed_p
 from vfr.db.positional_repeatability import (
@@ -44,17 +45,17 @@ from vfr.db.positional_verification import (
 )
 from vfr.db.pupil_alignment import get_pupil_alignment_passed_p
 from vfr.tests_common import (
+    AnalysisQueue,
     fixup_ipath,
     dirac,
     find_datum,
     get_config_from_mapfile,
     get_sorted_positions,
     get_stepcounts,
-    store_image,
+    grab_image,
     timestamp,
     safe_home_turntable,
     turntable_safe_goto,
-    check_image_analyzability,
 )
 from vfr.conf import POS_REP_ANALYSIS_PARS
 
@@ -100,7 +101,7 @@ def measure_positional_verification(rig, dbe, pars=None):
     safe_home_turntable(rig, grid_state)
     rig.lctrl.switch_all_off()
 
-    with rig.lctrl.use_ambientlight():
+    with rig.lctrl.use_ambientlight(), AnalysisQueue() as analysis_queue:
         # initialize pos_rep camera
         # set pos_rep camera exposure time to POS_VER_EXPOSURE milliseconds
         POS_VER_CAMERA_CONF = {
@@ -231,7 +232,7 @@ def measure_positional_verification(rig, dbe, pars=None):
 
             def capture_image(idx, alpha, beta):
 
-                ipath = store_image(
+                image = grab_image(
                     pos_rep_cam,
                     "{sn}/{tn}/{ts}/{idx:04d}-{alpha:+08.3f}-{beta:+08.3f}.bmp",
                     sn=sn,
@@ -242,7 +243,7 @@ def measure_positional_verification(rig, dbe, pars=None):
                     idx=idx,
                 )
 
-                return ipath
+                return image
 
             tol = abs(pars.POS_VER_SAFETY_TOLERANCE)
             tested_positions = generate_tested_positions(
@@ -296,13 +297,14 @@ def measure_positional_verification(rig, dbe, pars=None):
 
                 fpu_log.debug("FPU %s: saving image # %i..." % (sn, k))
 
-                ipath = capture_image(k, alpha_deg, beta_deg)
+                image = capture_image(k, alpha_deg, beta_deg)
+                ipath = image.path
                 fpu_log.audit(
                     "saving image for position (%7.3f, %7.3f) to %r"
                     % (alpha_deg, beta_deg, abspath(ipath))
                 )
-                check_image_analyzability(
-                    ipath, posrepCoordinates, pars=POS_REP_ANALYSIS_PARS
+                analysis_queue.check(
+                    image, posrepCoordinates, pars=POS_REP_ANALYSIS_PARS
                 )
 
                 image_dict[(k, alpha_deg, beta_deg)] = ipath
@@ -321,6 +323,7 @@ def measure_positional_verification(rig, dbe, pars=None):
             fpu_log.debug("FPU %r: saving result record = %r" % (sn, record))
             save_positional_verification_images(dbe, fpu_id, record)
 
+    flush_images()
     logger.info("positional verification captured sucessfully")
 
 
@@ -16,6 +16,7 @@ from os.path import abspath
 from vfr.auditlog import get_fpuLogger
 from vfr.conf import PUP_ALGN_CAMERA_IP_ADDRESS
 from vfr.db.base import TestResult
+from vfr.image_writer import flush_images
 from vfr.db.colldect_limits import get_range_limits
 from vfr.db.pupil_alignment import (
     PupilAlignmentImages,
@@ -26,18 +27,18 @@ from vfr.db.pupil_alignment import (
     save_pupil_alignment_result,
 )
 from vfr.tests_common import (
+    AnalysisQueue,
     fixup_ipath,
     find_datum,
     get_config_from_mapfile,
     get_sorted_positions,
     goto_position,
-    store_image,
+    grab_image,
     timestamp,
     safe_home_turntable,
     turntable_safe_goto,
     home_linear_stage,
     linear_stage_goto,
-    check_image_analyzability,
 )
 from DistortionCorrection import get_correction_func
 from vfr.conf import PUP_ALGN_ANALYSIS_PARS
@@ -72,7 +73,9 @@ def measure_pupil_alignment(rig, dbe, pars=None):
     home_linear_stage(rig)
     rig.lctrl.switch_all_off()
 
-    with rig.lctrl.use_backlight(pars.PUP_ALGN_LAMP_VOLTAGE):
+    with rig.lctrl.use_backlight(
+        pars.PUP_ALGN_LAMP_VOLTAGE
+    ), AnalysisQueue() as analysis_queue:
 
         # initialize pos_rep camera
         # set pos_rep camera exposure time to DATUM_REP_EXPOSURE milliseconds
@@ -127,7 +130,7 @@ def measure_pupil_alignment(rig, dbe, pars=None):
 
             def capture_image(count, alpha, beta):
 
-                ipath = store_image(
+                image = grab_image(
                     pup_aln_cam,
                     "{sn}/{tn}/{ts}/{cnt:02d}-{alpha:+08.3f}-{beta:+08.3f}.bmp",
                     sn=sn,
@@ -138,7 +141,7 @@ def measure_pupil_alignment(rig, dbe, pars=None):
                     beta=beta,
                 )
 
-                return ipath
+                return image
 
             images = {}
             for count, (coords, do_capture) in enumerate(generate_positions()):
@@ -156,10 +159,11 @@ def measure_pupil_alignment(rig, dbe, pars=None):
                         "FPU %s: saving image for (%7.2f, %7.2f)"
                         % (sn, abs_alpha, abs_beta)
                     )
-                    ipath = capture_image(count, abs_alpha, abs_beta)
+                    image = capture_image(count, abs_alpha, abs_beta)
+                    ipath = image.path
                     fpu_log.audit("saving pupil image to %r" % abspath(ipath))
-                    check_image_analyzability(
-                        ipath, pupalnCoordinates, pars=PUP_ALGN_ANALYSIS_PARS
+                    analysis_queue.check(
+                        image, pupalnCoordinates, pars=PUP_ALGN_ANALYSIS_PARS
                     )
 
                     images[(abs_alpha, abs_beta)] = ipath
@@ -174,6 +178,7 @@ def measure_pupil_alignment(rig, dbe, pars=None):
             save_pupil_alignment_images(dbe, fpu_id, record)
 
     home_linear_stage(rig)  # bring linear stage to home pos
+    flush_images()
     logger.info("pupil alignment captured successfully")
 
 